@@ -0,0 +1,144 @@
+"""/doctors?sort=distance: the old load-everything path (to_list(None) + vectorized
+haversine + top-k in process) vs. $geoNear on the doctors 2dsphere index.
+
+Needs a real MongoDB (mongomock has no $geoNear). Synthetic doctors go into a scratch
+database, which is dropped afterwards.
+
+    MONGO_URL=mongodb://localhost:27017 python bench_doctors_geo.py --doctors 10000 100000 --repeat 20
+
+--explain also prints, per case, the winning plan and keys/docs examined for the
+rating-sorted page and for the $geoNear page, so an in-memory SORT or a collection
+scan shows up next to the timings.
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+import numpy as np
+
+import server
+
+
+SPECIALTIES = ["General Medicine", "Cardiology", "Dermatology", "Orthopedics", "Pediatrics", "Neurology",
+               "Pulmonology", "ENT", "Diabetology", "Gastroenterology", "Psychiatry", "Urology"]
+CONDITIONS = ["fever", "cold", "cough", "chest pain", "hypertension", "acne", "eczema", "joint pain",
+              "arthritis", "migraine", "asthma", "diabetes", "acidity", "anxiety", "kidney stones"]
+
+
+def make_doctors(n, rng, lat, lng):
+    doctors = []
+    for i in range(n):
+        doc = {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "name": f"Dr. Bench {i}",
+            "specialty": rng.choice(SPECIALTIES),
+            "conditions": rng.sample(CONDITIONS, 3),
+            "avg_rating": round(rng.uniform(3, 5), 1),
+            "review_count": rng.randint(0, 300),
+            # Spread over ~100 km around the city
+            "lat": lat + rng.uniform(-0.5, 0.5),
+            "lng": lng + rng.uniform(-0.5, 0.5),
+        }
+        doc.update(server.doctor_search_fields(doc))
+        doctors.append(doc)
+    return doctors
+
+
+async def legacy_by_distance(query, lat, lng, skip, limit):
+    """The previous path: every matching doctor over the wire, ranked in process."""
+    doctors = await server.db.doctors.find(query, {"_id": 0}).to_list(None)
+    km = server.haversine_many(lat, lng, [d["lat"] for d in doctors], [d["lng"] for d in doctors]) / 1000
+    nearest = server.top_k_smallest(np.asarray(km), skip + limit)[skip:]
+    return [{**doctors[i], "distance": float(km[i])} for i in nearest], len(doctors)
+
+
+def plan_stages(plan):
+    """'LIMIT <- FETCH <- IXSCAN[condition_rating]' for a winningPlan tree."""
+    stage = plan.get("stage", "?") + (f"[{plan['indexName']}]" if plan.get("indexName") else "")
+    children = plan.get("inputStages") or ([plan["inputStage"]] if "inputStage" in plan else [])
+    if not children:
+        return stage
+    inner = [plan_stages(child) for child in children]
+    return f"{stage} <- " + (inner[0] if len(inner) == 1 else "(" + " | ".join(inner) + ")")
+
+
+def explain_summary(explain):
+    # Aggregations nest the find-layer explain under their first stage
+    if "stages" in explain:
+        explain = explain["stages"][0]["$cursor"]
+    stats = explain.get("executionStats", {})
+    winning = explain["queryPlanner"]["winningPlan"]
+    winning = winning.get("queryPlan", winning)
+    return (f"{plan_stages(winning)}  keys={stats.get('totalKeysExamined')} "
+            f"docs={stats.get('totalDocsExamined')}")
+
+
+async def explain(query, lat, lng, page_size):
+    rating = await server.db.command({
+        "explain": {"find": "doctors", "filter": query, "sort": dict(server.DOCTOR_SORTS["rating"]),
+                    "limit": page_size},
+        "verbosity": "executionStats",
+    })
+    geo = await server.db.command({
+        "explain": {"aggregate": "doctors", "cursor": {}, "pipeline": [
+            {"$geoNear": {"near": {"type": "Point", "coordinates": [lng, lat]}, "distanceField": "distance",
+                          "spherical": True, "query": query}},
+            {"$limit": page_size},
+        ]},
+        "verbosity": "executionStats",
+    })
+    return explain_summary(rating), explain_summary(geo)
+
+
+async def bench(fn, repeat, *args):
+    await fn(*args)  # warm up caches and the connection pool
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = await fn(*args)
+    return 1000 * (time.perf_counter() - t0) / repeat, result
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--doctors", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--db", default="mediguide_bench")
+    parser.add_argument("--explain", action="store_true")
+    args = parser.parse_args()
+
+    server.db = server.client[args.db]
+    rng = random.Random(7)
+    lat, lng = 14.4426, 79.9865  # Nellore
+    cases = {"no filter": None, "condition=fever": "fever"}
+    try:
+        for n in args.doctors:
+            await server.db.doctors.drop()
+            docs = make_doctors(n, rng, lat, lng)
+            for i in range(0, n, 10000):
+                await server.db.doctors.insert_many(docs[i:i + 10000])
+            await server.db.doctors.create_indexes(server.INDEXES["doctors"])
+            server.DOCTOR_TOKENS.invalidate()
+            print(f"{n} doctors")
+            for name, condition in cases.items():
+                query = await server.doctor_query(condition, None)
+                old_ms, (old, old_total) = await bench(legacy_by_distance, args.repeat, query, lat, lng, 0, args.page_size)
+                new_ms, (new, new_total) = await bench(server.doctors_by_distance, args.repeat, query, lat, lng, 0, args.page_size)
+                geo_ms, _ = await bench(server.doctors_by_distance, args.repeat, query, lat, lng, 0, args.page_size, 5.0)
+                assert old_total == new_total
+                assert [round(d["distance"], 3) for d in old] == [round(d["distance"], 3) for d in new]
+                print(f"  {name:16s} {old_total:7d} matches  legacy={old_ms:8.2f}ms  "
+                      f"$geoNear={new_ms:8.2f}ms  $geoNear within 5 km={geo_ms:8.2f}ms")
+                if args.explain:
+                    rating_plan, geo_plan = await explain(query, lat, lng, args.page_size)
+                    print(f"    sort=rating: {rating_plan}")
+                    print(f"    $geoNear:    {geo_plan}")
+    finally:
+        await server.client.drop_database(args.db)
+        server.client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
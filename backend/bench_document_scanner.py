@@ -0,0 +1,117 @@
+"""Document analysis: the old classify/extract passes vs. the single-pass DocumentScanner.
+
+The corpus is OCR'd from the sample files in uploads/ (same pdf2image + pytesseract
+path as /api/uploads/file), then pages are concatenated to mimic long multi-page PDFs.
+Without OCR installed, a built-in prescription/lab page stands in.
+
+    python bench_document_scanner.py --pages 1 10 50 200 --repeat 20
+"""
+import argparse
+import re
+import time
+from pathlib import Path
+
+import server
+
+
+FALLBACK_PAGE = """CITY CARE HOSPITAL - OUTPATIENT PRESCRIPTION
+Patient: R. Kumar   Age: 54   Date: 12/03/2024
+Rx
+Tab Metformin 500 mg  1-0-1 after food x 30 days
+Tab Amlodipine 5 mg  0-0-1
+Cap Omeprazole 20 mg before breakfast
+Syrup Cremaffin 10 ml at night
+Investigations: Hemoglobin: 12.8 g/dL  Glucose (FBS) 142 mg/dL  Total Cholesterol - 212 mg/dL
+Creatinine 1.1 mg/dL  WBC 7800 /cumm  RBC 4.6 million  Platelet 2.4 lakh
+Advice: walk 30 minutes daily, review after 1 month with test results.
+"""
+
+
+def ocr_uploads(upload_dir):
+    """Text of every image/PDF in upload_dir, or [] if OCR isn't available."""
+    try:
+        import pytesseract
+        from PIL import Image
+        from pdf2image import convert_from_path
+    except ImportError as e:
+        print(f"OCR unavailable ({e}); using the built-in sample page")
+        return []
+    pages = []
+    for path in sorted(upload_dir.iterdir()):
+        ext = path.suffix.lower()
+        try:
+            if ext in ('.jpg', '.jpeg', '.png'):
+                pages.append(pytesseract.image_to_string(Image.open(path)))
+            elif ext == '.pdf':
+                pages.extend(pytesseract.image_to_string(img) for img in convert_from_path(str(path), dpi=200))
+        except Exception as e:
+            print(f"  skipped {path.name}: {e}")
+    return [p for p in pages if p.strip()]
+
+
+def legacy_analyze(text, filename=""):
+    """The old pipeline: classify with any(...) substring passes, then nine findall passes."""
+    text_lower = text.lower()
+    filename_lower = filename.lower()
+    if any(w in text_lower for w in ['rx', 'prescription', 'tablet', 'capsule', 'syrup', 'dosage', 'take', 'times a day', 'after food']):
+        doc_type = "prescription"
+    elif any(w in text_lower for w in ['hemoglobin', 'glucose', 'cholesterol', 'creatinine', 'urea', 'wbc', 'rbc', 'platelet', 'test result', 'lab report']):
+        doc_type = "lab_report"
+    elif any(w in text_lower for w in ['x-ray', 'xray', 'radiograph', 'chest pa', 'bone scan']) or \
+            any(w in filename_lower for w in ['xray', 'x-ray', 'scan']):
+        doc_type = "xray"
+    elif any(w in text_lower for w in ['wound', 'injury', 'burn', 'laceration', 'abrasion']):
+        doc_type = "wound"
+    elif any(w in text_lower for w in ['discharge', 'summary', 'admitted', 'diagnosis', 'treatment given']):
+        doc_type = "discharge"
+    else:
+        doc_type = "unknown"
+
+    medicines = []
+    for pattern in [r'(?:Tab|Cap|Syrup|Inj)\.?\s+([A-Za-z0-9\-]+(?:\s+\d+\s*mg)?)', r'(\w+)\s+(\d+\s*mg)']:
+        for match in re.findall(pattern, text, re.IGNORECASE):
+            name = match if isinstance(match, str) else ' '.join(match)
+            if len(name) > 3 and name.lower() not in ['the', 'and', 'for', 'with']:
+                medicines.append({"name": name.strip(), "dosage": ""})
+
+    values = []
+    for pattern in [
+        r'(Hemoglobin|Hb|HGB)\s*[:\-]?\s*([\d.]+)\s*(g/dL|gm%)?',
+        r'(Glucose|Blood Sugar|FBS|RBS)\s*[:\-]?\s*([\d.]+)\s*(mg/dL)?',
+        r'(Cholesterol|Total Cholesterol)\s*[:\-]?\s*([\d.]+)\s*(mg/dL)?',
+        r'(Creatinine)\s*[:\-]?\s*([\d.]+)\s*(mg/dL)?',
+        r'(WBC|White Blood Cell)\s*[:\-]?\s*([\d.]+)\s*(/cumm|cells)?',
+        r'(RBC|Red Blood Cell)\s*[:\-]?\s*([\d.]+)\s*(million)?',
+        r'(Platelet|PLT)\s*[:\-]?\s*([\d.]+)\s*(/cumm|lakh)?',
+    ]:
+        for match in re.findall(pattern, text, re.IGNORECASE):
+            values.append({"name": match[0], "value": match[1], "unit": match[2]})
+    return {"doc_type": doc_type, "medicines": medicines[:10], "lab_values": values}
+
+
+def bench(fn, text, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return 1000 * (time.perf_counter() - t0) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=Path, default=server.UPLOAD_DIR)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 50, 200])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    pages = ocr_uploads(args.uploads) or [FALLBACK_PAGE]
+    print(f"corpus: {len(pages)} page(s), {sum(len(p) for p in pages)} chars")
+    for n in args.pages:
+        text = "\n\f".join(pages[i % len(pages)] for i in range(n))
+        old, new = bench(legacy_analyze, text, args.repeat), bench(server.analyze_document, text, args.repeat)
+        result = server.analyze_document(text)
+        print(f"  {n:4d} pages {len(text):8d} chars  legacy={old:8.2f}ms  scanner={new:8.2f}ms  "
+              f"({result['doc_type']}, {len(result['medicines'])} medicines, {len(result['lab_values'])} lab values)")
+
+
+if __name__ == "__main__":
+    main()
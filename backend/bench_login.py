@@ -0,0 +1,76 @@
+"""Login latency under concurrent load: bcrypt on the event loop vs. the worker pool.
+
+Simulates the login handler (user fetch -> password verify -> token write) with
+short sleeps standing in for the Mongo round trips, while a stream of cheap
+requests (think GET /api/me) keeps hitting the same loop.
+
+    python bench_login.py --logins 200 --concurrency 50 --rounds 12
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import bcrypt
+
+import server
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+async def run(mode, hashed, logins, concurrency, db_latency):
+    sem = asyncio.Semaphore(concurrency)
+    login_lat, light_lat = [], []
+    done = asyncio.Event()
+
+    async def login():
+        async with sem:
+            t0 = time.perf_counter()
+            await asyncio.sleep(db_latency)  # find user
+            if mode == "inline":
+                ok = server.verify_password("password123", hashed)
+            else:
+                ok = await server.PASSWORD_HASHER.verify("password123", hashed)
+            assert ok
+            await asyncio.sleep(db_latency)  # rotate refresh token
+            login_lat.append(time.perf_counter() - t0)
+
+    async def light_traffic():
+        while not done.is_set():
+            t0 = time.perf_counter()
+            await asyncio.sleep(db_latency)
+            light_lat.append(time.perf_counter() - t0)
+
+    probes = [asyncio.create_task(light_traffic()) for _ in range(10)]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - t0
+    done.set()
+    await asyncio.gather(*probes)
+
+    print(f"[{mode}] {logins} logins in {elapsed:.2f}s ({logins / elapsed:.1f}/s)")
+    print(f"  login  p50={1000 * statistics.median(login_lat):8.1f}ms  p99={1000 * percentile(login_lat, 99):8.1f}ms")
+    print(f"  other  p50={1000 * statistics.median(light_lat):8.1f}ms  p99={1000 * percentile(light_lat, 99):8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=server.BCRYPT_ROUNDS)
+    parser.add_argument("--db-latency-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    hashed = bcrypt.hashpw(b"password123", bcrypt.gensalt(args.rounds)).decode("utf-8")
+    print(f"bcrypt rounds={args.rounds}, pool workers={server.PASSWORD_HASHER.workers}")
+    for mode in ("inline", "pool"):
+        asyncio.run(run(mode, hashed, args.logins, args.concurrency, args.db_latency_ms / 1000))
+    print(f"pool stats: {server.PASSWORD_HASHER.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Microbenchmark: is_medical_query (compiled trie regex) vs. the old any(keyword in text) scan.
+
+    python bench_medical_matcher.py --chars 5000 --repeat 200
+"""
+import argparse
+import random
+import time
+
+import server
+
+
+ALL_KEYWORDS = server.MEDICAL_KEYWORDS + server.MEDICAL_KEYWORDS_HI + server.MEDICAL_KEYWORDS_TE
+
+
+def legacy_is_medical_query(text):
+    """The old substring scan, given the same Hindi/Telugu coverage."""
+    text_lower = text.lower()
+    return any(keyword in text_lower for keyword in ALL_KEYWORDS)
+
+
+def make_message(chars, tail):
+    rng = random.Random(42)
+    filler = ["the", "weather", "was", "nice", "we", "went", "to", "the", "market", "and", "bought",
+              "some", "books", "about", "history", "music", "cricket", "movies", "travel", "plans"]
+    # Drop words the substring scan would (wrongly) match, so both sides do a real full scan
+    filler = [w for w in filler if not legacy_is_medical_query(w)]
+    words = []
+    while sum(len(w) + 1 for w in words) < chars:
+        words.append(rng.choice(filler))
+    return " ".join(words) + tail
+
+
+def bench(fn, text, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return 1e6 * (time.perf_counter() - t0) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chars", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    cases = {
+        "no keyword (full scan)": make_message(args.chars, "."),
+        "keyword at end": make_message(args.chars, " and then I got a fever."),
+        "keyword at start": "fever " + make_message(args.chars, "."),
+        "telugu keyword at end": make_message(args.chars, " నాకు జ్వరంతో బాధగా ఉంది"),
+        "substring false positive": make_message(args.chars, " what a great act."),
+    }
+    print(f"{len(ALL_KEYWORDS)} keywords ({len(set(ALL_KEYWORDS))} unique), "
+          f"{args.chars}-char messages")
+    for name, text in cases.items():
+        old, new = bench(legacy_is_medical_query, text, args.repeat), bench(server.is_medical_query, text, args.repeat)
+        print(f"  {name:24s} legacy={old:9.1f}us  matcher={new:9.1f}us  "
+              f"({legacy_is_medical_query(text)} -> {server.is_medical_query(text)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Nearest-k over candidate POIs: per-element Python haversine + full sort vs. the
+vectorized haversine_many + top_k_smallest used by /nearby and /doctors.
+
+    python bench_nearest.py --candidates 10000 --k 20 --repeat 50
+"""
+import argparse
+import math
+import random
+import time
+
+import numpy as np
+
+import server
+
+
+def legacy_nearest(lat, lng, places, radius, k):
+    """The old loop (scalar haversine per element), plus the sort it was missing."""
+    out = []
+    for p in places:
+        lat1, lat2 = math.radians(lat), math.radians(p["lat"])
+        dlat = math.radians(p["lat"] - lat)
+        dlng = math.radians(p["lng"] - lng)
+        a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng / 2) ** 2
+        dist = 6371000 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+        if dist <= radius:
+            out.append({**p, "distance": round(dist)})
+    out.sort(key=lambda p: p["distance"])
+    return out[:k]
+
+
+def vectorized_nearest(lat, lng, places, radius, k):
+    """Same steps as get_nearby: arrays from the candidate dicts, score, filter, top-k."""
+    dist = server.haversine_many(lat, lng, [p["lat"] for p in places], [p["lng"] for p in places])
+    inside = np.flatnonzero(dist <= radius)
+    nearest = inside[server.top_k_smallest(dist[inside], k)]
+    return [{**places[i], "distance": round(float(dist[i]))} for i in nearest]
+
+
+def bench(fn, repeat, *args):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(*args)
+    return 1000 * (time.perf_counter() - t0) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--candidates", type=int, default=10000)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--radius", type=float, default=5000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    lat, lng = 14.4426, 79.9865  # Nellore
+    places = [{"id": str(i), "name": f"Place {i}",
+               "lat": lat + rng.uniform(-0.05, 0.05), "lng": lng + rng.uniform(-0.05, 0.05)}
+              for i in range(args.candidates)]
+    lats = np.array([p["lat"] for p in places])
+    lngs = np.array([p["lng"] for p in places])
+
+    old_ms, old = bench(legacy_nearest, args.repeat, lat, lng, places, args.radius, args.k)
+    new_ms, new = bench(vectorized_nearest, args.repeat, lat, lng, places, args.radius, args.k)
+    core_ms, _ = bench(lambda: server.top_k_smallest(server.haversine_many(lat, lng, lats, lngs), args.k), args.repeat)
+    assert [p["distance"] for p in old] == [p["distance"] for p in new]
+
+    print(f"{args.candidates} candidates, k={args.k}, radius={args.radius:.0f}m")
+    print(f"  python loop + full sort          {old_ms:8.2f}ms")
+    print(f"  vectorized, end to end           {new_ms:8.2f}ms")
+    print(f"  vectorized, arrays prebuilt      {core_ms:8.2f}ms  (scoring + top-k only)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""TypeaheadIndex at scale: build time, lookup latency by prefix length (segment-tree
+top-k vs. scanning the whole prefix range) and the cost of in-place updates.
+
+    python bench_typeahead.py --doctors 100000 --queries 2000
+"""
+import argparse
+import random
+import string
+import time
+
+import server
+
+
+FIRST = ["Priya", "Rajesh", "Meera", "Arun", "Sunita", "Vikram", "Kavitha", "Mohammed", "Ananya", "Rahul",
+         "Lakshmi", "Sanjay", "Pooja", "Amit", "Deepa", "Karthik", "Swati", "Nikhil", "Ritu", "Ashok"]
+LAST = ["Sharma", "Kumar", "Reddy", "Patel", "Verma", "Singh", "Nair", "Khan", "Das", "Joshi",
+        "Iyer", "Gupta", "Menon", "Saxena", "Krishnan", "Rao", "Agarwal", "Bhatt", "Malhotra", "Pillai"]
+SPECIALTIES = ["General Medicine", "Cardiology", "Dermatology", "Orthopedics", "Pediatrics", "Neurology",
+               "Pulmonology", "ENT", "Diabetology", "Gastroenterology", "Psychiatry", "Urology"]
+CONDITIONS = ["fever", "cold", "cough", "chest pain", "hypertension", "acne", "eczema", "joint pain",
+              "arthritis", "migraine", "asthma", "diabetes", "acidity", "anxiety", "kidney stones"]
+
+
+def make_doctors(n, rng):
+    return [{
+        "id": f"d{i}",
+        # A random suffix keeps names distinct, like a real directory
+        "name": f"Dr. {rng.choice(FIRST)} {''.join(rng.choices(string.ascii_lowercase, k=6))} {rng.choice(LAST)}",
+        "specialty": rng.choice(SPECIALTIES),
+        "conditions": rng.sample(CONDITIONS, 3) + [f"condition {rng.randrange(n // 10)}"],
+        "avg_rating": round(rng.uniform(3, 5), 1),
+        "review_count": rng.randint(0, 300),
+    } for i in range(n)]
+
+
+def scan_search(index, q, limit=8):
+    """The straightforward lookup: rank every key in the prefix range."""
+    lo = server.bisect.bisect_left(index._keys, q)
+    hi = server.bisect.bisect_left(index._keys, q + "\uffff")
+    best = {}
+    for i in range(lo, hi):
+        item_id = index._ids[i]
+        best[item_id] = max(best.get(item_id, -1), index._scores[i])
+    return server.heapq.nlargest(limit, best, key=best.__getitem__)
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    fn(*args)
+    return 1e6 * (time.perf_counter() - t0)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--doctors", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    doctors = make_doctors(args.doctors, rng)
+    index = server.TypeaheadIndex()
+    t0 = time.perf_counter()
+    index.load(doctors, server.HOSPITAL_DATA)
+    build_ms = 1000 * (time.perf_counter() - t0)
+    print(f"{args.doctors} doctors -> {len(index.items)} items, {len(index._keys)} keys; built in {build_ms:.0f}ms")
+
+    words = [w for item in index.items.values() for w in server.search_tokens(item["label"]) if w != "dr"]
+    for length in (1, 2, 3, 5):
+        queries = [w[:length] for w in rng.choices(words, k=args.queries) if len(w) >= length]
+        tree = [timed(index.search, q) for q in queries]
+        scan = [timed(scan_search, index, q) for q in queries[:200]]
+        (t50, t99), (s50, s99) = percentiles(tree), percentiles(scan)
+        print(f"  prefix len {length}: top-k p50={t50:7.1f}us p99={t99:7.1f}us   range scan p50={s50:9.1f}us p99={s99:9.1f}us")
+
+    sample = rng.sample(doctors, 100)
+    t0 = time.perf_counter()
+    for doc in sample:
+        index.update_doctor_stats(doc["id"], 4.5, doc["review_count"] + 1)
+    review_us = 1e6 * (time.perf_counter() - t0) / len(sample)
+    t0 = time.perf_counter()
+    for doc in sample:
+        index.upsert_doctor({**doc, "name": doc["name"] + " Jr", "conditions": doc["conditions"][:2]})
+    upsert_ms = 1000 * (time.perf_counter() - t0) / len(sample)
+    rebuild_ms = timed(index.search, "a") / 1000
+    print(f"  new review {review_us:.0f}us; doctor edit {upsert_ms:.2f}ms + {rebuild_ms:.0f}ms tree rebuild "
+          f"on the next lookup (once per batch of edits); full load {build_ms:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""Offline import of OSM health facilities into the local POI store (db.pois).
+
+Streams an OSM XML extract (.osm, .osm.gz, .osm.bz2) or GeoJSON (a FeatureCollection,
+or GeoJSONSeq / line-delimited .geojsonl) with bounded memory, keeps
+amenity=hospital|clinic|pharmacy and bulk-upserts them in batches. Progress is
+checkpointed in db.poi_imports, so an interrupted import picks up where it stopped.
+Afterwards every tile inside the extract's bounds is marked fresh for each facility
+type the file contains, and /nearby answers those from the store without calling
+Overpass. Types absent from the file (say, a pharmacies-only extract) are left alone.
+
+    python import_pois.py andhra-pradesh-latest.osm.bz2 --batch-size 2000
+    python import_pois.py ap-health.geojson --no-mark-regions
+
+Library use:
+
+    from import_pois import import_file
+    await import_file(Path("ap.osm"), server.POI_STORE)
+"""
+import argparse
+import asyncio
+import bz2
+import gzip
+import json
+import logging
+import re
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from pathlib import Path
+
+import server
+
+logger = logging.getLogger("import_pois")
+
+AMENITIES = {"hospital", "clinic", "pharmacy"}
+
+
+def open_input(path: Path, mode: str = "rb"):
+    opener = {".gz": gzip.open, ".bz2": bz2.open}.get(path.suffix, open)
+    return opener(path, mode)
+
+
+def element(osm_type, osm_id, lat, lng, tags):
+    """Overpass-shaped element, so places are built exactly like live ones."""
+    return {"type": osm_type, "id": osm_id, "lat": lat, "lon": lng, "tags": tags}
+
+
+# ---------- OSM XML ----------
+
+def _tags(elem):
+    return {t.get("k"): t.get("v") for t in elem.iter("tag")}
+
+
+TOP_LEVEL = {"bounds", "node", "way", "relation"}
+
+
+def _iter_end(path: Path, tags):
+    """iterparse that drops every top-level element once handled, keeping memory flat on huge files."""
+    with open_input(path) as fh:
+        context = ET.iterparse(fh, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event == "end" and elem.tag in TOP_LEVEL:
+                if elem.tag in tags:
+                    yield elem
+                root.clear()
+
+
+def _osm_way_refs(path: Path) -> set:
+    """Pass 1: node ids referenced by facility ways (a few per building, not the whole map)."""
+    refs = set()
+    for elem in _iter_end(path, {"way"}):
+        if _tags(elem).get("amenity") in AMENITIES:
+            refs.update(int(nd.get("ref")) for nd in elem.iter("nd"))
+    return refs
+
+
+def iter_osm_xml(path: Path, bounds: dict):
+    """Pass 2: facility nodes directly, facility ways at the centre of their nodes
+    (OSM files list nodes before ways, so the coordinates are known by then)."""
+    refs = _osm_way_refs(path)
+    coords = {}
+    for elem in _iter_end(path, {"bounds", "node", "way"}):
+        if elem.tag == "bounds":
+            bounds.update({k: float(elem.get(k)) for k in ("minlat", "minlon", "maxlat", "maxlon")})
+        elif elem.tag == "node":
+            osm_id = int(elem.get("id"))
+            lat, lng = float(elem.get("lat")), float(elem.get("lon"))
+            if osm_id in refs:
+                coords[osm_id] = (lat, lng)
+            if len(elem):
+                tags = _tags(elem)
+                if tags.get("amenity") in AMENITIES:
+                    yield tags["amenity"], element("node", osm_id, lat, lng, tags)
+        else:
+            tags = _tags(elem)
+            if tags.get("amenity") not in AMENITIES:
+                continue
+            points = [coords[int(nd.get("ref"))] for nd in elem.iter("nd") if int(nd.get("ref")) in coords]
+            if points:
+                lat = sum(p[0] for p in points) / len(points)
+                lng = sum(p[1] for p in points) / len(points)
+                yield tags["amenity"], element("way", int(elem.get("id")), lat, lng, tags)
+
+
+# ---------- GeoJSON ----------
+
+def iter_feature_collection(fh, chunk_size=1 << 20):
+    """Features of a FeatureCollection one at a time, decoding from a bounded buffer
+    instead of json.load()ing the whole file."""
+    decoder = json.JSONDecoder()
+    separator = re.compile(r'[\s,]*')
+    buf = ""
+    while True:
+        chunk = fh.read(chunk_size)
+        if not chunk:
+            return
+        buf += chunk
+        match = re.search(r'"features"\s*:\s*\[', buf)
+        if match:
+            pos = match.end()
+            break
+        buf = buf[-64:]  # the key may straddle two chunks
+    eof = False
+    while True:
+        pos = separator.match(buf, pos).end()
+        if buf.startswith("]", pos):
+            return
+        try:
+            feature, pos = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = fh.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield feature
+
+
+def iter_geojson_seq(fh):
+    for line in fh:
+        line = line.strip().lstrip("\x1e")  # RFC 8142 record separator
+        if line:
+            yield json.loads(line)
+
+
+def _feature_element(feature):
+    props = feature.get("properties") or {}
+    tags = props.get("tags") if isinstance(props.get("tags"), dict) else props
+    amenity = tags.get("amenity")
+    if amenity not in AMENITIES:
+        return None
+    geometry = feature.get("geometry") or {}
+    coordinates = geometry.get("coordinates")
+    if geometry.get("type") == "Point":
+        lng, lat = coordinates[:2]
+    elif geometry.get("type") in ("Polygon", "MultiPolygon", "LineString"):
+        ring = coordinates[0] if geometry["type"] == "Polygon" else (
+            coordinates[0][0] if geometry["type"] == "MultiPolygon" else coordinates)
+        lng = sum(p[0] for p in ring) / len(ring)
+        lat = sum(p[1] for p in ring) / len(ring)
+    else:
+        return None
+    raw_id = str(feature.get("id") or props.get("@id") or props.get("osm_id") or "")
+    osm_type, _, osm_id = raw_id.rpartition("/")
+    osm_type = osm_type or props.get("osm_type") or "node"
+    if not osm_id:
+        return None
+    return amenity, element(osm_type, int(osm_id) if osm_id.isdigit() else osm_id, lat, lng, tags)
+
+
+SEQ_SUFFIXES = {".geojsonl", ".geojsonseq", ".geojsons", ".jsonl", ".ndjson"}
+
+
+def iter_geojson(path: Path):
+    suffixes = [s for s in path.suffixes if s not in (".gz", ".bz2")]
+    with open_input(path, "rt") as fh:
+        features = iter_geojson_seq(fh) if suffixes and suffixes[-1] in SEQ_SUFFIXES else iter_feature_collection(fh)
+        for feature in features:
+            found = _feature_element(feature)
+            if found:
+                yield found
+
+
+# ---------- import ----------
+
+def iter_places(path: Path, bounds: dict):
+    """Places built by server.place_from_element; `bounds` gets the file's declared extent, if any."""
+    name = path.name.lower()
+    if ".osm" in name or name.endswith(".xml"):
+        records = iter_osm_xml(path, bounds)
+    else:
+        records = iter_geojson(path)
+    for place_type, elem in records:
+        place = server.place_from_element(elem, place_type)
+        if place:
+            yield place
+
+
+async def import_file(path: Path, store=None, batch_size: int = 1000, mark_regions: bool = True,
+                      force: bool = False) -> dict:
+    """Stream `path` into the POI store; returns a summary with the rows/s achieved."""
+    store = store or server.POI_STORE
+    checkpoints = server.db.poi_imports
+    stat = path.stat()
+    key = f"{path.name}:{stat.st_size}:{int(stat.st_mtime)}"
+    checkpoint = await checkpoints.find_one({"key": key}) or {}
+    if checkpoint.get("status") == "done" and not force:
+        logger.info(f"{path.name} already imported ({checkpoint['rows']} rows); use --force to redo")
+        return {"rows": checkpoint["rows"], "skipped": True}
+    resume_from = 0 if force else checkpoint.get("rows", 0)
+    if resume_from:
+        logger.info(f"Resuming {path.name} after {resume_from} rows")
+
+    imported_at = datetime.now(timezone.utc)
+    bounds, extent, counts, batch = {}, {}, {}, []
+    rows = written = 0
+    t0 = time.perf_counter()
+
+    async def flush():
+        nonlocal written
+        await store.save_places(batch, imported_at, f"import:{path.name}")
+        written += len(batch)
+        batch.clear()
+        await checkpoints.update_one(
+            {"key": key},
+            {"$set": {"file": path.name, "rows": rows, "status": "running", "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+        elapsed = time.perf_counter() - t0
+        logger.info(f"{rows} rows ({written} written) in {elapsed:.1f}s, {written / elapsed:.0f} rows/s")
+
+    for place in iter_places(path, bounds):
+        rows += 1
+        tile = server.geohash_encode(place["lat"], place["lng"], store.precision)
+        counts.setdefault(place["type"], {}).setdefault(tile, 0)
+        counts[place["type"]][tile] += 1
+        for edge, value, pick in (("minlat", place["lat"], min), ("minlon", place["lng"], min),
+                                  ("maxlat", place["lat"], max), ("maxlon", place["lng"], max)):
+            extent[edge] = pick(extent.get(edge, value), value)
+        if rows <= resume_from:
+            continue
+        batch.append(place)
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+
+    bounds = bounds or extent  # the file's <bounds>, else the extent of what it contained
+    # Only types the file has any of: a filtered extract says nothing about the others,
+    # so marking them would record their tiles as known-empty
+    types = [place_type for place_type in server.OSM_FILTERS if counts.get(place_type)]
+    if mark_regions and bounds and types:
+        # Every tile in the extract's bounds is now known for these types, including empty
+        # ones, so /nearby won't go to Overpass for them until they age past POI_REFRESH_SECONDS
+        tiles = server.geohash_cover_bbox(bounds["minlat"], bounds["minlon"], bounds["maxlat"], bounds["maxlon"], store.precision)
+        for place_type in types:
+            per_tile = counts[place_type]
+            for i in range(0, len(tiles), 5000):
+                await store.mark_regions(place_type, {t: per_tile.get(t, 0) for t in tiles[i:i + 5000]}, imported_at)
+        logger.info(f"Marked {len(tiles)} tiles fresh for {', '.join(types)}")
+
+    elapsed = time.perf_counter() - t0
+    await checkpoints.update_one(
+        {"key": key},
+        {"$set": {"file": path.name, "rows": rows, "status": "done", "updated_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+    summary = {"rows": rows, "written": written, "seconds": round(elapsed, 2),
+               "rows_per_second": round(written / elapsed) if elapsed else None}
+    logger.info(f"Imported {path.name}: {summary}")
+    return summary
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--no-mark-regions", action="store_true")
+    parser.add_argument("--force", action="store_true", help="re-import even if a finished checkpoint exists")
+    args = parser.parse_args()
+
+    await server.ensure_indexes()
+    await import_file(args.path, batch_size=args.batch_size, mark_regions=not args.no_mark_regions, force=args.force)
+    server.client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
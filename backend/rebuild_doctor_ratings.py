@@ -0,0 +1,26 @@
+"""Recompute every doctor's rating sums and averages from db.doctor_feedback.
+
+add_doctor_feedback keeps them up to date incrementally; run this after bulk-loading
+or restoring feedback, or to repair drift.
+
+    python rebuild_doctor_ratings.py
+"""
+import asyncio
+import logging
+import time
+
+import server
+
+logger = logging.getLogger("rebuild_doctor_ratings")
+
+
+async def main():
+    t0 = time.perf_counter()
+    await server.rebuild_doctor_ratings()
+    reviewed = await server.db.doctors.count_documents({"rating_count": {"$gt": 0}})
+    logger.info(f"Rebuilt ratings for {reviewed} doctors in {time.perf_counter() - t0:.1f}s")
+    server.client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,14 +1,17 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, Body
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, Body, Request, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel, UpdateOne, ASCENDING, DESCENDING, ReturnDocument, monitoring
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from fastapi.responses import StreamingResponse
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional, Dict, Any
+from collections import OrderedDict, deque
 import uuid
 from datetime import datetime, timezone, timedelta
 import jwt
@@ -18,19 +21,140 @@ import json
 import io
 import base64
 import re
+import string
 import httpx
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import time
 import random
+import math
+import difflib
+import bisect
+import heapq
+import numpy as np
+import hmac
+import hashlib
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env', override=True)
 
+# Log query shapes that none of the declared indexes (see INDEXES) can serve
+INDEX_AUDIT = os.environ.get('INDEX_AUDIT', '1').lower() not in ('0', 'false', 'no')
+
+class QueryAuditListener(monitoring.CommandListener):
+    """Warns once per (collection, filter shape) when a query has no declared index to use."""
+
+    FILTER_PATHS = {
+        "find": lambda cmd: [cmd.get("filter") or {}],
+        "count": lambda cmd: [cmd.get("query") or {}],
+        "findAndModify": lambda cmd: [cmd.get("query") or {}],
+        "update": lambda cmd: [u.get("q") or {} for u in cmd.get("updates", [])],
+        "delete": lambda cmd: [d.get("q") or {} for d in cmd.get("deletes", [])],
+        "aggregate": lambda cmd: [stage["$match"] for stage in cmd.get("pipeline", [])[:1] if "$match" in stage],
+    }
+
+    def __init__(self):
+        self._seen = set()
+
+    @staticmethod
+    def _fields(query: dict) -> set:
+        fields = set()
+        for key, value in query.items():
+            if key in ("$or", "$and", "$nor"):
+                for branch in value:
+                    fields |= QueryAuditListener._fields(branch)
+            elif not key.startswith("$"):
+                fields.add(key)
+        return fields
+
+    def started(self, event):
+        extract = self.FILTER_PATHS.get(event.command_name)
+        if extract is None:
+            return
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str) or collection.startswith("system."):
+            return
+        leading = INDEX_LEADING_FIELDS.get(collection, set())
+        for query in extract(event.command):
+            fields = self._fields(query)
+            if not fields or fields & leading:
+                continue
+            shape = (collection, tuple(sorted(fields)))
+            if shape not in self._seen:
+                self._seen.add(shape)
+                logging.getLogger(__name__).warning(
+                    f"Query on '{collection}' filtering by {sorted(fields)} is not covered by a declared index"
+                )
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+class LoginRoundTrips(monitoring.CommandListener):
+    """Counts the Mongo commands each auth flow really sends, so regressions in the login
+    write path show up in /metrics.
+
+    Handlers are wrapped with @LOGIN_ROUND_TRIPS.tracked(flow). The wrapper puts a fresh
+    list in a context var, and this listener appends every command started in that
+    context to it (Motor runs pymongo with a copy of the caller's context, and tasks
+    spawned by asyncio.gather inherit the same list). Only flows that return normally
+    are recorded.
+    """
+
+    def __init__(self):
+        self.flows: Dict[str, Dict[str, int]] = {}
+        self._commands: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("login_commands", default=None)
+
+    def tracked(self, flow: str):
+        def decorator(handler):
+            @functools.wraps(handler)
+            async def wrapper(*args, **kwargs):
+                commands = []
+                token = self._commands.set(commands)
+                try:
+                    result = await handler(*args, **kwargs)
+                finally:
+                    self._commands.reset(token)
+                self.record(flow, len(commands))
+                return result
+            return wrapper
+        return decorator
+
+    def record(self, flow: str, round_trips: int):
+        counters = self.flows.setdefault(flow, {"logins": 0, "round_trips": 0})
+        counters["logins"] += 1
+        counters["round_trips"] += round_trips
+
+    def stats(self) -> dict:
+        return {
+            flow: {**c, "avg_round_trips": round(c["round_trips"] / c["logins"], 2)}
+            for flow, c in self.flows.items()
+        }
+
+    def started(self, event):
+        commands = self._commands.get()
+        if commands is not None:
+            commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+LOGIN_ROUND_TRIPS = LoginRoundTrips()
+
 # MongoDB connection
 mongo_url = os.environ.get('MONGO_URI', os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url, event_listeners=[LOGIN_ROUND_TRIPS] + ([QueryAuditListener()] if INDEX_AUDIT else [])
+)
 db = client[os.environ.get('DB_NAME', 'mediguide')]
 
 # JWT Config
@@ -39,6 +163,53 @@ JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRE_MINUTES', 30))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get('REFRESH_TOKEN_EXPIRE_DAYS', 7))
 
+# In-process user cache (see get_current_user)
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', 60))
+USER_CACHE_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE', 10000))
+
+# /typeahead: in-process prefix index, reloaded from Mongo to pick up other workers' changes
+TYPEAHEAD_RELOAD_SECONDS = float(os.environ.get('TYPEAHEAD_RELOAD_SECONDS', 300))
+
+# /doctors filters: distinct condition/specialty tokens, re-read this often (see DoctorTokens)
+DOCTOR_TOKENS_RELOAD_SECONDS = float(os.environ.get('DOCTOR_TOKENS_RELOAD_SECONDS', 300))
+
+# List totals (see cached_count); a request's own writes invalidate them immediately
+COUNT_CACHE_TTL_SECONDS = float(os.environ.get('COUNT_CACHE_TTL_SECONDS', 60))
+COUNT_CACHE_MAX_SIZE = int(os.environ.get('COUNT_CACHE_MAX_SIZE', 50000))
+
+# Geocoding (set-location endpoints): long-lived cache and Nominatim's 1 req/s policy
+GEOCODE_CACHE_TTL_SECONDS = float(os.environ.get('GEOCODE_CACHE_TTL_SECONDS', 30 * 24 * 3600))
+GEOCODE_NEGATIVE_TTL_SECONDS = float(os.environ.get('GEOCODE_NEGATIVE_TTL_SECONDS', 24 * 3600))
+GEOCODE_CACHE_MAX_SIZE = int(os.environ.get('GEOCODE_CACHE_MAX_SIZE', 20000))
+NOMINATIM_MIN_INTERVAL_SECONDS = float(os.environ.get('NOMINATIM_MIN_INTERVAL_SECONDS', 1.0))  # per worker process
+NOMINATIM_MAX_WAIT_SECONDS = float(os.environ.get('NOMINATIM_MAX_WAIT_SECONDS', 8))
+
+# Local POI store behind /nearby (db.pois + in-process tiles); Overpass refreshes it
+NEARBY_TILE_PRECISION = int(os.environ.get('NEARBY_TILE_PRECISION', 5))  # geohash length; 5 is ~4.9 x 4.9 km
+NEARBY_MAX_RADIUS_M = int(os.environ.get('NEARBY_MAX_RADIUS_M', 50000))  # bounds the tiles one search can cover
+NEARBY_MAX_TILES = int(os.environ.get('NEARBY_MAX_TILES', 36))  # wider searches query the 2dsphere index directly
+NEARBY_MAX_REFRESH_TILES = int(os.environ.get('NEARBY_MAX_REFRESH_TILES', 1024))  # tiles one wide search may queue
+POI_REFRESH_SECONDS = float(os.environ.get('POI_REFRESH_SECONDS', 24 * 3600))
+POI_MAX_STALE_SECONDS = float(os.environ.get('POI_MAX_STALE_SECONDS', 7 * 24 * 3600))  # never served older than this
+POI_STALE_RECHECK_SECONDS = float(os.environ.get('POI_STALE_RECHECK_SECONDS', 60))
+POI_MAX_TILES_IN_MEMORY = int(os.environ.get('POI_MAX_TILES_IN_MEMORY', 4096))
+
+# Travel times (/route/matrix, /nearby?sort=travel_time) from OSRM's table service
+ROUTE_MATRIX_CACHE_TTL_SECONDS = float(os.environ.get('ROUTE_MATRIX_CACHE_TTL_SECONDS', 6 * 3600))
+ROUTE_MATRIX_CACHE_MAX_SIZE = int(os.environ.get('ROUTE_MATRIX_CACHE_MAX_SIZE', 50000))
+ROUTE_MATRIX_ORIGIN_PRECISION = int(os.environ.get('ROUTE_MATRIX_ORIGIN_PRECISION', 7))  # geohash; 7 is ~150 m
+ROUTE_MATRIX_MAX_DESTINATIONS = int(os.environ.get('ROUTE_MATRIX_MAX_DESTINATIONS', 100))
+OSRM_TABLE_MAX_DESTINATIONS = int(os.environ.get('OSRM_TABLE_MAX_DESTINATIONS', 99))  # router.project-osrm.org allows 100 coordinates
+ROUTE_CACHE_FRESH_SECONDS = float(os.environ.get('ROUTE_CACHE_FRESH_SECONDS', 24 * 3600))  # /route; served stale after this
+ROUTE_CACHE_MAX_STALE_SECONDS = float(os.environ.get('ROUTE_CACHE_MAX_STALE_SECONDS', 7 * 24 * 3600))
+ROUTE_CACHE_MAX_SIZE = int(os.environ.get('ROUTE_CACHE_MAX_SIZE', 20000))
+NEARBY_TRAVEL_TIME_CANDIDATES = int(os.environ.get('NEARBY_TRAVEL_TIME_CANDIDATES', 50))
+
+# Password hashing (bcrypt runs on a bounded worker pool, never on the event loop)
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 4))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64))
+
 # Emergent LLM Key
 EMERGENT_LLM_KEY = os.environ.get('GEMINI_API_KEY', os.environ.get('EMERGENT_LLM_KEY', ''))
 
@@ -74,26 +245,6 @@ if PHARMACY_DB_PATH.exists():
     except Exception as e:
         print(f"Failed to load pharmacy database: {e}")
 
-def get_justdial_phone(place_name: str) -> Optional[str]:
-    """Look up hospital/pharmacy phone in the curated Justdial-like database."""
-    name_clean = place_name.lower().strip()
-    
-    # Search Hospitals
-    for dist_id, district in HOSPITAL_DATA.items():
-        for hospital in district.get("hospitals", []):
-            h_name = hospital["name"].lower().strip()
-            if h_name == name_clean or h_name in name_clean or name_clean in h_name:
-                return hospital["phone"]
-    
-    # Search Pharmacies
-    for dist_id, district in PHARMACY_DATA.items():
-        for pharmacy in district.get("pharmacies", []):
-            p_name = pharmacy["name"].lower().strip()
-            if p_name == name_clean or p_name in name_clean or name_clean in p_name:
-                return pharmacy["phone"]
-                
-    return None
-
 # ============== MODELS ==============
 
 class UserCreate(BaseModel):
@@ -120,7 +271,7 @@ class UserUpdate(BaseModel):
     lat: Optional[float] = None
     lng: Optional[float] = None
 
-# Notification Service consolidated below at line 380
+# Notification Service (and its outbox) lives with the Google/OTP auth routes below
 
 class TokenResponse(BaseModel):
     access_token: str
@@ -135,6 +286,17 @@ class LocationAuto(BaseModel):
 class LocationManual(BaseModel):
     query: str
 
+class RoutePoint(BaseModel):
+    lat: float
+    lng: float
+    id: Optional[str] = None
+
+class RouteMatrixRequest(BaseModel):
+    from_lat: float
+    from_lng: float
+    # Plain points, or /nearby's items posted back as they are (extra fields are ignored)
+    destinations: List[RoutePoint]
+
 class ChatMessage(BaseModel):
     message: str
     context_upload_id: Optional[str] = None
@@ -177,12 +339,506 @@ class ResetPasswordRequest(BaseModel):
 
 # ============== HELPERS ==============
 
+class TTLCache:
+    """Small in-process cache with per-entry expiry and LRU eviction at max_size."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+# User documents keyed by user id; every hit saves a Mongo round trip in get_current_user.
+USER_CACHE = TTLCache(max_size=USER_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+def invalidate_user_cache(user_id: str):
+    USER_CACHE.invalidate(user_id)
+
+class TwoTierCache:
+    """In-process TTLCache in front of a Mongo collection whose TTL index on expires_at
+    removes expired documents.
+
+    Memory hits cost no I/O at all. Mongo hits are promoted into memory for whatever
+    is left of the entry's lifetime, so each worker process warms up from the shared
+    tier instead of from the upstream API.
+    """
+
+    def __init__(self, collection, ttl: float, max_size: int):
+        self.collection = collection
+        self.ttl = ttl
+        self.memory = TTLCache(max_size=max_size, ttl=ttl)
+        self.mongo_hits = 0
+        self.mongo_misses = 0
+
+    async def get(self, key: str):
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        now = datetime.now(timezone.utc)
+        doc = await self.collection.find_one(
+            {"key": key, "expires_at": {"$gt": now}}, {"_id": 0, "data": 1, "expires_at": 1}
+        )
+        if doc is None:
+            self.mongo_misses += 1
+            return None
+        self.mongo_hits += 1
+        self.memory.set(key, doc["data"], ttl=(as_utc(doc["expires_at"]) - now).total_seconds())
+        return doc["data"]
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Found entries by key; whatever memory misses is fetched with one Mongo query."""
+        found = {}
+        for key in keys:
+            value = self.memory.get(key)
+            if value is not None:
+                found[key] = value
+        rest = [key for key in keys if key not in found]
+        if rest:
+            now = datetime.now(timezone.utc)
+            async for doc in self.collection.find(
+                {"key": {"$in": rest}, "expires_at": {"$gt": now}}, {"_id": 0, "key": 1, "data": 1, "expires_at": 1}
+            ):
+                found[doc["key"]] = doc["data"]
+                self.memory.set(doc["key"], doc["data"], ttl=(as_utc(doc["expires_at"]) - now).total_seconds())
+            hits = sum(1 for key in rest if key in found)
+            self.mongo_hits += hits
+            self.mongo_misses += len(rest) - hits
+        return found
+
+    async def set_many(self, items: Dict[str, Any], ttl: Optional[float] = None):
+        if not items:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        for key, value in items.items():
+            self.memory.set(key, value, ttl=ttl)
+        await self.collection.bulk_write([
+            UpdateOne({"key": key}, {"$set": {"data": value, "expires_at": expires_at}}, upsert=True)
+            for key, value in items.items()
+        ], ordered=False)
+
+    async def set(self, key: str, value, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        self.memory.set(key, value, ttl=ttl)
+        await self.collection.update_one(
+            {"key": key},
+            {"$set": {"data": value, "expires_at": datetime.now(timezone.utc) + timedelta(seconds=ttl)}},
+            upsert=True,
+        )
+
+    async def invalidate(self, key: str):
+        self.memory.invalidate(key)
+        await self.collection.delete_one({"key": key})
+
+    def stats(self) -> dict:
+        lookups = self.memory.hits + self.memory.misses
+        return {
+            "memory": self.memory.stats(),
+            "mongo": {
+                "hits": self.mongo_hits,
+                "misses": self.mongo_misses,
+                # Share of all lookups answered by Mongo after missing memory
+                "hit_ratio": round(self.mongo_hits / lookups, 4) if lookups else None,
+            },
+            "overall_hit_ratio": round((self.memory.hits + self.mongo_hits) / lookups, 4) if lookups else None,
+        }
+
+class StaleWhileRevalidate:
+    """TwoTierCache entries that go stale after `fresh_seconds` but are still served,
+    while one background task re-fetches them, until `max_stale_seconds` old.
+
+    get() returns (value, age in seconds, stale?); (None, None, False) when there is
+    nothing usable and the fetch failed. `fetch` returns None on failure.
+    """
+
+    def __init__(self, collection, fresh_seconds: float, max_stale_seconds: float, max_size: int):
+        self.fresh_seconds = fresh_seconds
+        self.cache = TwoTierCache(collection, ttl=max_stale_seconds, max_size=max_size)
+        self._refreshing = set()
+        self._tasks = set()
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.background_refreshes = 0
+        self.refresh_failures = 0
+
+    async def _fetch(self, key: str, fetch):
+        value = await fetch()
+        if value is not None:
+            await self.cache.set(key, {"value": value, "fetched_at": time.time()})
+        return value
+
+    async def _refresh(self, key: str, fetch):
+        try:
+            if await self._fetch(key, fetch) is None:
+                self.refresh_failures += 1
+            else:
+                self.background_refreshes += 1
+        except Exception as e:
+            self.refresh_failures += 1
+            logger.warning(f"Background refresh of {key} failed: {e}")
+        finally:
+            self._refreshing.discard(key)
+
+    async def get(self, key: str, fetch):
+        cached = await self.cache.get(key)
+        if cached is not None:
+            age = max(0.0, time.time() - cached["fetched_at"])
+            if age < self.fresh_seconds:
+                self.fresh_hits += 1
+                return cached["value"], age, False
+            self.stale_hits += 1
+            if key not in self._refreshing:
+                self._refreshing.add(key)
+                task = asyncio.create_task(self._refresh(key, fetch))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            return cached["value"], age, True
+        self.misses += 1
+        value = await self._fetch(key, fetch)
+        return (value, 0.0, False) if value is not None else (None, None, False)
+
+    def stats(self) -> dict:
+        return {
+            "fresh_hits": self.fresh_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "background_refreshes": self.background_refreshes,
+            "refresh_failures": self.refresh_failures,
+            "refreshing": len(self._refreshing),
+            "cache": self.cache.stats(),
+        }
+
+# ---------- keyset pagination ----------
+
+def encode_cursor(values: list) -> str:
+    """Opaque page token: the sort-key values of the last item served."""
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(token: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except Exception:
+        values = None
+    # Only plain sort-key values: anything else would be read as a query operator
+    if not isinstance(values, list) or not all(v is None or isinstance(v, (str, int, float)) for v in values):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def _after(field: str, direction: int, value) -> Optional[dict]:
+    # Mongo orders null/missing below everything else
+    if direction == DESCENDING:
+        return {"$or": [{field: {"$lt": value}}, {field: None}]} if value is not None else None
+    return {field: {"$gt": value}} if value is not None else {field: {"$ne": None}}
+
+def keyset_filter(sort: List[tuple], values: list) -> dict:
+    """Documents strictly after `values` in `sort` order (ties broken by the later fields)."""
+    if len(values) != len(sort):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        after = _after(field, direction, values[i])
+        if after is not None:
+            branches.append({"$and": [{f: v} for (f, _), v in zip(sort[:i], values[:i])] + [after]})
+    return {"$or": branches} if branches else {"_id": {"$exists": False}}
+
+async def keyset_page(collection, query: dict, projection: dict, sort: List[tuple],
+                      page: int, page_size: int, cursor: Optional[str]):
+    """(items, next_cursor). With a cursor the page starts right after it, through the
+    index, so page 1000 costs what page 1 does; without one, `page` is skipped to
+    as before. next_cursor is None on the last page."""
+    if cursor:
+        query = {"$and": [query, keyset_filter(sort, decode_cursor(cursor))]}
+        skip = 0
+    else:
+        skip = (page - 1) * page_size
+    items = await collection.find(query, projection).sort(sort).skip(skip).limit(page_size + 1).to_list(page_size + 1)
+    if len(items) <= page_size:
+        return items, None
+    items = items[:page_size]
+    return items, encode_cursor([items[-1].get(field) for field, _ in sort])
+
+# Uploads, chat history and feedback: newest first, id breaking same-instant ties
+RECENT_FIRST = [("created_at", DESCENDING), ("id", DESCENDING)]
+
+COUNT_CACHE = TTLCache(max_size=COUNT_CACHE_MAX_SIZE, ttl=COUNT_CACHE_TTL_SECONDS)
+
+def _count_key(collection, query: dict) -> tuple:
+    return collection.name, json.dumps(query, sort_keys=True, default=str)
+
+async def cached_count(collection, query: dict) -> int:
+    """count_documents, remembered for COUNT_CACHE_TTL_SECONDS; an unfiltered count
+    comes from collection metadata instead (estimated_document_count)."""
+    key = _count_key(collection, query)
+    total = COUNT_CACHE.get(key)
+    if total is None:
+        total = await (collection.count_documents(query) if query else collection.estimated_document_count())
+        COUNT_CACHE.set(key, total)
+    return total
+
+def forget_count(collection, query: dict):
+    COUNT_CACHE.invalidate(_count_key(collection, query))
+
+class PhoneDirectory:
+    """Curated hospital/pharmacy phone numbers (HOSPITAL_DATA / PHARMACY_DATA), indexed
+    once at load so a lookup touches a few entries instead of scanning them all.
+
+    A place matches an entry with the same normalized name, or when one name's words
+    all appear in the other ('KIMS' vs 'KIMS Hospitals'); the earliest such entry wins,
+    as with the old linear scan. Failing that, names sharing a specific word are
+    compared fuzzily. Results are memoized per OSM place.
+    """
+
+    TOKEN = re.compile(r'[a-z0-9]+')
+    MAX_POSTINGS = 64  # a word shared by more entries than this is too generic to match on
+    FUZZY_CUTOFF = 0.88
+    MAX_FUZZY_CANDIDATES = 200
+
+    def __init__(self, entries, memo_size: int = 100000):
+        self.names: List[str] = []
+        self.phones: List[str] = []
+        self.token_sets: List[frozenset] = []
+        self.exact: Dict[str, int] = {}
+        self.postings: Dict[str, List[int]] = {}
+        for name, phone in entries:
+            tokens = self.TOKEN.findall(name.lower())
+            if not tokens or not phone:
+                continue
+            i = len(self.names)
+            key = " ".join(tokens)
+            self.names.append(key)
+            self.phones.append(phone)
+            self.token_sets.append(frozenset(tokens))
+            self.exact.setdefault(key, i)
+            for token in set(tokens):
+                self.postings.setdefault(token, []).append(i)
+        # An entry whose words all appear in a place name includes its own rarest word, so
+        # indexing each entry once, under that word, finds every such entry from the name's words
+        self.signatures: Dict[str, List[int]] = {}
+        for i, tokens in enumerate(self.token_sets):
+            rarest = min(tokens, key=lambda t: (len(self.postings[t]), t))
+            self.signatures.setdefault(rarest, []).append(i)
+        self.memo = TTLCache(max_size=memo_size, ttl=24 * 3600)
+        self.lookups = 0
+        self.matches = {"exact": 0, "contained": 0, "fuzzy": 0, "none": 0}
+
+    @classmethod
+    def from_data(cls, hospital_data: dict, pharmacy_data: dict) -> "PhoneDirectory":
+        def entries():
+            # Hospitals before pharmacies, as the old scan searched them
+            for district in hospital_data.values():
+                for hospital in district.get("hospitals", []):
+                    yield hospital["name"], hospital.get("phone")
+            for district in pharmacy_data.values():
+                for pharmacy in district.get("pharmacies", []):
+                    yield pharmacy["name"], pharmacy.get("phone")
+        return cls(entries())
+
+    def _match(self, name: str) -> tuple:
+        tokens = self.TOKEN.findall(name.lower())
+        if not tokens:
+            return None, "none"
+        i = self.exact.get(" ".join(tokens))
+        if i is not None:
+            return i, "exact"
+
+        query = frozenset(tokens)
+        found = [i for t in query for i in self.signatures.get(t, ()) if self.token_sets[i] <= query]
+        rarest = self.postings.get(min(query, key=lambda t: len(self.postings.get(t, ()))), ())
+        if len(rarest) <= self.MAX_POSTINGS:
+            found.extend(i for i in rarest if query <= self.token_sets[i])
+        if found:
+            return min(found), "contained"
+
+        candidates = set()
+        for token in query:
+            posting = self.postings.get(token, ())
+            if len(posting) <= self.MAX_POSTINGS:
+                candidates.update(posting)
+        if not candidates or len(candidates) > self.MAX_FUZZY_CANDIDATES:
+            return None, "none"
+        matcher = difflib.SequenceMatcher(b=" ".join(tokens), autojunk=False)
+        best, best_ratio = None, self.FUZZY_CUTOFF
+        for i in sorted(candidates):
+            matcher.set_seq1(self.names[i])
+            if matcher.real_quick_ratio() >= best_ratio and matcher.quick_ratio() >= best_ratio:
+                ratio = matcher.ratio()
+                if ratio > best_ratio or (ratio == best_ratio and best is None):
+                    best, best_ratio = i, ratio
+        return (best, "fuzzy") if best is not None else (None, "none")
+
+    def lookup(self, name: str, place_id: Optional[str] = None) -> Optional[str]:
+        self.lookups += 1
+        memo_key = (place_id, name) if place_id else None
+        if memo_key:
+            cached = self.memo.get(memo_key)
+            if cached is not None:
+                return cached or None
+        i, how = self._match(name)
+        self.matches[how] += 1
+        phone = self.phones[i] if i is not None else None
+        if memo_key:
+            self.memo.set(memo_key, phone or "")
+        return phone
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.names),
+            "lookups": self.lookups,
+            "matches": dict(self.matches),
+            "memo": self.memo.stats(),
+        }
+
+PHONE_DIRECTORY = PhoneDirectory.from_data(HOSPITAL_DATA, PHARMACY_DATA)
+
+def get_justdial_phone(place_name: str, place_id: Optional[str] = None) -> Optional[str]:
+    """Look up hospital/pharmacy phone in the curated Justdial-like database."""
+    return PHONE_DIRECTORY.lookup(place_name, place_id)
+
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(BCRYPT_ROUNDS)).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
+    if not hashed:
+        return False
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+class PasswordHasher:
+    """Runs bcrypt on a bounded thread pool so hashing never stalls the event loop.
+
+    At most max_pending jobs are handed to the pool at once; further callers wait
+    their turn and show up in the queue-depth metrics.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = asyncio.Semaphore(max_pending)
+        self.queued = 0
+        self.running = 0
+        self.peak_queued = 0
+        self.completed = 0
+        self.total_wait = 0.0
+
+    async def _run(self, fn, *args):
+        self.queued += 1
+        self.peak_queued = max(self.peak_queued, self.queued)
+        enqueued_at = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.total_wait += time.perf_counter() - enqueued_at
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        if not hashed:
+            return False
+        return await self._run(verify_password, password, hashed)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+            "queued": self.queued,
+            "running": self.running,
+            "peak_queued": self.peak_queued,
+            "completed": self.completed,
+            "avg_queue_wait_ms": round(1000 * self.total_wait / self.completed, 3) if self.completed else None,
+        }
+
+PASSWORD_HASHER = PasswordHasher(workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING)
+
+# Reset codes are short-lived, random and server-issued, so a keyed HMAC is enough;
+# bcrypt'ing a 6-digit code only burns CPU. Legacy bcrypt'd codes still verify.
+RESET_CODE_SCHEME = "hmac-sha256$"
+# Wrong guesses allowed per issued code before it is deleted
+RESET_CODE_MAX_ATTEMPTS = int(os.environ.get('RESET_CODE_MAX_ATTEMPTS', 5))
+
+def hash_reset_code(email: str, code: str) -> str:
+    digest = hmac.new(JWT_SECRET.encode('utf-8'), f"{email.lower()}:{code}".encode('utf-8'), hashlib.sha256).hexdigest()
+    return RESET_CODE_SCHEME + digest
+
+async def verify_reset_code_hash(email: str, code: str, stored: str) -> bool:
+    if not stored:
+        return False
+    if stored.startswith(RESET_CODE_SCHEME):
+        return hmac.compare_digest(hash_reset_code(email, code), stored)
+    return await PASSWORD_HASHER.verify(code, stored)
+
+async def check_reset_code(email: str, code: str) -> None:
+    """Raises 400 unless `code` is the live reset code for `email`.
+
+    Every check first claims one of RESET_CODE_MAX_ATTEMPTS atomically, so concurrent
+    guesses cannot overrun the cap; a right code hands its attempt back, and the code
+    is deleted once the attempts are used up.
+    """
+    record = await db.password_resets.find_one_and_update(
+        {"email": email, "attempts": {"$not": {"$gte": RESET_CODE_MAX_ATTEMPTS}}},
+        {"$inc": {"attempts": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not record or datetime.now(timezone.utc) > as_utc(record["expires_at"]):
+        raise HTTPException(status_code=400, detail="Invalid or expired code")
+    if await verify_reset_code_hash(email, code, record["code"]):
+        await db.password_resets.update_one({"_id": record["_id"]}, {"$inc": {"attempts": -1}})
+        return
+    if record["attempts"] >= RESET_CODE_MAX_ATTEMPTS:
+        await db.password_resets.delete_one({"_id": record["_id"]})
+    raise HTTPException(status_code=400, detail="Invalid or expired code")
+
 def create_access_token(user_id: str) -> str:
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     payload = {"sub": user_id, "exp": expire, "type": "access"}
@@ -190,17 +846,27 @@ def create_access_token(user_id: str) -> str:
 
 def create_refresh_token(user_id: str) -> str:
     expire = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    payload = {"sub": user_id, "exp": expire, "type": "refresh"}
+    # jti keeps tokens issued in the same second (e.g. two devices) distinct
+    payload = {"sub": user_id, "exp": expire, "type": "refresh", "jti": uuid.uuid4().hex}
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+async def load_user(user_id: str) -> Optional[dict]:
+    user = USER_CACHE.get(user_id)
+    if user is None:
+        user = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
+        if not user:
+            return None
+        USER_CACHE.set(user_id, user)
+    # Hand out a copy so handlers can't mutate the cached document
+    return dict(user)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         if payload.get("type") != "access":
             raise HTTPException(status_code=401, detail="Invalid token type")
-        user_id = payload.get("sub")
-        user = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
+        user = await load_user(payload.get("sub"))
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
         return user
@@ -212,6 +878,528 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
 def user_response(user: dict) -> dict:
     return {k: v for k, v in user.items() if k not in ['password_hash', '_id']}
 
+def as_utc(value) -> datetime:
+    """Normalize a stored timestamp (ISO string from older documents, or a naive BSON date) to aware UTC."""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+# ============== INDEXES ==============
+
+# Every collection/filter server.py relies on. expires_at fields are real dates so
+# Mongo's TTL monitor reaps otps, password_resets, refresh_tokens and cache entries on its own.
+INDEXES = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True,
+                   partialFilterExpression={"email": {"$gt": ""}}),
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True,
+                   partialFilterExpression={"username": {"$gt": ""}}),
+        IndexModel([("mobile", ASCENDING)], name="mobile_unique", unique=True,
+                   partialFilterExpression={"mobile": {"$gt": ""}}),
+    ],
+    "refresh_tokens": [
+        IndexModel([("token", ASCENDING)], name="token_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("device_id", ASCENDING)], name="user_device_unique", unique=True,
+                   partialFilterExpression={"device_id": {"$exists": True}}),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "uploads": [
+        # (created_at, id) is the keyset pagination order
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_recent_id"),
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "chat_history": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_recent_id"),
+    ],
+    "doctors": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # /doctors filters on whole tokens ($in) and sorts by rating or name, id breaking
+        # ties; equality on the leading field lets these indexes return the sort order
+        IndexModel([("condition_tokens", ASCENDING), ("avg_rating", DESCENDING), ("id", ASCENDING)], name="condition_rating"),
+        IndexModel([("specialty_tokens", ASCENDING), ("avg_rating", DESCENDING), ("id", ASCENDING)], name="specialty_rating"),
+        IndexModel([("condition_tokens", ASCENDING), ("name", ASCENDING), ("id", ASCENDING)], name="condition_name"),
+        IndexModel([("specialty_tokens", ASCENDING), ("name", ASCENDING), ("id", ASCENDING)], name="specialty_name"),
+        IndexModel([("avg_rating", DESCENDING), ("id", ASCENDING)], name="rating"),
+        IndexModel([("name", ASCENDING), ("id", ASCENDING)], name="name"),
+        IndexModel([("location", "2dsphere")], name="location_2dsphere"),  # sort=distance ($geoNear)
+    ],
+    "doctor_feedback": [
+        IndexModel([("doctor_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="doctor_recent_id"),
+    ],
+    "otps": [
+        IndexModel([("identifier", ASCENDING)], name="identifier_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "password_resets": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "notification_outbox": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_due"),
+        IndexModel([("claim_token", ASCENDING)], name="claim_token", sparse=True),
+        IndexModel([("purge_at", ASCENDING)], name="purge_at_ttl", expireAfterSeconds=0),
+    ],
+    "rate_limits": [
+        IndexModel([("key", ASCENDING)], name="key_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "pois": [
+        IndexModel([("location", "2dsphere")], name="location_2dsphere"),
+        IndexModel([("osm_type", ASCENDING), ("id", ASCENDING)], name="osm_type_id_unique", unique=True),
+        IndexModel([("type", ASCENDING), ("tile", ASCENDING)], name="type_tile"),
+    ],
+    "poi_regions": [
+        IndexModel([("key", ASCENDING)], name="key_unique", unique=True),
+    ],
+    "poi_imports": [
+        IndexModel([("key", ASCENDING)], name="key_unique", unique=True),
+    ],
+    "cache": [
+        IndexModel([("key", ASCENDING)], name="key_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+INDEX_LEADING_FIELDS = {
+    name: {next(iter(model.document["key"])) for model in models}
+    for name, models in INDEXES.items()
+}
+
+async def ensure_indexes():
+    """Create the declared indexes; already-existing identical indexes are a no-op."""
+    for name, models in INDEXES.items():
+        for model in models:
+            try:
+                await db[name].create_indexes([model])
+            except OperationFailure as e:
+                # e.g. duplicate emails in old data, or an index with the same keys but other options
+                logger.error(f"Could not create index {name}.{model.document['name']}: {e}")
+    logger.info(f"Indexes ensured for {len(INDEXES)} collections")
+
+# ============== HTTP CLIENTS ==============
+
+NOMINATIM_URL = os.environ.get('NOMINATIM_URL', 'https://nominatim.openstreetmap.org')
+OVERPASS_URL = os.environ.get('OVERPASS_URL', 'https://overpass-api.de/api')
+OSRM_URL = os.environ.get('OSRM_URL', 'https://router.project-osrm.org')
+HTTP_USER_AGENT = os.environ.get('HTTP_USER_AGENT', 'MediGuide/1.0')
+HTTP_KEEPALIVE_SECONDS = float(os.environ.get('HTTP_KEEPALIVE_SECONDS', 60))
+HTTP_CA_BUNDLE = os.environ.get('HTTP_CA_BUNDLE')  # custom CA file for intercepting proxies; TLS is always verified
+
+try:
+    import h2  # noqa: F401 -- installed via httpx[http2]
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Per integration: base URL, timeout (seconds) and connection cap. Timeouts can be
+# overridden with <NAME>_TIMEOUT_SECONDS, e.g. OVERPASS_TIMEOUT_SECONDS=30.
+HTTP_INTEGRATIONS = {
+    # Nominatim's usage policy allows ~1 req/s, so a couple of connections is plenty
+    "nominatim": {"base_url": NOMINATIM_URL, "timeout": 10, "max_connections": 2},
+    # Queries run with [timeout:10] on the server, plus transfer time
+    "overpass": {"base_url": OVERPASS_URL, "timeout": 15, "max_connections": 4},
+    "osrm": {"base_url": OSRM_URL, "timeout": 10, "max_connections": 8},
+    "google": {"base_url": "", "timeout": 10, "max_connections": 2},
+}
+
+class HttpClients:
+    """App-lifespan registry of pooled httpx clients, one per outbound integration.
+
+    Each client keeps its connections alive between requests (and negotiates HTTP/2
+    when h2 is installed), so only the first call to a host pays for DNS, TCP and
+    TLS. Tests can swap an integration for a client pointed at a local stand-in with
+    register().
+    """
+
+    def __init__(self, integrations: Dict[str, Dict[str, Any]]):
+        self.integrations = integrations
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._injected = set()
+        self._stats = {name: {"requests": 0, "new_connections": 0, "http2_responses": 0} for name in integrations}
+
+    def _trace(self, name: str):
+        stats = self._stats[name]
+
+        async def trace(event: str, info: dict):
+            if event == "connection.connect_tcp.complete":
+                stats["new_connections"] += 1
+        return trace
+
+    def _build(self, name: str) -> httpx.AsyncClient:
+        spec = self.integrations[name]
+        stats = self._stats[name]
+        trace = self._trace(name)
+
+        async def on_request(request: httpx.Request):
+            stats["requests"] += 1
+            request.extensions["trace"] = trace
+
+        async def on_response(response: httpx.Response):
+            if response.http_version == "HTTP/2":
+                stats["http2_responses"] += 1
+
+        timeout = float(os.environ.get(f"{name.upper()}_TIMEOUT_SECONDS", spec["timeout"]))
+        return httpx.AsyncClient(
+            base_url=spec["base_url"],
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)),
+            limits=httpx.Limits(
+                max_connections=spec["max_connections"],
+                max_keepalive_connections=spec["max_connections"],
+                keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+            ),
+            http2=HTTP2_AVAILABLE,
+            verify=HTTP_CA_BUNDLE or True,
+            headers={"User-Agent": HTTP_USER_AGENT},
+            event_hooks={"request": [on_request], "response": [on_response]},
+        )
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._clients[name] = self._build(name)
+        return client
+
+    def register(self, name: str, client: httpx.AsyncClient):
+        """Use `client` for an integration (e.g. a stand-in server in tests). The caller keeps ownership."""
+        self._stats.setdefault(name, {"requests": 0, "new_connections": 0, "http2_responses": 0})
+        self._clients[name] = client
+        self._injected.add(name)
+
+    def start(self):
+        for name in self.integrations:
+            self.get(name)
+
+    async def aclose(self):
+        for name, client in list(self._clients.items()):
+            if name not in self._injected:
+                await client.aclose()
+                del self._clients[name]
+
+    def stats(self) -> dict:
+        out = {"http2_available": HTTP2_AVAILABLE}
+        for name, s in self._stats.items():
+            reused = max(0, s["requests"] - s["new_connections"])
+            out[name] = {**s, "reused_connections": reused,
+                         "reuse_ratio": round(reused / s["requests"], 3) if s["requests"] else 0.0}
+        return out
+
+HTTP_CLIENTS = HttpClients(HTTP_INTEGRATIONS)
+
+class SingleFlight:
+    """Coalesces concurrent identical upstream calls onto one in-flight task.
+
+    The first caller for a key starts the call; anyone asking for the same key while
+    it runs awaits the same task instead of sending a duplicate request. The task is
+    shielded, so a leader whose client disconnects doesn't cancel it for everyone
+    else, and followers give up after their own timeout without affecting the call.
+    """
+
+    def __init__(self, follower_timeout: float):
+        self.follower_timeout = follower_timeout
+        self._inflight: Dict[Any, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+        self.follower_timeouts = 0
+
+    def _done(self, key, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter has gone away
+
+    async def do(self, key, fn):
+        task = self._inflight.get(key)
+        if task is not None:
+            self.shared += 1
+            try:
+                return await asyncio.wait_for(asyncio.shield(task), self.follower_timeout)
+            except asyncio.TimeoutError:
+                self.follower_timeouts += 1
+                raise
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+        self.calls += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        requested = self.calls + self.shared
+        return {
+            "upstream_calls": self.calls,
+            "saved_calls": self.shared,
+            "follower_timeouts": self.follower_timeouts,
+            "in_flight": len(self._inflight),
+            "saved_ratio": round(self.shared / requested, 4) if requested else None,
+        }
+
+# Time a call may spend queued before it is sent (see RequestScheduler)
+UPSTREAM_QUEUE_WAIT_SECONDS = {"nominatim": NOMINATIM_MAX_WAIT_SECONDS}
+
+# Followers wait as long as the leader's call may take: its turn in the upstream's
+# queue plus the request itself. Giving up sooner just sends the duplicate anyway.
+SINGLE_FLIGHT = {
+    name: SingleFlight(follower_timeout=UPSTREAM_QUEUE_WAIT_SECONDS.get(name, 0)
+                       + float(os.environ.get(f"{name.upper()}_TIMEOUT_SECONDS", spec["timeout"])))
+    for name, spec in HTTP_INTEGRATIONS.items()
+}
+
+class RequestScheduler:
+    """Spaces calls to an upstream at least `min_interval` apart (per process).
+
+    Each caller reserves the next free slot and sleeps until it comes round, so a
+    burst queues up instead of tripping the upstream's rate limit. Callers whose
+    slot is further out than `max_wait` are turned away immediately.
+    """
+
+    def __init__(self, min_interval: float, max_wait: float):
+        self.min_interval = min_interval
+        self.max_wait = max_wait
+        self._next_slot = 0.0
+        self.waiting = 0
+        self.scheduled = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+
+    async def turn(self):
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        if slot - now > self.max_wait:
+            self.rejected += 1
+            raise RuntimeError(f"upstream queue full ({slot - now:.1f}s wait)")
+        # Reserving before sleeping is atomic on the event loop
+        self._next_slot = slot + self.min_interval
+        self.scheduled += 1
+        self.total_wait += slot - now
+        if slot > now:
+            self.waiting += 1
+            try:
+                await asyncio.sleep(slot - now)
+            finally:
+                self.waiting -= 1
+
+    def stats(self) -> dict:
+        return {
+            "scheduled": self.scheduled,
+            "rejected": self.rejected,
+            "waiting": self.waiting,
+            "avg_wait_ms": round(1000 * self.total_wait / self.scheduled, 1) if self.scheduled else None,
+        }
+
+# Nominatim's usage policy: at most one request per second
+NOMINATIM_SCHEDULER = RequestScheduler(NOMINATIM_MIN_INTERVAL_SECONDS, NOMINATIM_MAX_WAIT_SECONDS)
+
+# Geocoding results barely change, and users keep typing the same town names
+GEOCODE_CACHE = TwoTierCache(db.cache, ttl=GEOCODE_CACHE_TTL_SECONDS, max_size=GEOCODE_CACHE_MAX_SIZE)
+
+def geocode_query_key(query: str) -> str:
+    # 'Nellore', ' nellore ' and 'Nellore,' are the same search
+    return " ".join(re.sub(r'[^\w\s]', ' ', query.lower()).split())
+
+async def nominatim_reverse(lat: float, lng: float) -> Optional[dict]:
+    # ~11 m cells: nearby fixes share one lookup (and we send the rounded point, so the
+    # cached answer is exactly what Nominatim said for it)
+    lat, lng = round(lat, 4), round(lng, 4)
+    key = f"geo:reverse:{lat:.4f}:{lng:.4f}"
+    cached = await GEOCODE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    async def call():
+        await NOMINATIM_SCHEDULER.turn()
+        resp = await HTTP_CLIENTS.get("nominatim").get("/reverse", params={"lat": lat, "lon": lng, "format": "json"})
+        if resp.status_code != 200:
+            return None
+        data = resp.json()
+        # Nominatim answers 200 {"error": ...} for the sea and other unaddressable points
+        result = {"display_name": data["display_name"]} if data.get("display_name") else {}
+        await GEOCODE_CACHE.set(key, result, ttl=None if result else GEOCODE_NEGATIVE_TTL_SECONDS)
+        return result
+    return await SINGLE_FLIGHT["nominatim"].do(("reverse", lat, lng), call)
+
+async def nominatim_search(query: str) -> Optional[list]:
+    # The normalized form only keys the cache; Nominatim gets the user's own text,
+    # separators and all, which matter for addresses like "12-3-45, St. Joseph's"
+    normalized = geocode_query_key(query)
+    query = " ".join(query.split())
+    key = f"geo:search:{normalized}"
+    cached = await GEOCODE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    async def call():
+        await NOMINATIM_SCHEDULER.turn()
+        resp = await HTTP_CLIENTS.get("nominatim").get("/search", params={"q": query, "format": "json", "limit": 1})
+        if resp.status_code != 200:
+            return None
+        result = [{k: r[k] for k in ("lat", "lon", "display_name") if k in r} for r in resp.json()[:1]]
+        await GEOCODE_CACHE.set(key, result, ttl=None if result else GEOCODE_NEGATIVE_TTL_SECONDS)
+        return result
+    return await SINGLE_FLIGHT["nominatim"].do(("search", normalized), call)
+
+async def overpass_query(query: str) -> Optional[dict]:
+    query = "\n".join(line.strip() for line in query.strip().splitlines())
+
+    async def call():
+        resp = await HTTP_CLIENTS.get("overpass").post("/interpreter", data={"data": query})
+        return resp.json() if resp.status_code == 200 else None
+    return await SINGLE_FLIGHT["overpass"].do(query, call)
+
+async def osrm_route(from_lat: float, from_lng: float, to_lat: float, to_lng: float) -> Optional[dict]:
+    path = f"/route/v1/driving/{from_lng},{from_lat};{to_lng},{to_lat}"
+
+    async def call():
+        resp = await HTTP_CLIENTS.get("osrm").get(path, params={"overview": "full", "geometries": "geojson"})
+        return resp.json() if resp.status_code == 200 else None
+    return await SINGLE_FLIGHT["osrm"].do(path, call)
+
+async def osrm_table(from_lat: float, from_lng: float, destinations: List[tuple]) -> Optional[dict]:
+    """Durations (s) and distances (m) from one origin to every (lat, lng) in one call."""
+    coords = ";".join(f"{lng},{lat}" for lat, lng in [(from_lat, from_lng), *destinations])
+    path = f"/table/v1/driving/{coords}"
+
+    async def call():
+        resp = await HTTP_CLIENTS.get("osrm").get(path, params={"sources": "0", "annotations": "duration,distance"})
+        return resp.json() if resp.status_code == 200 else None
+    return await SINGLE_FLIGHT["osrm"].do(path, call)
+
+# ============== RATE LIMITING ==============
+
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')  # "memory" (per process) or "mongo" (shared)
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', 100000))
+RATE_LIMIT_TRUST_FORWARDED = os.environ.get('RATE_LIMIT_TRUST_FORWARDED', 'false').lower() in ('1', 'true', 'yes')
+
+def sliding_log_retry_after(hits, limit: int, window: int, now: float) -> int:
+    """Sliding log: a key keeps the timestamps of its last `limit` allowed hits, so the
+    limit holds exactly over any `window` seconds. Returns 0 when the hit is allowed,
+    else the seconds until the oldest logged hit leaves the window."""
+    if len(hits) < limit:
+        return 0
+    return max(1, math.ceil(hits[-limit] + window - now))
+
+class MemoryRateLimitBackend:
+    """Per-process hit logs, LRU-evicted beyond max_keys so memory stays bounded."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._logs: "OrderedDict[str, deque]" = OrderedDict()
+        self.evictions = 0
+
+    async def hit(self, key: str, limit: int, window: int) -> int:
+        now = time.time()
+        hits = self._logs.get(key)
+        if hits is None:
+            hits = deque(maxlen=limit)
+        self._logs[key] = hits
+        self._logs.move_to_end(key)
+        while len(self._logs) > self.max_keys:
+            self._logs.popitem(last=False)
+            self.evictions += 1
+
+        while hits and hits[0] <= now - window:
+            hits.popleft()
+        retry_after = sliding_log_retry_after(hits, limit, window, now)
+        if not retry_after:
+            hits.append(now)
+        return retry_after
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "keys": len(self._logs), "max_keys": self.max_keys, "evictions": self.evictions}
+
+class MongoRateLimitBackend:
+    """Hit logs shared by every worker: one document per key, trimmed and appended in a
+    single atomic pipeline update. Idle keys are reaped by the TTL index on expires_at."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def hit(self, key: str, limit: int, window: int) -> int:
+        now = time.time()
+        pipeline = [
+            {"$set": {"hits": {"$filter": {
+                "input": {"$ifNull": ["$hits", []]}, "as": "t", "cond": {"$gt": ["$$t", now - window]},
+            }}}},
+            {"$set": {
+                "allowed": {"$lt": [{"$size": "$hits"}, limit]},
+                "expires_at": datetime.now(timezone.utc) + timedelta(seconds=window),
+            }},
+            {"$set": {"hits": {"$cond": [
+                "$allowed", {"$slice": [{"$concatArrays": ["$hits", [now]]}, -limit]}, "$hits",
+            ]}}},
+        ]
+        for attempt in range(2):
+            try:
+                doc = await self.collection.find_one_and_update(
+                    {"key": key}, pipeline, upsert=True, return_document=ReturnDocument.AFTER
+                )
+                break
+            except DuplicateKeyError:
+                # Two first hits raced on the upsert; the retry finds the other's document
+                if attempt:
+                    raise
+        if doc["allowed"]:
+            return 0
+        return sliding_log_retry_after(doc["hits"], limit, window, now)
+
+    def stats(self) -> dict:
+        return {"backend": "mongo"}
+
+class RateLimiter:
+    def __init__(self, backend):
+        self.backend = backend
+        self.allowed: Dict[str, int] = {}
+        self.limited: Dict[str, int] = {}
+
+    async def check(self, scope: str, identity: str, limit: int, window: int, detail: str):
+        retry_after = await self.backend.hit(f"{scope}:{identity}", limit, window)
+        if retry_after:
+            self.limited[scope] = self.limited.get(scope, 0) + 1
+            raise HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(retry_after)})
+        self.allowed[scope] = self.allowed.get(scope, 0) + 1
+
+    def stats(self) -> dict:
+        return {**self.backend.stats(), "allowed": self.allowed, "limited": self.limited}
+
+RATE_LIMITER = RateLimiter(
+    MongoRateLimitBackend(db.rate_limits) if RATE_LIMIT_BACKEND == "mongo" else MemoryRateLimitBackend(RATE_LIMIT_MAX_KEYS)
+)
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def rate_limit(scope: str, limit: int, window: int, key: str = "ip",
+               detail: str = "Too many requests. Please try again later."):
+    """Route dependency enforcing `limit` hits per `window` seconds.
+
+    key is "ip", "user" (the authenticated user id) or "body:<field>" (a JSON body
+    field such as the email being logged into, falling back to the client IP).
+    """
+    if key == "user":
+        async def dependency(user: dict = Depends(get_current_user)):
+            await RATE_LIMITER.check(scope, user["id"], limit, window, detail)
+    elif key.startswith("body:"):
+        field = key[len("body:"):]
+
+        async def dependency(request: Request):
+            try:
+                body = await request.json()
+            except Exception:
+                body = {}
+            value = body.get(field) if isinstance(body, dict) else None
+            identity = str(value).strip().lower() if value else client_ip(request)
+            await RATE_LIMITER.check(scope, identity, limit, window, detail)
+    else:
+        async def dependency(request: Request):
+            await RATE_LIMITER.check(scope, client_ip(request), limit, window, detail)
+    return Depends(dependency)
+
 # Medical keywords for chatbot filtering
 MEDICAL_KEYWORDS = [
     'hospital', 'medicine', 'disease', 'symptom', 'doctor', 'health', 'medical', 'treatment',
@@ -266,24 +1454,183 @@ MEDICAL_KEYWORDS = [
 
 ]
 
+# Hindi / Telugu stems: matched as word prefixes, since both languages inflect by suffix
+# (बुखार -> बुखारों, జ్వరం -> జ్వరంతో)
+MEDICAL_KEYWORDS_HI = [
+    'अस्पताल', 'हॉस्पिटल', 'दवा', 'दवाई', 'डॉक्टर', 'डाक्टर', 'चिकित्सा', 'बीमार', 'रोग', 'लक्षण',
+    'इलाज', 'उपचार', 'बुखार', 'खांसी', 'खाँसी', 'जुकाम', 'सर्दी', 'दर्द', 'सिरदर्द', 'पेट दर्द',
+    'उल्टी', 'दस्त', 'मधुमेह', 'शुगर', 'डायबिटीज', 'रक्तचाप', 'ब्लड प्रेशर', 'बीपी', 'कैंसर',
+    'हृदय', 'दिल की', 'दिल का', 'दिल के', 'गुर्दे', 'किडनी', 'लीवर', 'जिगर', 'फेफड़', 'खून', 'रक्त',
+    'जांच', 'जाँच', 'टेस्ट', 'रिपोर्ट', 'गोली', 'टैबलेट', 'इंजेक्शन', 'टीका', 'वैक्सीन', 'स्वास्थ्य',
+    'सेहत', 'आहार', 'भोजन', 'खाना', 'व्यायाम', 'कसरत', 'योग', 'नींद', 'तनाव', 'चिंता', 'अवसाद',
+    'गर्भ', 'मासिक धर्म', 'पीरियड', 'एलर्जी', 'संक्रमण', 'चोट', 'घाव', 'जलन', 'खुजली', 'सूजन',
+    'कमजोरी', 'कमज़ोरी', 'थकान', 'चक्कर', 'मोटापा', 'वजन', 'वज़न', 'विटामिन', 'प्रोटीन', 'आयुर्वेद',
+    'दांत', 'दाँत', 'आंख', 'आँख', 'त्वचा', 'फार्मेसी', 'मेडिकल', 'नर्स', 'एम्बुलेंस', 'आपातकाल',
+    'ऑपरेशन', 'सर्जरी', 'मरीज',
+]
+
+MEDICAL_KEYWORDS_TE = [
+    'ఆసుపత్రి', 'ఆస్పత్రి', 'హాస్పిటల్', 'మందు', 'మాత్ర', 'డాక్టర్', 'వైద్య', 'చికిత్స', 'వ్యాధి',
+    'రోగ', 'లక్షణ', 'జ్వర', 'దగ్గు', 'జలుబు', 'నొప్పి', 'తలనొప్పి', 'కడుపు', 'వాంతు', 'విరేచన',
+    'షుగర్', 'మధుమేహ', 'డయాబెటిస్', 'రక్తపోటు', 'బీపీ', 'క్యాన్సర్', 'గుండె', 'కిడ్నీ', 'మూత్రపిండ',
+    'కాలేయ', 'లివర్', 'ఊపిరితిత్తు', 'రక్త', 'పరీక్ష', 'టెస్ట్', 'రిపోర్ట్', 'ఇంజెక్షన్', 'టీకా',
+    'వ్యాక్సిన్', 'ఆరోగ్య', 'ఆహార', 'వ్యాయామ', 'యోగా', 'నిద్ర', 'ఒత్తిడి', 'ఆందోళన', 'డిప్రెషన్',
+    'గర్భ', 'నెలసరి', 'పీరియడ్', 'అలెర్జీ', 'ఇన్ఫెక్షన్', 'గాయం', 'గాయాలు', 'దురద', 'వాపు', 'నీరసం',
+    'అలసట', 'తల తిరుగు', 'బరువు', 'విటమిన్', 'ప్రోటీన్', 'ఆయుర్వేద', 'పళ్ళ', 'దంత', 'కళ్ళ', 'కంటి',
+    'చర్మ', 'ఫార్మసీ', 'మెడికల్', 'నర్సు', 'అంబులెన్స్', 'అత్యవసర', 'ఆపరేషన్', 'సర్జరీ', 'పేషెంట్',
+]
+
+def _trie_pattern(words) -> str:
+    """Regex alternation factored into a character trie, so each position in the text is
+    tested against one branch per distinct next character instead of every keyword."""
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def render(node) -> str:
+        branches = [re.escape(ch) + render(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return render(trie)
+
+class MedicalQueryMatcher:
+    """Keyword matcher built once from the deduplicated keyword lists.
+
+    Every keyword is matched as a prefix of a token, so 'pain' covers 'painful' and
+    'fever' covers 'feverish' while 'eat' still misses 'great'. English keywords ending
+    in a silent 'e'/'y' are stemmed ('allergy' -> 'allerg' for 'allergic'), and 'ache'
+    also closes compounds like 'toothache'. English keywords share one trie-shaped
+    regex over the normalized message; Hindi/Telugu stems have their own, which only
+    runs when the message has non-ASCII text.
+    """
+
+    # ASCII punctuation splits tokens ('x-ray' -> 'x ray', 'fever?' -> 'fever')
+    PUNCTUATION = re.compile('[%s]+' % re.escape(string.punctuation))
+    # Keywords that also match at the end of a compound token
+    COMPOUND_SUFFIXES = ('ache',)
+
+    def __init__(self, english, indic):
+        stems = set()
+        for keyword in english:
+            phrase = ' '.join(self.PUNCTUATION.sub(' ', keyword.lower()).split())
+            if not phrase:
+                continue
+            if ' ' not in phrase and len(phrase) >= 5 and phrase[-1] in 'ey':
+                phrase = phrase[:-1]
+            stems.add(phrase)
+        # Leading literal space: the regex engine skips straight to token starts
+        self.english = re.compile(f' (?:{_trie_pattern(sorted(stems))})')
+        self.compounds = re.compile(f'(?:{_trie_pattern(sorted(self.COMPOUND_SUFFIXES))})s? ')
+        indic_stems = sorted({' '.join(k.split()) for k in indic})
+        self.indic = re.compile(f' (?:{_trie_pattern(indic_stems)})')
+
+    def matches(self, text: str) -> bool:
+        text = text.lower()
+        padded = f" {' '.join(self.PUNCTUATION.sub(' ', text).split())} "
+        if self.english.search(padded) is not None:
+            return True
+        # A compound needs a few letters in front: 'toothache' but not 'cache'
+        if any(padded[m.start() - 3:m.start()].isalpha() for m in self.compounds.finditer(padded, 3)):
+            return True
+        return not text.isascii() and self.indic.search(padded) is not None
+
+# Built once at import. Keywords match from the start of a word, so 'eat' no longer
+# matches 'great' and 'ct' no longer matches 'act'.
+MEDICAL_MATCHER = MedicalQueryMatcher(MEDICAL_KEYWORDS, MEDICAL_KEYWORDS_HI + MEDICAL_KEYWORDS_TE)
+
 def is_medical_query(text: str) -> bool:
-    text_lower = text.lower()
-    return any(keyword in text_lower for keyword in MEDICAL_KEYWORDS)
+    return MEDICAL_MATCHER.matches(text)
+
+# ============== TOKEN ISSUANCE ==============
+
+DEFAULT_DEVICE_ID = "default"
+# X-Device-Id is client-chosen: only short opaque ids are accepted, and each user keeps
+# at most REFRESH_TOKENS_MAX_PER_USER device sessions (the oldest are revoked first)
+DEVICE_ID_PATTERN = re.compile(r'[A-Za-z0-9._:-]{1,64}')
+REFRESH_TOKENS_MAX_PER_USER = int(os.environ.get('REFRESH_TOKENS_MAX_PER_USER', 10))
+
+def device_id_from(request: Request) -> str:
+    """Clients may send X-Device-Id to keep one refresh token per device instead of one per user.
+    Anything that isn't a short opaque id falls back to the shared default session."""
+    device_id = request.headers.get("x-device-id", "").strip()
+    return device_id if DEVICE_ID_PATTERN.fullmatch(device_id) else DEFAULT_DEVICE_ID
+
+async def prune_refresh_tokens(user_id: str):
+    """Revoke the user's pre-device-id tokens and all but the newest device sessions."""
+    await db.refresh_tokens.delete_many({"user_id": user_id, "device_id": {"$exists": False}})
+    surplus = await db.refresh_tokens.find(
+        {"user_id": user_id}, {"_id": 1}
+    ).sort("issued_at", DESCENDING).skip(REFRESH_TOKENS_MAX_PER_USER).to_list(None)
+    if surplus:
+        await db.refresh_tokens.delete_many({"_id": {"$in": [doc["_id"] for doc in surplus]}})
+
+async def store_refresh_token(user_id: str, device_id: str, refresh_token: str):
+    """Rotate the (user, device) refresh token with one atomic upsert.
+
+    The unique (user_id, device_id) index makes concurrent logins for the same device
+    converge on a single document instead of racing a delete against an insert. Only
+    a login from a new device adds a document, so only then are the user's sessions
+    pruned; expired ones are reaped by the TTL index on expires_at.
+    """
+    now = datetime.now(timezone.utc)
+    for attempt in range(2):
+        try:
+            result = await db.refresh_tokens.update_one(
+                {"user_id": user_id, "device_id": device_id},
+                {"$set": {"token": refresh_token, "issued_at": now,
+                          "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)}},
+                upsert=True
+            )
+            break
+        except DuplicateKeyError:
+            # Lost the insert race to a concurrent login; the retry updates its document
+            if attempt:
+                raise
+    if result.upserted_id is not None:
+        await prune_refresh_tokens(user_id)
+
+async def issue_tokens(user_id: str, device_id: str) -> tuple:
+    access_token = create_access_token(user_id)
+    refresh_token = create_refresh_token(user_id)
+    await store_refresh_token(user_id, device_id, refresh_token)
+    return access_token, refresh_token
+
+async def upsert_login_user(query: dict, new_user: dict) -> dict:
+    """Find-or-create a user and stamp last_login_at in a single round trip."""
+    now = datetime.now(timezone.utc).isoformat()
+    new_user = {k: v for k, v in new_user.items() if k not in query and k != "last_login_at"}
+    for attempt in range(2):
+        try:
+            user = await db.users.find_one_and_update(
+                query,
+                {"$set": {"last_login_at": now}, "$setOnInsert": {**new_user, "created_at": now}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            invalidate_user_cache(user["id"])
+            return user
+        except DuplicateKeyError:
+            # A concurrent first login created the user; the retry matches it
+            if attempt:
+                raise
 
 # ============== AUTH ROUTES ==============
 
 @api_router.post("/auth/register", response_model=TokenResponse)
-async def register(user_data: UserCreate):
-    existing = await db.users.find_one({"email": user_data.email})
-    if existing:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
+@LOGIN_ROUND_TRIPS.tracked("register")
+async def register(user_data: UserCreate, request: Request):
     user_id = str(uuid.uuid4())
     user = {
         "id": user_id,
         "name": user_data.name,
         "email": user_data.email,
-        "password_hash": hash_password(user_data.password),
+        "password_hash": await PASSWORD_HASHER.hash(user_data.password),
         "preferred_language": user_data.preferred_language,
         "theme": "system",
         "location_mode": user_data.location_mode,
@@ -294,11 +1641,13 @@ async def register(user_data: UserCreate):
         "created_at": datetime.now(timezone.utc).isoformat(),
         "last_login_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.users.insert_one(user)
+    try:
+        # users.email is unique (see INDEXES), so the insert itself is the existence check
+        await db.users.insert_one(user)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
     
-    access_token = create_access_token(user_id)
-    refresh_token = create_refresh_token(user_id)
-    await db.refresh_tokens.insert_one({"token": refresh_token, "user_id": user_id})
+    access_token, refresh_token = await issue_tokens(user_id, device_id_from(request))
     
     return TokenResponse(
         access_token=access_token,
@@ -306,8 +1655,12 @@ async def register(user_data: UserCreate):
         user=user_response(user)
     )
 
-@api_router.post("/auth/login", response_model=TokenResponse)
-async def login(login_data: UserLogin):
+@api_router.post("/auth/login", response_model=TokenResponse, dependencies=[
+    rate_limit("login", 10, 300, key="body:email", detail="Too many login attempts. Please try again later."),
+    rate_limit("login_ip", 50, 300),
+])
+@LOGIN_ROUND_TRIPS.tracked("password")
+async def login(login_data: UserLogin, request: Request):
     start_time = time.time()
     logger.info(f"Login attempt for {login_data.email}")
     
@@ -318,21 +1671,19 @@ async def login(login_data: UserLogin):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     t0 = time.time()
-    if not verify_password(login_data.password, user.get("password_hash", "")):
+    if not await PASSWORD_HASHER.verify(login_data.password, user.get("password_hash", "")):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     logger.info(f"Password verify took: {time.time() - t0:.4f}s")
     
-    await db.users.update_one(
-        {"id": user["id"]},
-        {"$set": {"last_login_at": datetime.now(timezone.utc).isoformat()}}
+    # last_login_at can only be stamped once the password checks out, so it can't ride
+    # on the lookup; run it alongside the refresh-token rotation instead.
+    now = datetime.now(timezone.utc).isoformat()
+    user["last_login_at"] = now
+    (access_token, refresh_token), _ = await asyncio.gather(
+        issue_tokens(user["id"], device_id_from(request)),
+        db.users.update_one({"id": user["id"]}, {"$set": {"last_login_at": now}})
     )
-    
-    access_token = create_access_token(user["id"])
-    refresh_token = create_refresh_token(user["id"])
-    
-    # Rotate refresh token
-    await db.refresh_tokens.delete_many({"user_id": user["id"]})
-    await db.refresh_tokens.insert_one({"token": refresh_token, "user_id": user["id"]})
+    invalidate_user_cache(user["id"])
     
     return TokenResponse(
         access_token=access_token,
@@ -341,85 +1692,385 @@ async def login(login_data: UserLogin):
     )
 
 # Google & OTP Auth
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
 import re
 from twilio.rest import Client as TwilioClient
 import emails
 
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID")
+GOOGLE_CERTS_URL = os.environ.get("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+class GoogleTokenVerifier:
+    """Verifies Google ID tokens locally against a cached copy of Google's JWKS.
+
+    Keys are kept for the Cache-Control max-age Google sends with them and are
+    refreshed in the background shortly before that runs out, so logins only
+    wait on the network for the very first fetch (or an unknown key id).
+    """
+
+    REFRESH_AT = 0.8  # fraction of max-age after which a background refresh starts
+    MIN_REFETCH_SECONDS = 30  # floor between refetches triggered by unknown key ids
+
+    def __init__(self, certs_url: str, client_id: Optional[str], http_client: Optional[httpx.AsyncClient] = None):
+        self.certs_url = certs_url
+        self.client_id = client_id
+        self._http = http_client
+        self._keys: Dict[str, Any] = {}
+        self._fetched_at = 0.0
+        self._refresh_at = 0.0
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+        self._background = None
+        self.fetches = 0
+        self.verified = 0
+
+    async def _fetch(self):
+        resp = await (self._http or HTTP_CLIENTS.get("google")).get(self.certs_url)
+        resp.raise_for_status()
+        keys = {k.key_id: k for k in jwt.PyJWKSet.from_dict(resp.json()).keys if k.key_id}
+        match = re.search(r'max-age=(\d+)', resp.headers.get("cache-control", ""))
+        max_age = int(match.group(1)) if match else 3600
+        now = time.monotonic()
+        self._keys = keys
+        self._fetched_at = now
+        self._refresh_at = now + max_age * self.REFRESH_AT
+        self._expires_at = now + max_age
+        self.fetches += 1
+        logger.info(f"Fetched {len(keys)} Google signing keys (max-age {max_age}s)")
+
+    async def refresh(self, force: bool = False):
+        async with self._lock:
+            # Another caller may have refreshed while we waited for the lock
+            if force or time.monotonic() >= self._refresh_at:
+                await self._fetch()
+
+    async def _background_refresh(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.warning(f"Background Google key refresh failed: {e}")
+
+    def start(self):
+        """Refresh the keys in the background unless a refresh is already running. The
+        task is held on the verifier so it isn't garbage-collected and stop() can cancel it."""
+        if self._background is None or self._background.done():
+            self._background = asyncio.create_task(self._background_refresh())
+
+    async def stop(self):
+        if self._background is not None:
+            self._background.cancel()
+            try:
+                await self._background
+            except asyncio.CancelledError:
+                pass
+            self._background = None
+
+    async def _key_for(self, kid: str):
+        now = time.monotonic()
+        if now >= self._expires_at:
+            await self.refresh()
+        elif now >= self._refresh_at:
+            self.start()
+        key = self._keys.get(kid)
+        if key is None and time.monotonic() - self._fetched_at >= self.MIN_REFETCH_SECONDS:
+            # Google rotated keys before our copy expired
+            await self.refresh(force=True)
+            key = self._keys.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError("Unknown signing key")
+        return key
+
+    async def verify(self, token: str) -> dict:
+        header = jwt.get_unverified_header(token)
+        key = await self._key_for(header.get("kid", ""))
+        claims = jwt.decode(
+            token,
+            key.key,
+            algorithms=["RS256"],
+            audience=self.client_id,
+            options={"verify_aud": bool(self.client_id)},
+            leeway=10,
+        )
+        if claims.get("iss") not in GOOGLE_ISSUERS:
+            raise jwt.InvalidIssuerError("Wrong issuer")
+        self.verified += 1
+        return claims
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._keys),
+            "fetches": self.fetches,
+            "verified": self.verified,
+            "key_age_seconds": round(time.monotonic() - self._fetched_at, 1) if self._fetched_at else None,
+        }
+
+GOOGLE_VERIFIER = GoogleTokenVerifier(GOOGLE_CERTS_URL, GOOGLE_CLIENT_ID)
 
 # --- Notification Service ---
+# Messages go through a durable outbox (db.notification_outbox) and are delivered by a
+# background worker, so a slow SMTP server or Twilio call never holds up a request.
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", 20))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 6))
+OUTBOX_POLL_SECONDS = float(os.environ.get("OUTBOX_POLL_SECONDS", 5))
+OUTBOX_RETRY_BASE_SECONDS = float(os.environ.get("OUTBOX_RETRY_BASE_SECONDS", 5))
+OUTBOX_LEASE_SECONDS = int(os.environ.get("OUTBOX_LEASE_SECONDS", 120))
+OUTBOX_KEEP_SENT_DAYS = int(os.environ.get("OUTBOX_KEEP_SENT_DAYS", 7))
+SMTP_IDLE_SECONDS = float(os.environ.get("SMTP_IDLE_SECONDS", 60))
+
+class SmtpTransport:
+    """Keeps one SMTP session open across sends and reconnects when the server drops it.
+
+    Only ever used from the single-threaded notification executor, so no locking.
+    """
+
+    def __init__(self):
+        self._conn = None
+        self._last_used = 0.0
+        self.connections_opened = 0
+        self.messages_sent = 0
+
+    @staticmethod
+    def configured() -> bool:
+        return bool(os.environ.get("SMTP_HOST"))
+
+    @staticmethod
+    def sender() -> str:
+        return os.environ.get("SMTP_FROM") or os.environ.get("SMTP_USER") or "no-reply@vitalwave.local"
+
+    def _connect(self):
+        smtp_user = os.environ.get("SMTP_USER")
+        smtp_password = os.environ.get("SMTP_PASSWORD")
+        conn = smtplib.SMTP(os.environ["SMTP_HOST"], int(os.environ.get("SMTP_PORT", 587)), timeout=15)
+        if os.environ.get("SMTP_STARTTLS", "true").lower() not in ("0", "false", "no"):
+            conn.starttls()
+        if smtp_user and smtp_password:
+            conn.login(smtp_user, smtp_password)
+        self._conn = conn
+        self.connections_opened += 1
+
+    def _session(self):
+        if self._conn is not None and time.monotonic() - self._last_used > SMTP_IDLE_SECONDS:
+            self.close()
+        if self._conn is None:
+            self._connect()
+        return self._conn
+
+    def send(self, to_email: str, subject: str, body: str):
+        msg = MIMEMultipart()
+        msg['From'] = f"VitalWave <{self.sender()}>"
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+        try:
+            self._session().send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Server closed our idle session; one fresh connection, then give up
+            self.close()
+            self._session().send_message(msg)
+        self._last_used = time.monotonic()
+        self.messages_sent += 1
+
+    def close(self):
+        if self._conn is not None:
+            try:
+                self._conn.quit()
+            except Exception:
+                pass
+            self._conn = None
+
 class NotificationService:
+    _twilio_client = None
+    smtp = SmtpTransport()
+    # smtplib/twilio are blocking; a single thread keeps them off the event loop and serializes the SMTP session
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="notify")
+
     @staticmethod
     def is_mobile(identifier: str) -> bool:
         return re.match(r'^\+?[1-9]\d{1,14}$', identifier) is not None
 
-    @staticmethod
-    def send_sms(to_number: str, body: str):
+    @classmethod
+    def _twilio(cls):
+        if cls._twilio_client is None:
+            cls._twilio_client = TwilioClient(os.environ["TWILIO_ACCOUNT_SID"], os.environ["TWILIO_AUTH_TOKEN"])
+        return cls._twilio_client
+
+    @classmethod
+    def send_sms(cls, to_number: str, body: str):
         sid = os.environ.get("TWILIO_ACCOUNT_SID")
         token = os.environ.get("TWILIO_AUTH_TOKEN")
         from_number = os.environ.get("TWILIO_FROM_NUMBER")
-        
+
         if sid and token and from_number and "your_token" not in token:
-            try:
-                client = TwilioClient(sid, token)
-                client.messages.create(body=body, from_=from_number, to=to_number)
-                logger.info(f"SMS sent to {to_number}")
-                return True
-            except Exception as e:
-                logger.error(f"Failed to send SMS: {e}")
-                return False
+            cls._twilio().messages.create(body=body, from_=from_number, to=to_number)
+            logger.info(f"SMS sent to {to_number}")
         else:
             logger.warning(f"Twilio not configured. SMS simulated for {to_number}: {body}")
-            return True
+
+    @classmethod
+    def send_email(cls, to_email: str, subject: str, body: str):
+        if cls.smtp.configured():
+            cls.smtp.send(to_email, subject, body)
+            logger.info(f"Email sent successfully to {to_email}")
+        else:
+            logger.warning(f"SMTP not configured. Email simulated for {to_email}: {subject}")
+
+    @classmethod
+    def deliver(cls, message: dict):
+        """Blocking send of one outbox message; raises on failure."""
+        if message["channel"] == "sms":
+            cls.send_sms(message["to"], message["body"])
+        else:
+            cls.send_email(message["to"], message.get("subject") or "", message["body"])
 
     @staticmethod
-    def send_email(to_email: str, subject: str, body: str):
-        smtp_host = os.environ.get("SMTP_HOST")
-        smtp_port = int(os.environ.get("SMTP_PORT", 587))
-        smtp_user = os.environ.get("SMTP_USER")
-        smtp_password = os.environ.get("SMTP_PASSWORD")
+    async def send_otp(identifier: str, otp: str):
+        if NotificationService.is_mobile(identifier):
+            body = f"Your VitalWave verification code is: {otp}. Valid for 5 minutes."
+            return await NOTIFICATION_OUTBOX.enqueue("sms", identifier, body)
+        body = f"""
+            Hello,
+            
+            Your verification code for VitalWave is: {otp}
+            
+            This code will expire in 5 minutes.
+            
+            If you did not request this code, please ignore this email.
+            """
+        return await NOTIFICATION_OUTBOX.enqueue("email", identifier, body, subject="VitalWave Verification Code")
+
+class NotificationOutbox:
+    """Durable queue of outgoing email/SMS with batched delivery and exponential backoff.
+
+    Batches are claimed with a lease (status "sending" + claim_token), so several
+    server processes can run workers against the same collection, and messages
+    claimed by a crashed worker are picked up again once the lease runs out.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.enqueued = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def enqueue(self, channel: str, to: str, body: str, subject: Optional[str] = None) -> str:
+        now = datetime.now(timezone.utc)
+        message_id = str(uuid.uuid4())
+        await self.collection.insert_one({
+            "id": message_id,
+            "channel": channel,
+            "to": to,
+            "subject": subject,
+            "body": body,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        })
+        self.enqueued += 1
+        self._wakeup.set()
+        return message_id
+
+    async def _claim_batch(self) -> List[dict]:
+        now = datetime.now(timezone.utc)
+        due = {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "lease_until": {"$lt": now}},
+        ]}
+        candidates = await self.collection.find(due, {"_id": 0, "id": 1}).sort("next_attempt_at", 1).limit(OUTBOX_BATCH_SIZE).to_list(OUTBOX_BATCH_SIZE)
+        if not candidates:
+            return []
+        claim_token = str(uuid.uuid4())
+        await self.collection.update_many(
+            {"$and": [{"id": {"$in": [c["id"] for c in candidates]}}, due]},
+            {"$set": {"status": "sending", "claim_token": claim_token, "lease_until": now + timedelta(seconds=OUTBOX_LEASE_SECONDS)}}
+        )
+        return await self.collection.find({"claim_token": claim_token}, {"_id": 0}).to_list(OUTBOX_BATCH_SIZE)
+
+    def _deliver_batch(self, batch: List[dict]) -> List[Optional[str]]:
+        errors = []
+        for message in batch:
+            try:
+                NotificationService.deliver(message)
+                errors.append(None)
+            except Exception as e:
+                errors.append(str(e) or e.__class__.__name__)
+        return errors
+
+    async def _record(self, batch: List[dict], errors: List[Optional[str]]):
+        now = datetime.now(timezone.utc)
+        for message, error in zip(batch, errors):
+            attempts = message.get("attempts", 0) + 1
+            unset = {"claim_token": "", "lease_until": ""}
+            # Bodies carry OTP/reset codes: once no further attempt will be made, only
+            # the envelope is kept for OUTBOX_KEEP_SENT_DAYS
+            finished = {**unset, "body": ""}
+            if error is None:
+                update = {"$set": {"status": "sent", "attempts": attempts, "sent_at": now,
+                                   "purge_at": now + timedelta(days=OUTBOX_KEEP_SENT_DAYS)}, "$unset": finished}
+                self.sent += 1
+            elif attempts >= OUTBOX_MAX_ATTEMPTS:
+                logger.error(f"Giving up on {message['channel']} to {message['to']} after {attempts} attempts: {error}")
+                update = {"$set": {"status": "failed", "attempts": attempts, "last_error": error,
+                                   "purge_at": now + timedelta(days=OUTBOX_KEEP_SENT_DAYS)}, "$unset": finished}
+                self.failed += 1
+            else:
+                delay = OUTBOX_RETRY_BASE_SECONDS * (2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+                logger.warning(f"Delivery of {message['channel']} to {message['to']} failed ({error}); retrying in {delay:.0f}s")
+                update = {"$set": {"status": "pending", "attempts": attempts, "last_error": error,
+                                   "next_attempt_at": now + timedelta(seconds=delay)}, "$unset": unset}
+                self.retried += 1
+            await self.collection.update_one({"id": message["id"], "claim_token": message["claim_token"]}, update)
+
+    async def run_once(self) -> int:
+        batch = await self._claim_batch()
+        if batch:
+            errors = await asyncio.get_running_loop().run_in_executor(NotificationService.executor, self._deliver_batch, batch)
+            await self._record(batch, errors)
+        return len(batch)
+
+    async def run(self):
+        while True:
+            try:
+                if await self.run_once() >= OUTBOX_BATCH_SIZE:
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Notification worker error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
 
-        if smtp_host and smtp_user and smtp_password:
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
             try:
-                msg = MIMEMultipart()
-                msg['From'] = f"VitalWave <{smtp_user}>"
-                msg['To'] = to_email
-                msg['Subject'] = subject
-                msg.attach(MIMEText(body, 'plain'))
-
-                with smtplib.SMTP(smtp_host, smtp_port) as server:
-                    server.starttls()
-                    server.login(smtp_user, smtp_password)
-                    server.send_message(msg)
-                
-                logger.info(f"Email sent successfully to {to_email}")
-                return True
-            except Exception as e:
-                logger.error(f"Failed to send Email to {to_email}: {e}")
-                return False
-        else:
-            logger.warning(f"SMTP not configured. Email simulated for {to_email}: {subject}")
-            return True
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.get_running_loop().run_in_executor(NotificationService.executor, NotificationService.smtp.close)
 
-    @staticmethod
-    def send_otp(identifier: str, otp: str):
-        is_mobile = NotificationService.is_mobile(identifier)
-        if is_mobile:
-            body = f"Your VitalWave verification code is: {otp}. Valid for 5 minutes."
-            return NotificationService.send_sms(identifier, body)
-        else:
-            body = f"""
-            Hello,
-            
-            Your verification code for VitalWave is: {otp}
-            
-            This code will expire in 5 minutes.
-            
-            If you did not request this code, please ignore this email.
-            """
-            return NotificationService.send_email(identifier, "VitalWave Verification Code", body)
+    def stats(self) -> dict:
+        return {
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "smtp_connections_opened": NotificationService.smtp.connections_opened,
+            "smtp_messages_sent": NotificationService.smtp.messages_sent,
+        }
+
+NOTIFICATION_OUTBOX = NotificationOutbox(db.notification_outbox)
 
 class GoogleAuth(BaseModel):
     id_token: str
@@ -432,49 +2083,32 @@ class OtpVerify(BaseModel):
     otp: str
 
 @api_router.post("/auth/google", response_model=TokenResponse)
-async def google_login(auth_data: GoogleAuth):
+@LOGIN_ROUND_TRIPS.tracked("google")
+async def google_login(auth_data: GoogleAuth, request: Request):
     start_time = time.time()
     try:
         logger.info("Verifying Google token...")
         t0 = time.time()
-        idinfo = id_token.verify_oauth2_token(auth_data.id_token, google_requests.Request(), GOOGLE_CLIENT_ID)
+        idinfo = await GOOGLE_VERIFIER.verify(auth_data.id_token)
         logger.info(f"Google verify took: {time.time() - t0:.4f}s")
         
         email = idinfo['email']
         name = idinfo.get('name', email.split('@')[0])
         
         t1 = time.time()
-        user = await db.users.find_one({"email": email})
-        logger.info(f"DB user fetch took: {time.time() - t1:.4f}s")
-        
-        if not user:
-            # Create new user
-            user_id = str(uuid.uuid4())
-            user = {
-                "id": user_id,
-                "name": name,
-                "email": email,
-                "password_hash": "", # No password for Google users
-                "preferred_language": "en",
-                "theme": "system",
-                "location_mode": "manual",
-                "has_uploads": False,
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "last_login_at": datetime.now(timezone.utc).isoformat()
-            }
-            await db.users.insert_one(user)
-        else:
-            await db.users.update_one(
-                {"id": user["id"]},
-                {"$set": {"last_login_at": datetime.now(timezone.utc).isoformat()}}
-            )
+        user = await upsert_login_user({"email": email}, {
+            "id": str(uuid.uuid4()),
+            "name": name,
+            "password_hash": "", # No password for Google users
+            "preferred_language": "en",
+            "theme": "system",
+            "location_mode": "manual",
+            "has_uploads": False,
+        })
+        logger.info(f"DB user upsert took: {time.time() - t1:.4f}s")
         
+        access_token, refresh_token = await issue_tokens(user["id"], device_id_from(request))
         logger.info(f"Total Google login time: {time.time() - start_time:.4f}s")
-            
-        access_token = create_access_token(user["id"])
-        refresh_token = create_refresh_token(user["id"])
-        await db.refresh_tokens.delete_many({"user_id": user["id"]})
-        await db.refresh_tokens.insert_one({"token": refresh_token, "user_id": user["id"]})
         
         return TokenResponse(
             access_token=access_token,
@@ -488,7 +2122,10 @@ async def google_login(auth_data: GoogleAuth):
              logger.error(f"Token length: {len(auth_data.id_token)}")
         raise HTTPException(status_code=400, detail=f"Invalid Google token: {str(e)}")
 
-@api_router.post("/auth/otp/request")
+@api_router.post("/auth/otp/request", dependencies=[
+    rate_limit("otp_request", 3, 300, key="body:identifier", detail="Too many codes requested. Please try again later."),
+    rate_limit("otp_request_ip", 20, 300),
+])
 async def request_otp(data: OtpRequest):
     otp = str(random.randint(100000, 999999))
     expires_at = datetime.now(timezone.utc) + timedelta(minutes=5)
@@ -496,15 +2133,12 @@ async def request_otp(data: OtpRequest):
     # Store OTP using identifier as key
     await db.otps.update_one(
         {"identifier": data.identifier},
-        {"$set": {"otp": otp, "expires_at": expires_at.isoformat()}},
+        {"$set": {"otp": otp, "expires_at": expires_at}},
         upsert=True
     )
     
-    # Send Notification
-    success = NotificationService.send_otp(data.identifier, otp)
-    if not success:
-        logger.error(f"Failed to send OTP to {data.identifier}. Check SMTP/Twilio configuration.")
-        raise HTTPException(status_code=500, detail="Failed to deliver OTP. Please check your contact details or try again later.")
+    # Queue the notification; the outbox worker delivers (and retries) it in the background
+    await NotificationService.send_otp(data.identifier, otp)
     
     # Log for dev/demo purposes
     logger.info(f"OTP for {data.identifier}: {otp}")
@@ -514,53 +2148,36 @@ async def request_otp(data: OtpRequest):
     return {"message": f"OTP sent to {masked}"}
 
 @api_router.post("/auth/otp/verify", response_model=TokenResponse)
-async def verify_otp(data: OtpVerify):
+@LOGIN_ROUND_TRIPS.tracked("otp")
+async def verify_otp(data: OtpVerify, request: Request):
     start_time = time.time()
-    otp_record = await db.otps.find_one({"identifier": data.identifier})
+    # Matching on the code consumes it in the same round trip; a wrong code leaves it in place
+    otp_record = await db.otps.find_one_and_delete({"identifier": data.identifier, "otp": data.otp})
     
-    if not otp_record or otp_record["otp"] != data.otp:
+    if not otp_record:
         raise HTTPException(status_code=400, detail="Invalid OTP")
     
-    expiry = datetime.fromisoformat(otp_record["expires_at"].replace('Z', '+00:00'))
+    expiry = as_utc(otp_record["expires_at"])
     if datetime.now(timezone.utc) > expiry:
         raise HTTPException(status_code=400, detail="OTP expired")
     
-    # Delete OTP after use
-    await db.otps.delete_one({"identifier": data.identifier})
-    
     # Determine look-up field
     is_mobile = NotificationService.is_mobile(data.identifier)
     query = {"mobile": data.identifier} if is_mobile else {"email": data.identifier}
     
-    user = await db.users.find_one(query)
+    user = await upsert_login_user(query, {
+        "id": str(uuid.uuid4()),
+        "name": "User" if is_mobile else data.identifier.split('@')[0],
+        "email": "" if is_mobile else data.identifier,
+        "mobile": data.identifier if is_mobile else "",
+        "password_hash": "",
+        "preferred_language": "en",
+        "theme": "system",
+        "location_mode": "manual",
+        "has_uploads": False,
+    })
     
-    if not user:
-        # Create new user
-        user_id = str(uuid.uuid4())
-        user = {
-            "id": user_id,
-            "name": "User" if is_mobile else data.identifier.split('@')[0],
-            "email": "" if is_mobile else data.identifier,
-            "mobile": data.identifier if is_mobile else "",
-            "password_hash": "",
-            "preferred_language": "en",
-            "theme": "system",
-            "location_mode": "manual",
-            "has_uploads": False,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "last_login_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.users.insert_one(user)
-    else:
-        await db.users.update_one(
-            {"id": user["id"]},
-            {"$set": {"last_login_at": datetime.now(timezone.utc).isoformat()}}
-        )
-        
-    access_token = create_access_token(user["id"])
-    refresh_token = create_refresh_token(user["id"])
-    await db.refresh_tokens.delete_many({"user_id": user["id"]})
-    await db.refresh_tokens.insert_one({"token": refresh_token, "user_id": user["id"]})
+    access_token, refresh_token = await issue_tokens(user["id"], device_id_from(request))
     
     logger.info(f"OTP verification took: {time.time() - start_time:.4f}s")
     
@@ -581,20 +2198,21 @@ async def refresh_token(body: dict = Body(...)):
         if payload.get("type") != "refresh":
             raise HTTPException(status_code=401, detail="Invalid token type")
         
-        stored = await db.refresh_tokens.find_one({"token": token})
-        if not stored:
-            raise HTTPException(status_code=401, detail="Token revoked or invalid")
-        
         user_id = payload.get("sub")
-        user = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
+        user = await load_user(user_id)
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
         
-        # Rotate refresh token
+        # Rotate refresh token: swapping it in place both checks and revokes the old one
         new_access = create_access_token(user_id)
         new_refresh = create_refresh_token(user_id)
-        await db.refresh_tokens.delete_one({"token": token})
-        await db.refresh_tokens.insert_one({"token": new_refresh, "user_id": user_id})
+        stored = await db.refresh_tokens.find_one_and_update(
+            {"token": token, "user_id": user_id},
+            {"$set": {"token": new_refresh, "issued_at": datetime.now(timezone.utc),
+                      "expires_at": datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)}}
+        )
+        if not stored:
+            raise HTTPException(status_code=401, detail="Token revoked or invalid")
         
         return {"access_token": new_access, "refresh_token": new_refresh, "token_type": "bearer"}
     except jwt.ExpiredSignatureError:
@@ -616,12 +2234,10 @@ async def update_me(update: UserUpdate, user: dict = Depends(get_current_user)):
     update_data = {k: v for k, v in update.model_dump().items() if v is not None}
     if update_data:
         await db.users.update_one({"id": user["id"]}, {"$set": update_data})
+        invalidate_user_cache(user["id"])
     updated = await db.users.find_one({"id": user["id"]}, {"_id": 0, "password_hash": 0})
     return {"data": updated}
 
-# Rate limiting for password change
-PASSWORD_CHANGE_LIMITS = {}
-
 @api_router.patch("/user/username")
 async def update_username(data: UsernameUpdate, user: dict = Depends(get_current_user)):
     username = data.username
@@ -637,25 +2253,25 @@ async def update_username(data: UsernameUpdate, user: dict = Depends(get_current
     if existing and existing["id"] != user["id"]:
         raise HTTPException(status_code=400, detail="Username already taken")
     
-    await db.users.update_one({"id": user["id"]}, {"$set": {"username": username}})
+    try:
+        # users.username is unique (see INDEXES), which settles a race the check above lost
+        await db.users.update_one({"id": user["id"]}, {"$set": {"username": username}})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Username already taken")
+    invalidate_user_cache(user["id"])
     return {"message": "Username updated successfully", "username": username}
 
-@api_router.post("/user/change-password")
+@api_router.post("/user/change-password", dependencies=[
+    rate_limit("change_password", 1, 60, key="user", detail="Please wait 1 minute before trying again")
+])
 async def change_password(data: PasswordChange, user: dict = Depends(get_current_user)):
-    # Rate limiting
-    now = time.time()
-    last_attempt = PASSWORD_CHANGE_LIMITS.get(user["id"], 0)
-    if now - last_attempt < 60:
-        raise HTTPException(status_code=429, detail="Please wait 1 minute before trying again")
-    PASSWORD_CHANGE_LIMITS[user["id"]] = now
-
     # Get user with password hash
     db_user = await db.users.find_one({"id": user["id"]})
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Verify current password
-    if not db_user.get("password_hash") or not verify_password(data.current_password, db_user["password_hash"]):
+    if not await PASSWORD_HASHER.verify(data.current_password, db_user.get("password_hash", "")):
         raise HTTPException(status_code=400, detail="Incorrect current password")
     
     # Validate new password
@@ -673,23 +2289,16 @@ async def change_password(data: PasswordChange, user: dict = Depends(get_current
         raise HTTPException(status_code=400, detail="New password cannot be the same as current password")
     
     # Update password
-    new_hash = hash_password(new_pw)
+    new_hash = await PASSWORD_HASHER.hash(new_pw)
     await db.users.update_one({"id": user["id"]}, {"$set": {"password_hash": new_hash}})
+    invalidate_user_cache(user["id"])
     
     return {"message": "Password changed successfully"}
 
-@api_router.post("/auth/forgot-password")
+@api_router.post("/auth/forgot-password", dependencies=[
+    rate_limit("forgot_password", 1, 60, key="body:email", detail="Please wait 1 minute before requesting a new code")
+])
 async def forgot_password(data: ForgotPasswordRequest):
-    # Rate limit: 60s
-    now = time.time()
-    last_attempt = getattr(forgot_password, "_limits", {}).get(data.email, 0)
-    if now - last_attempt < 60:
-        raise HTTPException(status_code=429, detail="Please wait 1 minute before requesting a new code")
-    
-    if not hasattr(forgot_password, "_limits"):
-        forgot_password._limits = {}
-    forgot_password._limits[data.email] = now
-
     user = await db.users.find_one({"email": data.email})
     if not user:
         # Silently fail or return success to prevent email enumeration?
@@ -701,43 +2310,33 @@ async def forgot_password(data: ForgotPasswordRequest):
     expires_at = datetime.now(timezone.utc) + timedelta(minutes=10)
     
     # Store hashed code
-    hashed_code = hash_password(code)
+    hashed_code = hash_reset_code(data.email, code)
     await db.password_resets.update_one(
         {"email": data.email},
-        {"$set": {"code": hashed_code, "expires_at": expires_at.isoformat()}},
+        {"$set": {"code": hashed_code, "expires_at": expires_at, "attempts": 0}},
         upsert=True
     )
     
     # Send email
-    NotificationService.send_email(data.email, "VitalWave Password Reset Code", f"Your password reset code is: {code}")
+    await NOTIFICATION_OUTBOX.enqueue("email", data.email, f"Your password reset code is: {code}", subject="VitalWave Password Reset Code")
     logger.info(f"Password reset code for {data.email}: {code}")
     
     return {"message": "Verification code sent"}
 
-@api_router.post("/auth/verify-reset-code")
+@api_router.post("/auth/verify-reset-code", dependencies=[
+    rate_limit("verify_reset_code", 10, 300, key="body:email", detail="Too many attempts. Please try again later."),
+    rate_limit("verify_reset_code_ip", 50, 300),
+])
 async def verify_reset_code(data: VerifyResetCodeRequest):
-    record = await db.password_resets.find_one({"email": data.email})
-    if not record:
-        raise HTTPException(status_code=400, detail="Invalid or expired code")
-    
-    expiry = datetime.fromisoformat(record["expires_at"].replace('Z', '+00:00'))
-    if datetime.now(timezone.utc) > expiry:
-        raise HTTPException(status_code=400, detail="Invalid or expired code")
-    
-    if not verify_password(data.code, record["code"]):
-        raise HTTPException(status_code=400, detail="Invalid or expired code")
-    
+    await check_reset_code(data.email, data.code)
     return {"message": "Code verified"}
 
-@api_router.post("/auth/reset-password")
+@api_router.post("/auth/reset-password", dependencies=[
+    rate_limit("reset_password", 10, 300, key="body:email", detail="Too many attempts. Please try again later."),
+    rate_limit("reset_password_ip", 50, 300),
+])
 async def reset_password(data: ResetPasswordRequest):
-    record = await db.password_resets.find_one({"email": data.email})
-    if not record or not verify_password(data.code, record["code"]):
-        raise HTTPException(status_code=400, detail="Invalid or expired code")
-    
-    expiry = datetime.fromisoformat(record["expires_at"].replace('Z', '+00:00'))
-    if datetime.now(timezone.utc) > expiry:
-        raise HTTPException(status_code=400, detail="Invalid or expired code")
+    await check_reset_code(data.email, data.code)
 
     # Update password
     new_pw = data.new_password
@@ -745,7 +2344,7 @@ async def reset_password(data: ResetPasswordRequest):
     if len(new_pw) < 8 or not any(c.isupper() for c in new_pw) or not any(c.isdigit() for c in new_pw) or not any(not c.isalnum() for c in new_pw):
          raise HTTPException(status_code=400, detail="Password does not meet requirements")
 
-    new_hash = hash_password(new_pw)
+    new_hash = await PASSWORD_HASHER.hash(new_pw)
     await db.users.update_one({"email": data.email}, {"$set": {"password_hash": new_hash}})
     
     # Invalidate code
@@ -760,16 +2359,9 @@ async def set_location_auto(loc: LocationAuto, user: dict = Depends(get_current_
     # Reverse geocode to get label
     label = f"Location ({loc.lat:.4f}, {loc.lng:.4f})"
     try:
-        async with httpx.AsyncClient(verify=False) as client:
-            resp = await client.get(
-                f"https://nominatim.openstreetmap.org/reverse",
-                params={"lat": loc.lat, "lon": loc.lng, "format": "json"},
-                headers={"User-Agent": "MediGuide/1.0"},
-                timeout=10
-            )
-            if resp.status_code == 200:
-                data = resp.json()
-                label = data.get("display_name", label)[:100]
+        data = await nominatim_reverse(loc.lat, loc.lng)
+        if data:
+            label = data.get("display_name", label)[:100]
     except Exception as e:
         logger.warning(f"Reverse geocode failed: {e}")
     
@@ -777,31 +2369,25 @@ async def set_location_auto(loc: LocationAuto, user: dict = Depends(get_current_
         {"id": user["id"]},
         {"$set": {"lat": loc.lat, "lng": loc.lng, "location_label": label, "location_mode": "auto"}}
     )
+    invalidate_user_cache(user["id"])
     return {"data": {"lat": loc.lat, "lng": loc.lng, "location_label": label}}
 
 @api_router.post("/location/set-manual")
 async def set_location_manual(loc: LocationManual, user: dict = Depends(get_current_user)):
     # Forward geocode
     try:
-        async with httpx.AsyncClient(verify=False) as client:
-            resp = await client.get(
-                f"https://nominatim.openstreetmap.org/search",
-                params={"q": loc.query, "format": "json", "limit": 1},
-                headers={"User-Agent": "MediGuide/1.0"},
-                timeout=10
+        data = await nominatim_search(loc.query)
+        if data:
+            result = data[0]
+            lat = float(result["lat"])
+            lng = float(result["lon"])
+            label = result.get("display_name", loc.query)[:100]
+            await db.users.update_one(
+                {"id": user["id"]},
+                {"$set": {"lat": lat, "lng": lng, "location_label": label, "location_mode": "manual"}}
             )
-            if resp.status_code == 200:
-                data = resp.json()
-                if data:
-                    result = data[0]
-                    lat = float(result["lat"])
-                    lng = float(result["lon"])
-                    label = result.get("display_name", loc.query)[:100]
-                    await db.users.update_one(
-                        {"id": user["id"]},
-                        {"$set": {"lat": lat, "lng": lng, "location_label": label, "location_mode": "manual"}}
-                    )
-                    return {"data": {"lat": lat, "lng": lng, "location_label": label}}
+            invalidate_user_cache(user["id"])
+            return {"data": {"lat": lat, "lng": lng, "location_label": label}}
     except Exception as e:
         logger.warning(f"Geocode failed: {e}")
     
@@ -813,11 +2399,414 @@ async def get_location(user: dict = Depends(get_current_user)):
 
 # ============== NEARBY ROUTES ==============
 
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_M = 6371000
+METERS_PER_DEGREE_LAT = 111320
+
+OSM_FILTERS = {
+    "hospital": '["amenity"="hospital"]',
+    "clinic": '["amenity"="clinic"]',
+    "pharmacy": '["amenity"="pharmacy"]'
+}
+
+def geohash_encode(lat: float, lng: float, precision: int) -> str:
+    lat_lo, lat_hi, lng_lo, lng_hi = -90.0, 90.0, -180.0, 180.0
+    chars, n, bits, even = [], 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            bit = lng >= mid
+            lng_lo, lng_hi = (mid, lng_hi) if bit else (lng_lo, mid)
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            bit = lat >= mid
+            lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+        n, bits, even = (n << 1) | bit, bits + 1, not even
+        if bits == 5:
+            chars.append(GEOHASH_BASE32[n])
+            n, bits = 0, 0
+    return "".join(chars)
+
+def geohash_bbox(geohash: str) -> tuple:
+    """(south, west, north, east) of a geohash cell."""
+    lat_lo, lat_hi, lng_lo, lng_hi = -90.0, 90.0, -180.0, 180.0
+    even = True
+    for c in geohash:
+        n = GEOHASH_BASE32.index(c)
+        for shift in range(4, -1, -1):
+            bit = (n >> shift) & 1
+            if even:
+                mid = (lng_lo + lng_hi) / 2
+                lng_lo, lng_hi = (mid, lng_hi) if bit else (lng_lo, mid)
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+            even = not even
+    return lat_lo, lng_lo, lat_hi, lng_hi
+
+def geohash_grid(south: float, west: float, north: float, east: float, precision: int) -> tuple:
+    """(cell height, cell width, row range, column range) of the cells at `precision`
+    covering a bounding box, without building them."""
+    lng_bits = (5 * precision + 1) // 2
+    dlat, dlng = 180.0 / (1 << (5 * precision - lng_bits)), 360.0 / (1 << lng_bits)
+    south, north = max(south, -90.0), min(north, 90.0 - 1e-9)
+    west, east = max(west, -180.0), min(east, 180.0 - 1e-9)
+    rows = range(int((south + 90.0) // dlat), int((north + 90.0) // dlat) + 1)
+    cols = range(int((west + 180.0) // dlng), int((east + 180.0) // dlng) + 1)
+    return dlat, dlng, rows, cols
+
+def geohash_cell(i: int, j: int, dlat: float, dlng: float, precision: int) -> str:
+    return geohash_encode(-90.0 + (i + 0.5) * dlat, -180.0 + (j + 0.5) * dlng, precision)
+
+def geohash_cover_bbox(south: float, west: float, north: float, east: float, precision: int) -> List[str]:
+    """Cells at `precision` that together cover a bounding box."""
+    dlat, dlng, rows, cols = geohash_grid(south, west, north, east, precision)
+    return [geohash_cell(i, j, dlat, dlng, precision) for i in rows for j in cols]
+
+def circle_bbox(lat: float, lng: float, radius_m: float) -> tuple:
+    rlat = radius_m / METERS_PER_DEGREE_LAT
+    rlng = radius_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+    return lat - rlat, lng - rlng, lat + rlat, lng + rlng
+
+def geohash_cover(lat: float, lng: float, radius_m: float, precision: int) -> List[str]:
+    """Cells at `precision` that together cover the circle's bounding box."""
+    return geohash_cover_bbox(*circle_bbox(lat, lng, radius_m), precision)
+
+def geohash_cover_size(lat: float, lng: float, radius_m: float, precision: int) -> int:
+    """len(geohash_cover(...)), computed without building the cells."""
+    _, _, rows, cols = geohash_grid(*circle_bbox(lat, lng, radius_m), precision)
+    return len(rows) * len(cols)
+
+def geohash_cover_nearest(lat: float, lng: float, radius_m: float, precision: int, max_cells: int) -> List[str]:
+    """At most `max_cells` cells of geohash_cover(...), nearest the centre first.
+
+    Walks square rings outwards from the centre cell, so the cost is bounded by
+    `max_cells` however wide the circle is.
+    """
+    dlat, dlng, rows, cols = geohash_grid(*circle_bbox(lat, lng, radius_m), precision)
+    ci = min(max(int((lat + 90.0) // dlat), rows.start), rows.stop - 1)
+    cj = min(max(int((lng + 180.0) // dlng), cols.start), cols.stop - 1)
+    kx = max(math.cos(math.radians(lat)), 0.01)
+    cells = []
+    for r in range(max(len(rows), len(cols))):
+        if r == 0:
+            ring = [(ci, cj)]
+        else:
+            ring = [(i, j) for i in (ci - r, ci + r) for j in range(cj - r, cj + r + 1)]
+            ring += [(i, j) for j in (cj - r, cj + r) for i in range(ci - r + 1, ci + r)]
+        ring = [(i, j) for i, j in ring if i in rows and j in cols]
+        ring.sort(key=lambda c: ((c[0] - ci) * dlat) ** 2 + ((c[1] - cj) * dlng * kx) ** 2)
+        cells.extend(ring[:max_cells - len(cells)])
+        if len(cells) >= max_cells:
+            break
+    return [geohash_cell(i, j, dlat, dlng, precision) for i, j in cells]
+
+def haversine_many(lat: float, lng: float, lats, lngs) -> np.ndarray:
+    """Great-circle distances in metres from (lat, lng) to every point, in one vectorized pass."""
+    lat1 = math.radians(lat)
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    dlat = lat2 - lat1
+    dlng = np.radians(np.asarray(lngs, dtype=np.float64)) - math.radians(lng)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return EARTH_RADIUS_M * 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def top_k_smallest(values: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k smallest values in ascending order: argpartition then sort only
+    the k survivors, O(n + k log k) instead of sorting everything."""
+    n = len(values)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    idx = np.argpartition(values, k - 1)[:k] if k < n else np.arange(n)
+    return idx[np.argsort(values[idx], kind="stable")]
+
+def place_from_element(elem: dict, place_type: str) -> Optional[dict]:
+    place_lat = elem.get("lat") or elem.get("center", {}).get("lat")
+    place_lng = elem.get("lon") or elem.get("center", {}).get("lon")
+    if not (place_lat and place_lng):
+        return None
+    tags = elem.get("tags", {})
+    return {
+        "id": str(elem.get("id")),
+        "osm_type": elem.get("type", "node"),
+        "name": tags.get("name", f"Unknown {place_type.title()}"),
+        "type": place_type,
+        "lat": place_lat,
+        "lng": place_lng,
+        "address": tags.get("addr:full", ""),
+        "phone": tags.get("phone", "")
+    }
+
+def place_phone(place: dict) -> str:
+    """OSM phone, else the curated directory, else a stable made-up number."""
+    phone = place.get("phone") or get_justdial_phone(place["name"], place["id"])
+    if not phone:
+        # Generate a realistic looking Indian phone number if missing (stable per place;
+        # a private Random so the global one used for OTPs isn't reseeded)
+        rng = random.Random(int(place["id"]) if place["id"].isdigit() else place["id"])
+        phone = f"+91-{rng.randint(7000, 9999)}-{rng.randint(100000, 999999)}"
+    return phone
+
+async def fetch_tiles(place_type: str, tiles: List[str]) -> Dict[str, List[dict]]:
+    """Places per tile from one combined Overpass query over all the tiles' bounding boxes."""
+    osm_filter = OSM_FILTERS[place_type]
+    bboxes = [geohash_bbox(tile) for tile in sorted(tiles)]
+    statements = "\n".join(
+        f"{kind}{osm_filter}({s:.6f},{w:.6f},{n:.6f},{e:.6f});"
+        for s, w, n, e in bboxes for kind in ("node", "way")
+    )
+    data = await overpass_query(f"[out:json][timeout:25];\n(\n{statements}\n);\nout center;")
+    if data is None:
+        return None
+    precision = len(tiles[0])
+    by_tile = {tile: [] for tile in tiles}
+    for elem in data.get("elements", []):
+        place = place_from_element(elem, place_type)
+        if place is None:
+            continue
+        # Bounding boxes share edges, so assign each place to exactly one tile
+        tile = geohash_encode(place["lat"], place["lng"], precision)
+        if tile in by_tile:
+            by_tile[tile].append(place)
+    return by_tile
+
+class PoiStore:
+    """Local store of every place Overpass (or an offline import) has given us.
+
+    Places live in db.pois (GeoJSON `location` under a 2dsphere index, plus the geohash
+    `tile` they fall in); db.poi_regions records when each (type, tile) was last
+    refreshed. Tiles in use are held in process as numpy coordinate arrays, so a
+    nearby query is a handful of dict lookups and one vectorized distance pass.
+
+    Only tiles we have never seen block on Overpass. Tiles past their refresh time
+    are still served (stale), and re-fetched in the background, until they are
+    POI_MAX_STALE_SECONDS old; past that they are treated as never seen. Searches too
+    wide for the tile path never block: unseen tiles are fetched in the background and
+    the answer is marked incomplete meanwhile.
+    """
+
+    PROJECTION = {"_id": 0, "id": 1, "name": 1, "type": 1, "lat": 1, "lng": 1, "address": 1, "phone": 1}
+
+    def __init__(self, pois, regions, precision: int, refresh_seconds: float, max_tiles: int):
+        self.pois = pois
+        self.regions = regions
+        self.precision = precision
+        self.refresh_seconds = refresh_seconds
+        self.tiles = TTLCache(max_size=max_tiles, ttl=refresh_seconds)
+        self._refreshing = set()
+        self._tasks = set()
+        self.upstream_fetches = 0
+        self.background_refreshes = 0
+        self.geo_queries = 0
+
+    @staticmethod
+    def region_key(place_type: str, tile: str) -> str:
+        return f"{place_type}:{tile}"
+
+    def _entry(self, places: List[dict], refreshed_at: datetime) -> dict:
+        return {
+            "places": places,
+            "lats": np.array([p["lat"] for p in places], dtype=np.float64),
+            "lngs": np.array([p["lng"] for p in places], dtype=np.float64),
+            "refreshed_at": refreshed_at,
+            "fresh_until": refreshed_at + timedelta(seconds=self.refresh_seconds),
+        }
+
+    def _remember(self, place_type: str, tile: str, entry: dict):
+        # Re-read stale tiles from Mongo every minute so another worker's refresh is picked up
+        remaining = (entry["fresh_until"] - datetime.now(timezone.utc)).total_seconds()
+        self.tiles.set(self.region_key(place_type, tile), entry, ttl=max(remaining, POI_STALE_RECHECK_SECONDS))
+
+    async def _load(self, place_type: str, tiles: List[str]) -> Dict[str, dict]:
+        entries = {}
+        for tile in tiles:
+            entry = self.tiles.get(self.region_key(place_type, tile))
+            if entry is not None:
+                entries[tile] = entry
+        rest = [tile for tile in tiles if tile not in entries]
+        if not rest:
+            return entries
+        regions = {
+            doc["tile"]: doc async for doc in
+            self.regions.find({"key": {"$in": [self.region_key(place_type, t) for t in rest]}}, {"_id": 0, "tile": 1, "refreshed_at": 1})
+        }
+        if not regions:
+            return entries
+        by_tile = {tile: [] for tile in regions}
+        async for doc in self.pois.find({"type": place_type, "tile": {"$in": list(regions)}}, {**self.PROJECTION, "tile": 1}):
+            by_tile[doc.pop("tile")].append(doc)
+        for tile, region in regions.items():
+            entries[tile] = self._entry(by_tile[tile], as_utc(region["refreshed_at"]))
+            self._remember(place_type, tile, entries[tile])
+        return entries
+
+    async def save_places(self, places: List[dict], fetched_at: datetime, source: str):
+        """Upsert places (as built by place_from_element) keyed on their OSM identity."""
+        ops = []
+        for place in places:
+            doc = {k: place[k] for k in ("id", "osm_type", "name", "type", "lat", "lng", "address", "phone")}
+            doc.update({
+                "location": {"type": "Point", "coordinates": [place["lng"], place["lat"]]},
+                "tile": geohash_encode(place["lat"], place["lng"], self.precision),
+                "source": source,
+                "fetched_at": fetched_at,
+            })
+            ops.append(UpdateOne({"osm_type": doc["osm_type"], "id": doc["id"]}, {"$set": doc}, upsert=True))
+        if ops:
+            await self.pois.bulk_write(ops, ordered=False)
+
+    async def mark_regions(self, place_type: str, counts: Dict[str, int], refreshed_at: datetime):
+        fresh_until = refreshed_at + timedelta(seconds=self.refresh_seconds)
+        await self.regions.bulk_write([
+            UpdateOne(
+                {"key": self.region_key(place_type, tile)},
+                {"$set": {"type": place_type, "tile": tile, "count": count,
+                          "refreshed_at": refreshed_at, "fresh_until": fresh_until}},
+                upsert=True,
+            )
+            for tile, count in counts.items()
+        ], ordered=False)
+
+    async def refresh(self, place_type: str, tiles: List[str]) -> Dict[str, dict]:
+        """Re-fetch tiles from Overpass and replace what we hold for them."""
+        by_tile = await fetch_tiles(place_type, tiles)
+        if by_tile is None:
+            raise RuntimeError("Overpass returned no data")
+        self.upstream_fetches += 1
+        fetched_at = datetime.now(timezone.utc)
+        await self.save_places([p for places in by_tile.values() for p in places], fetched_at, "overpass")
+        # Whatever the fetch no longer returns has closed or been retagged
+        await self.pois.delete_many({"type": place_type, "tile": {"$in": tiles}, "fetched_at": {"$lt": fetched_at}})
+        await self.mark_regions(place_type, {tile: len(places) for tile, places in by_tile.items()}, fetched_at)
+        entries = {}
+        for tile, places in by_tile.items():
+            entries[tile] = self._entry([{k: p[k] for k in self.PROJECTION if k in p} for p in places], fetched_at)
+            self._remember(place_type, tile, entries[tile])
+        return entries
+
+    async def _refresh_in_background(self, place_type: str, tiles: List[str]):
+        # One Overpass query per NEARBY_MAX_TILES tiles, one at a time, so a wide search
+        # that queues hundreds of tiles does not burst the upstream
+        for start in range(0, len(tiles), NEARBY_MAX_TILES):
+            batch = tiles[start:start + NEARBY_MAX_TILES]
+            try:
+                await self.refresh(place_type, batch)
+                self.background_refreshes += 1
+            except Exception as e:
+                logger.warning(f"Background POI refresh of {len(batch)} {place_type} tiles failed: {e}")
+            finally:
+                self._refreshing.difference_update(self.region_key(place_type, tile) for tile in batch)
+
+    def schedule_refresh(self, place_type: str, tiles: List[str]):
+        tiles = [tile for tile in tiles if self.region_key(place_type, tile) not in self._refreshing]
+        if not tiles:
+            return
+        self._refreshing.update(self.region_key(place_type, tile) for tile in tiles)
+        task = asyncio.create_task(self._refresh_in_background(place_type, tiles))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _nearby_geo(self, place_type: str, lat: float, lng: float, radius: float, limit: int):
+        """Wide searches go straight to the 2dsphere index instead of fanning out over tiles.
+
+        Only the NEARBY_MAX_REFRESH_TILES tiles nearest the centre are checked. Those
+        never fetched (or past POI_MAX_STALE_SECONDS) are queued for a background
+        refresh, nearest first, and the answer is reported incomplete until they land;
+        stale tiles are re-fetched in the background as on the tile path.
+        """
+        self.geo_queries += 1
+        tiles = geohash_cover_nearest(lat, lng, radius, self.precision, NEARBY_MAX_REFRESH_TILES)
+        now = datetime.now(timezone.utc)
+        too_old = now - timedelta(seconds=POI_MAX_STALE_SECONDS)
+        regions = {
+            doc["tile"]: doc async for doc in
+            self.regions.find({"key": {"$in": [self.region_key(place_type, t) for t in tiles]}},
+                              {"_id": 0, "tile": 1, "refreshed_at": 1})
+        }
+        unknown, due = [], []
+        for tile in tiles:
+            region = regions.get(tile)
+            if region is None or as_utc(region["refreshed_at"]) <= too_old:
+                unknown.append(tile)
+                due.append(tile)
+            elif as_utc(region["refreshed_at"]) + timedelta(seconds=self.refresh_seconds) <= now:
+                due.append(tile)
+        if due:
+            self.schedule_refresh(place_type, due)
+
+        # Never answer from places older than the hard staleness bound
+        query = {"type": place_type, "fetched_at": {"$gte": too_old}}
+        near = {"type": "Point", "coordinates": [lng, lat]}
+        items = await self.pois.aggregate([
+            {"$geoNear": {"near": near, "distanceField": "distance", "maxDistance": radius,
+                          "spherical": True, "query": query}},
+            {"$limit": limit},
+            {"$project": {**self.PROJECTION, "distance": 1, "fetched_at": 1}},
+        ]).to_list(limit)
+        total = await self.pois.count_documents({
+            **query,
+            "location": {"$geoWithin": {"$centerSphere": [[lng, lat], radius / EARTH_RADIUS_M]}},
+        })
+        fetched = [as_utc(item.pop("fetched_at")) for item in items if item.get("fetched_at")]
+        return items, total, not unknown, min(fetched, default=None)
+
+    async def nearby(self, place_type: str, lat: float, lng: float, radius: float, limit: int):
+        """(nearest places with distance in metres, total within radius, complete?,
+        refresh time of the oldest data answered from)."""
+        if geohash_cover_size(lat, lng, radius, self.precision) > NEARBY_MAX_TILES:
+            return await self._nearby_geo(place_type, lat, lng, radius, limit)
+        tiles = geohash_cover(lat, lng, radius, self.precision)
+
+        entries = await self._load(place_type, tiles)
+        now = datetime.now(timezone.utc)
+        too_old = now - timedelta(seconds=POI_MAX_STALE_SECONDS)
+        for tile in [tile for tile, entry in entries.items() if entry["refreshed_at"] <= too_old]:
+            del entries[tile]
+        complete = True
+        unknown = [tile for tile in tiles if tile not in entries]
+        if unknown:
+            try:
+                entries.update(await self.refresh(place_type, unknown))
+            except Exception as e:
+                if not entries:
+                    raise
+                logger.warning(f"POI fetch for {len(unknown)} new or expired tiles failed, serving known tiles: {e}")
+                complete = False
+        stale = [tile for tile, entry in entries.items() if entry["fresh_until"] <= now]
+        if stale:
+            self.schedule_refresh(place_type, stale)
+
+        held = [entries[tile] for tile in tiles if tile in entries]
+        as_of = min((entry["refreshed_at"] for entry in held), default=None)
+        places = [p for entry in held for p in entry["places"]]
+        if not places:
+            return [], 0, complete, as_of
+        dist = haversine_many(lat, lng, np.concatenate([e["lats"] for e in held]), np.concatenate([e["lngs"] for e in held]))
+        inside = np.flatnonzero(dist <= radius)
+        nearest = inside[top_k_smallest(dist[inside], limit)]
+        return [{**places[i], "distance": float(dist[i])} for i in nearest], len(inside), complete, as_of
+
+    def stats(self) -> dict:
+        return {
+            "tiles_in_memory": self.tiles.stats(),
+            "upstream_fetches": self.upstream_fetches,
+            "background_refreshes": self.background_refreshes,
+            "refreshing_tiles": len(self._refreshing),
+            "geo_queries": self.geo_queries,
+        }
+
+POI_STORE = PoiStore(
+    db.pois, db.poi_regions,
+    precision=NEARBY_TILE_PRECISION,
+    refresh_seconds=POI_REFRESH_SECONDS,
+    max_tiles=POI_MAX_TILES_IN_MEMORY,
+)
+
 @api_router.get("/nearby")
 async def get_nearby(
     type: str = "hospital",
-    radius: int = 5000,
+    radius: int = Query(5000, gt=0, le=NEARBY_MAX_RADIUS_M),
     limit: int = 20,
+    sort: str = "distance",
     user: dict = Depends(get_current_user)
 ):
     lat = user.get("lat")
@@ -825,82 +2814,34 @@ async def get_nearby(
     if not lat or not lng:
         raise HTTPException(status_code=400, detail="Location not set")
     
-    # Try to get from cache first
-    cache_key = f"nearby:{type}:{lat:.3f}:{lng:.3f}:{radius}"
-    cached = await db.cache.find_one({"key": cache_key})
-    if cached and cached.get("expires_at", "") > datetime.now(timezone.utc).isoformat():
-        return {"items": cached["data"][:limit], "total": len(cached["data"]), "warning": None}
-    
-    # Use Overpass API for real data
-    type_map = {
-        "hospital": '["amenity"="hospital"]',
-        "clinic": '["amenity"="clinic"]',
-        "pharmacy": '["amenity"="pharmacy"]'
-    }
-    osm_filter = type_map.get(type, '["amenity"="hospital"]')
-    
+    # Served from the local POI store; Overpass is only hit for tiles never seen before
+    place_type = type if type in OSM_FILTERS else "hospital"
+    by_travel_time = sort == "travel_time"
     try:
-        query = f"""
-        [out:json][timeout:10];
-        (
-          node{osm_filter}(around:{radius},{lat},{lng});
-          way{osm_filter}(around:{radius},{lat},{lng});
-        );
-        out center;
-        """
-        async with httpx.AsyncClient(verify=False) as http_client:
-            resp = await http_client.post(
-                "https://overpass-api.de/api/interpreter",
-                data={"data": query},
-                timeout=15
-            )
-            if resp.status_code == 200:
-                data = resp.json()
-                places = []
-                for elem in data.get("elements", [])[:limit]:
-                    place_lat = elem.get("lat") or elem.get("center", {}).get("lat")
-                    place_lng = elem.get("lon") or elem.get("center", {}).get("lon")
-                    if place_lat and place_lng:
-                        name = elem.get("tags", {}).get("name", f"Unknown {type.title()}")
-                        # Calculate distance
-                        from math import radians, sin, cos, sqrt, atan2
-                        R = 6371000
-                        lat1, lat2 = radians(lat), radians(place_lat)
-                        dlat = radians(place_lat - lat)
-                        dlng = radians(place_lng - lng)
-                        a = sin(dlat/2)**2 + cos(lat1)*cos(lat2)*sin(dlng/2)**2
-                        dist = R * 2 * atan2(sqrt(a), sqrt(1-a))
-                        
-                        phone = elem.get("tags", {}).get("phone", "")
-                        if not phone:
-                            # Try curated database lookup
-                            phone = get_justdial_phone(name)
-                            
-                        if not phone:
-                            # Generate a realistic looking Indian phone number if missing
-                            import random
-                            random.seed(elem.get("id"))
-                            phone = f"+91-{random.randint(7000, 9999)}-{random.randint(100000, 999999)}"
-
-                        places.append({
-                            "id": str(elem.get("id")),
-                            "name": name,
-                            "type": type,
-                            "lat": place_lat,
-                            "lng": place_lng,
-                            "distance": round(dist),
-                            "address": elem.get("tags", {}).get("addr:full", ""),
-                            "phone": phone
-                        })
-
-                
-                # Cache results
-                await db.cache.update_one(
-                    {"key": cache_key},
-                    {"$set": {"data": places, "expires_at": (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()}},
-                    upsert=True
-                )
-                return {"items": places, "total": len(places), "warning": None}
+        # Road time roughly follows straight-line distance, so rank a wider ring of the
+        # nearest places by travel time rather than all of them
+        fetch = max(limit, NEARBY_TRAVEL_TIME_CANDIDATES) if by_travel_time else limit
+        places, total, complete, as_of = await POI_STORE.nearby(place_type, lat, lng, radius, fetch)
+        if places or complete:
+            items = [
+                {**place, "type": type, "distance": round(place["distance"]), "phone": place_phone(place)}
+                for place in places
+            ]
+            warning = None if complete else "PARTIAL_DATA"
+            if by_travel_time and items:
+                try:
+                    legs = await travel_matrix(lat, lng, [(p["lat"], p["lng"]) for p in items])
+                    for item, leg in zip(items, legs):
+                        item["duration"] = leg["duration"] if leg else None
+                        item["travel_distance"] = leg["distance"] if leg else None
+                    # Unreachable places last, in distance order
+                    items.sort(key=lambda p: (p["duration"] is None, p["duration"] or 0))
+                except Exception as e:
+                    logger.warning(f"Travel times unavailable, sorting by distance: {e}")
+                    warning = warning or "TRAVEL_TIME_UNAVAILABLE"
+            data_age = round((datetime.now(timezone.utc) - as_of).total_seconds()) if as_of else None
+            return {"items": items[:limit], "total": total, "warning": warning,
+                    "data_age": data_age, "stale": data_age is not None and data_age > POI_REFRESH_SECONDS}
     except Exception as e:
         logger.error(f"Nearby fetch failed: {e}")
     
@@ -936,29 +2877,35 @@ async def get_nearby(
             {"id": "3", "name": f"Apollo {type.title()}", "type": type, "lat": lat + 0.015, "lng": lng - 0.005, "distance": 1800, "address": "Medical Lane", "phone": "+91-9876543212"},
         ]
         
-    return {"items": fallback[:limit], "total": len(fallback), "warning": "LIVE_DATA_UNAVAILABLE"}
+    return {"items": fallback[:limit], "total": len(fallback), "warning": "LIVE_DATA_UNAVAILABLE",
+            "data_age": None, "stale": False}
 
 # ============== ROUTE ==============
 
+# Road geometry hardly changes: serve cached routes, refreshing them in the background once stale
+ROUTE_CACHE = StaleWhileRevalidate(
+    db.cache,
+    fresh_seconds=ROUTE_CACHE_FRESH_SECONDS,
+    max_stale_seconds=ROUTE_CACHE_MAX_STALE_SECONDS,
+    max_size=ROUTE_CACHE_MAX_SIZE,
+)
+
 @api_router.get("/route")
 async def get_route(from_lat: float, from_lng: float, to_lat: float, to_lng: float):
+    # ~1 m: the same trip asked again (or by a neighbour's app) is the same route
+    from_lat, from_lng, to_lat, to_lng = (round(v, 5) for v in (from_lat, from_lng, to_lat, to_lng))
+
+    async def fetch():
+        data = await osrm_route(from_lat, from_lng, to_lat, to_lng)
+        if data and data.get("routes"):
+            route = data["routes"][0]
+            return {"geometry": route["geometry"], "distance": route["distance"], "duration": route["duration"]}
+        return None
+
     try:
-        async with httpx.AsyncClient() as http_client:
-            resp = await http_client.get(
-                f"https://router.project-osrm.org/route/v1/driving/{from_lng},{from_lat};{to_lng},{to_lat}",
-                params={"overview": "full", "geometries": "geojson"},
-                timeout=10
-            )
-            if resp.status_code == 200:
-                data = resp.json()
-                if data.get("routes"):
-                    route = data["routes"][0]
-                    return {
-                        "geometry": route["geometry"],
-                        "distance": route["distance"],
-                        "duration": route["duration"],
-                        "warning": None
-                    }
+        route, age, stale = await ROUTE_CACHE.get(f"route:{from_lat:.5f}:{from_lng:.5f}:{to_lat:.5f}:{to_lng:.5f}", fetch)
+        if route:
+            return {**route, "warning": None, "data_age": round(age), "stale": stale}
     except Exception as e:
         logger.error(f"Route fetch failed: {e}")
     
@@ -970,11 +2917,205 @@ async def get_route(from_lat: float, from_lng: float, to_lat: float, to_lng: flo
         },
         "distance": None,
         "duration": None,
-        "warning": "ROUTE_UNAVAILABLE_STRAIGHT_LINE"
+        "warning": "ROUTE_UNAVAILABLE_STRAIGHT_LINE",
+        "data_age": None,
+        "stale": False,
     }
 
+# Keyed per (origin cell, destination), so overlapping destination sets share entries
+ROUTE_MATRIX_CACHE = TwoTierCache(db.cache, ttl=ROUTE_MATRIX_CACHE_TTL_SECONDS, max_size=ROUTE_MATRIX_CACHE_MAX_SIZE)
+
+async def travel_matrix(lat: float, lng: float, points: List[tuple]) -> List[Optional[dict]]:
+    """{"duration", "distance"} by road from (lat, lng) to each (lat, lng) point, in order;
+    None where OSRM found no route. Raises if OSRM can't be reached.
+
+    The origin is snapped to the centre of its geohash cell, so everyone in the cell
+    shares cached entries and only the destinations not cached yet go to OSRM,
+    in table calls of at most OSRM_TABLE_MAX_DESTINATIONS.
+    """
+    cell = geohash_encode(lat, lng, ROUTE_MATRIX_ORIGIN_PRECISION)
+    s, w, n, e = geohash_bbox(cell)
+    origin = ((s + n) / 2, (w + e) / 2)
+    dests = [(round(p[0], 5), round(p[1], 5)) for p in points]
+    keys = [f"route:{cell}:{d[0]:.5f}:{d[1]:.5f}" for d in dests]
+    found = await ROUTE_MATRIX_CACHE.get_many(keys)
+
+    missing = list(dict.fromkeys(d for d, key in zip(dests, keys) if key not in found))
+    for i in range(0, len(missing), OSRM_TABLE_MAX_DESTINATIONS):
+        chunk = missing[i:i + OSRM_TABLE_MAX_DESTINATIONS]
+        data = await osrm_table(origin[0], origin[1], chunk)
+        if not data or data.get("code") != "Ok":
+            raise RuntimeError(f"OSRM table failed: {(data or {}).get('code', 'no response')}")
+        durations, distances = data["durations"][0], data["distances"][0]
+        fresh = {}
+        for j, d in enumerate(chunk, start=1):  # column 0 is the origin itself
+            entry = {"duration": durations[j], "distance": distances[j]} if durations[j] is not None else {}
+            fresh[f"route:{cell}:{d[0]:.5f}:{d[1]:.5f}"] = entry
+        await ROUTE_MATRIX_CACHE.set_many(fresh)
+        found.update(fresh)
+    # {} marks a cached "no route", so it isn't asked for again
+    return [found[key] or None for key in keys]
+
+@api_router.post("/route/matrix")
+async def get_route_matrix(req: RouteMatrixRequest):
+    if len(req.destinations) > ROUTE_MATRIX_MAX_DESTINATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {ROUTE_MATRIX_MAX_DESTINATIONS} destinations")
+    points = [(d.lat, d.lng) for d in req.destinations]
+    try:
+        legs = await travel_matrix(req.from_lat, req.from_lng, points)
+        warning = None
+    except Exception as e:
+        logger.error(f"Route matrix fetch failed: {e}")
+        legs, warning = [None] * len(points), "ROUTE_UNAVAILABLE"
+    items = [
+        {"id": d.id, "lat": d.lat, "lng": d.lng,
+         "duration": leg["duration"] if leg else None, "distance": leg["distance"] if leg else None}
+        for d, leg in zip(req.destinations, legs)
+    ]
+    return {"items": items, "warning": warning}
+
 # ============== DOCTORS ==============
 
+def search_tokens(*values) -> List[str]:
+    """Lowercase words of the given strings / lists of strings, deduplicated."""
+    words = []
+    for value in values:
+        for text in ([value] if isinstance(value, str) else value or []):
+            words.extend(re.findall(r'\w+', text.lower()))
+    return list(dict.fromkeys(words))
+
+def doctor_search_fields(doc: dict) -> dict:
+    """Indexed fields behind /doctors: token arrays for the condition and specialty
+    filters, and a GeoJSON point for sort=distance (when the doctor has lat/lng)."""
+    fields = {
+        "condition_tokens": search_tokens(doc.get("conditions")),
+        "specialty_tokens": search_tokens(doc.get("specialty")),
+    }
+    if doc.get("lat") is not None and doc.get("lng") is not None:
+        fields["location"] = {"type": "Point", "coordinates": [doc["lng"], doc["lat"]]}
+    return fields
+
+class DoctorTokens:
+    """Sorted distinct values of the doctors' token arrays, so a typed word can be turned
+    into the whole tokens it starts ('cardio' -> ['cardiology', 'cardiothoracic']).
+
+    /doctors then filters with equality ($in) on the token array. Point bounds on the
+    leading field let Mongo read the token indexes (condition_rating, condition_name,
+    ...) already in sort order, which an anchored $regex range could not: it scanned
+    every match and sorted them in memory. Reloaded with distinct() every
+    DOCTOR_TOKENS_RELOAD_SECONDS, and right away after this process writes doctors.
+    """
+
+    # Past this many terms Mongo stops merging the per-term index scans for the sort
+    MAX_TERMS = 200
+
+    def __init__(self, reload_seconds: float):
+        self.reload_seconds = reload_seconds
+        self._tokens: Dict[str, List[str]] = {}
+        self._loaded_at: Dict[str, float] = {}
+
+    def invalidate(self):
+        self._loaded_at.clear()
+
+    async def _sorted(self, field: str) -> List[str]:
+        if time.monotonic() - self._loaded_at.get(field, float("-inf")) >= self.reload_seconds:
+            self._tokens[field] = sorted(await db.doctors.distinct(field))
+            self._loaded_at[field] = time.monotonic()
+        return self._tokens[field]
+
+    async def expand(self, field: str, word: str) -> Optional[List[str]]:
+        """Tokens starting with `word`, or None when there are too many to list."""
+        tokens = await self._sorted(field)
+        terms = []
+        for token in tokens[bisect.bisect_left(tokens, word):]:
+            if not token.startswith(word):
+                break
+            if len(terms) == self.MAX_TERMS:
+                return None
+            terms.append(token)
+        return terms
+
+    async def filter(self, field: str, text: str) -> dict:
+        """Every word of `text` must start some token: 'chest pain' matches 'chest pain',
+        'heart' matches 'heart disease', 'cardio' matches 'Cardiology'. A word that
+        starts no token matches nothing; one that starts too many (a single letter)
+        falls back to an anchored prefix regex."""
+        clauses = []
+        for word in search_tokens(text):
+            terms = await self.expand(field, word)
+            clauses.append({field: {"$regex": f"^{re.escape(word)}"} if terms is None else {"$in": terms}})
+        if not clauses:
+            return {}
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+DOCTOR_TOKENS = DoctorTokens(DOCTOR_TOKENS_RELOAD_SECONDS)
+
+async def backfill_doctor_search_fields(batch_size: int = 1000) -> int:
+    """Add token arrays to doctors stored before they existed; returns how many were updated."""
+    updated = 0
+    ops = []
+    missing = {"$or": [
+        {"condition_tokens": {"$exists": False}},
+        {"location": {"$exists": False}, "lat": {"$type": "number"}, "lng": {"$type": "number"}},
+    ]}
+    async for doc in db.doctors.find(missing, {"_id": 0, "id": 1, "conditions": 1, "specialty": 1, "lat": 1, "lng": 1}):
+        ops.append(UpdateOne({"id": doc["id"]}, {"$set": doctor_search_fields(doc)}))
+        if len(ops) >= batch_size:
+            await db.doctors.bulk_write(ops, ordered=False)
+            updated += len(ops)
+            ops = []
+    if ops:
+        await db.doctors.bulk_write(ops, ordered=False)
+        updated += len(ops)
+    return updated
+
+DOCTOR_PROJECTION = {"_id": 0, "condition_tokens": 0, "specialty_tokens": 0, "location": 0,
+                     "rating_star_sum": 0, "rating_accuracy_sum": 0, "rating_count": 0}
+DOCTOR_SORTS = {
+    "rating": [("avg_rating", DESCENDING), ("id", ASCENDING)],
+    "name": [("name", ASCENDING), ("id", ASCENDING)],
+}
+
+async def doctor_query(condition: Optional[str], specialty: Optional[str]) -> dict:
+    clauses = [c for c in (await DOCTOR_TOKENS.filter("condition_tokens", condition or ""),
+                           await DOCTOR_TOKENS.filter("specialty_tokens", specialty or "")) if c]
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+async def doctors_by_distance(query: dict, lat: float, lng: float, skip: int, limit: int,
+                              radius_km: Optional[float] = None):
+    """(page of doctors nearest first with `distance` in km, total) via $geoNear on the
+    2dsphere index. Without a radius, doctors with no location follow the located ones
+    (best rated first), as they did when distances defaulted to 9999."""
+    near = {"type": "Point", "coordinates": [lng, lat]}
+    geo_near = {"near": near, "distanceField": "distance", "spherical": True,
+                "distanceMultiplier": 0.001, "query": query}
+    located_query = {**query, "location": {"$exists": True}}
+    if radius_km is not None:
+        geo_near["maxDistance"] = radius_km * 1000
+        located_query["location"] = {"$geoWithin": {"$centerSphere": [[lng, lat], radius_km / (EARTH_RADIUS_M / 1000)]}}
+    located_total = await db.doctors.count_documents(located_query)
+
+    doctors = []
+    if skip < located_total:
+        doctors = await db.doctors.aggregate([
+            {"$geoNear": geo_near},
+            {"$skip": skip},
+            {"$limit": limit},
+            {"$project": DOCTOR_PROJECTION},
+        ]).to_list(limit)
+    if radius_km is not None:
+        return doctors, located_total
+
+    unlocated_query = {**query, "location": {"$exists": False}}
+    unlocated_total = await db.doctors.count_documents(unlocated_query)
+    if len(doctors) < limit and unlocated_total:
+        rest = await db.doctors.find(unlocated_query, DOCTOR_PROJECTION).sort(DOCTOR_SORTS["rating"]) \
+            .skip(max(skip - located_total, 0)).limit(limit - len(doctors)).to_list(limit - len(doctors))
+        doctors += [{**doc, "distance": 9999} for doc in rest]
+    return doctors, located_total + unlocated_total
+
 @api_router.get("/doctors")
 async def get_doctors(
     condition: Optional[str] = None,
@@ -982,61 +3123,121 @@ async def get_doctors(
     sort: str = "rating",
     lat: Optional[float] = None,
     lng: Optional[float] = None,
+    radius_km: Optional[float] = Query(None, gt=0),
     page: int = 1,
-    page_size: int = 10
+    page_size: int = 10,
+    cursor: Optional[str] = None,
 ):
-    query = {}
-    if condition:
-        query["conditions"] = {"$regex": condition, "$options": "i"}
-    if specialty:
-        query["specialty"] = {"$regex": specialty, "$options": "i"}
-    
-    sort_field = {"rating": "avg_rating", "distance": "distance", "name": "name"}.get(sort, "avg_rating")
-    sort_dir = -1 if sort in ["rating"] else 1
-    
+    by_distance = sort == "distance" and lat is not None and lng is not None
+    if by_distance and cursor:
+        # $geoNear has no stable key to resume from; distance pages go by number
+        raise HTTPException(status_code=400, detail="Cursor pagination is not supported with sort=distance; use page")
+    query = await doctor_query(condition, specialty)
+    page, page_size = max(page, 1), min(max(page_size, 1), 100)
     skip = (page - 1) * page_size
-    doctors = await db.doctors.find(query, {"_id": 0}).to_list(None)
-    
-    # Calculate distance if location provided
-    import random
-    from math import radians, sin, cos, sqrt, atan2
-    
+
+    next_cursor = None
+    if by_distance:
+        doctors, total = await doctors_by_distance(query, lat, lng, skip, page_size, radius_km)
+    else:
+        # Filter, sort and paginate in Mongo: only the requested page comes back,
+        # and with a cursor the page starts from the index rather than skipping to it
+        doctors, next_cursor = await keyset_page(db.doctors, query, DOCTOR_PROJECTION,
+                                                 DOCTOR_SORTS.get(sort, DOCTOR_SORTS["rating"]), page, page_size, cursor)
+        total = await cached_count(db.doctors, query)
+
+    # $geoNear already set distances; other sorts get them for this page only
+    located = [doc for doc in doctors if "distance" not in doc and doc.get("lat") and doc.get("lng")]
     for doc in doctors:
-        # Distance calculation
-        if lat is not None and lng is not None and doc.get("lat") and doc.get("lng"):
-            R = 6371  # Earth radius in km
-            lat1, lat2 = radians(lat), radians(doc["lat"])
-            dlat = radians(doc["lat"] - lat)
-            dlng = radians(doc["lng"] - lng)
-            a = sin(dlat/2)**2 + cos(lat1)*cos(lat2)*sin(dlng/2)**2
-            c = 2 * atan2(sqrt(a), sqrt(1-a))
-            doc["distance"] = R * c
-        else:
-            doc["distance"] = doc.get("distance", 9999)
+        doc.setdefault("distance", 9999)
+    if lat is not None and lng is not None and located:
+        km = haversine_many(lat, lng, [d["lat"] for d in located], [d["lng"] for d in located]) / 1000
+        for doc, d in zip(located, km.tolist()):
+            doc["distance"] = d
 
+    for doc in doctors:
         # Phone number update/fallback according to location
         if not doc.get("phone"):
-            # If no phone, generate a stable one based on ID
-            random.seed(doc.get("id", doc.get("name")))
-            doc["phone"] = f"+91-{random.randint(7000, 9999)}-{random.randint(100000, 999999)}"
-        
-    # Sort
-    reverse = True if sort == "rating" else False
-    doctors.sort(key=lambda x: x.get(sort_field, 0 if sort == "rating" else 9999), reverse=reverse)
-    
-    # Pagination
-    total = len(doctors)
-    paginated_doctors = doctors[skip : skip + page_size]
-    
-    return {"items": paginated_doctors, "total": total, "page": page, "page_size": page_size}
+            # If no phone, generate a stable one based on ID (private Random, see place_from_element)
+            rng = random.Random(doc.get("id", doc.get("name")))
+            doc["phone"] = f"+91-{rng.randint(7000, 9999)}-{rng.randint(100000, 999999)}"
+
+    return {"items": doctors, "total": total, "page": page, "page_size": page_size, "next_cursor": next_cursor}
 
 @api_router.get("/doctors/{doctor_id}")
 async def get_doctor(doctor_id: str):
-    doctor = await db.doctors.find_one({"id": doctor_id}, {"_id": 0})
+    doctor = await db.doctors.find_one({"id": doctor_id}, DOCTOR_PROJECTION)
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
     return {"data": doctor}
 
+def rating_averages(star_sum: float, accuracy_sum: float, count: int) -> dict:
+    return {
+        "avg_rating": round(star_sum / count, 1),
+        "avg_accuracy": round(accuracy_sum / count, 1),
+        "review_count": count,
+    }
+
+async def record_doctor_rating(doctor_id: str, stars: int, accuracy: int):
+    """Fold one review into the doctor's running sums: O(1) however many reviews exist.
+
+    The sums move atomically with $inc; the averages derived from them are then set
+    only if no other review has landed in between (rating_count unchanged), so the
+    last writer always leaves averages that match the sums.
+    """
+    doctor = await db.doctors.find_one_and_update(
+        {"id": doctor_id},
+        {"$inc": {"rating_star_sum": stars, "rating_accuracy_sum": accuracy, "rating_count": 1}},
+        {"_id": 0, "rating_star_sum": 1, "rating_accuracy_sum": 1, "rating_count": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if doctor:
+        averages = rating_averages(doctor["rating_star_sum"], doctor["rating_accuracy_sum"], doctor["rating_count"])
+        await db.doctors.update_one({"id": doctor_id, "rating_count": doctor["rating_count"]}, {"$set": averages})
+        TYPEAHEAD.update_doctor_stats(doctor_id, averages["avg_rating"], averages["review_count"])
+
+async def rebuild_doctor_ratings(doctor_ids: Optional[List[str]] = None):
+    """Recompute every reviewed doctor's (or just `doctor_ids`') sums and averages from
+    doctor_feedback in one pipeline, merged straight into doctors (e.g. after restoring
+    feedback from a backup). Doctors without any feedback keep their seeded ratings."""
+    match = [{"$match": {"doctor_id": {"$in": doctor_ids}}}] if doctor_ids is not None else []
+    await db.doctor_feedback.aggregate([
+        *match,
+        {"$group": {
+            "_id": "$doctor_id",
+            "rating_star_sum": {"$sum": "$stars"},
+            "rating_accuracy_sum": {"$sum": "$accuracy"},
+            "rating_count": {"$sum": 1},
+        }},
+        {"$project": {
+            "_id": 0,
+            "id": "$_id",
+            "rating_star_sum": 1,
+            "rating_accuracy_sum": 1,
+            "rating_count": 1,
+            "avg_rating": {"$round": [{"$divide": ["$rating_star_sum", "$rating_count"]}, 1]},
+            "avg_accuracy": {"$round": [{"$divide": ["$rating_accuracy_sum", "$rating_count"]}, 1]},
+            "review_count": "$rating_count",
+        }},
+        {"$merge": {"into": "doctors", "on": "id", "whenMatched": "merge", "whenNotMatched": "discard"}},
+    ]).to_list(None)
+
+async def backfill_doctor_ratings(batch_size: int = 1000) -> int:
+    """Seed running sums for doctors stored before they existed; returns how many were seeded.
+
+    Without this their first $inc would start from zero and the averages would collapse
+    to that one review. Reviewed doctors get sums from their feedback; the rest get zero
+    sums, so each doctor is only ever seeded once.
+    """
+    missing = {"rating_count": {"$exists": False}}
+    ids = [doc["id"] async for doc in db.doctors.find(missing, {"_id": 0, "id": 1})]
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        await rebuild_doctor_ratings(batch)
+        await db.doctors.update_many({**missing, "id": {"$in": batch}},
+                                     {"$set": {"rating_star_sum": 0, "rating_accuracy_sum": 0, "rating_count": 0}})
+    return len(ids)
+
 @api_router.post("/doctors/{doctor_id}/feedback")
 async def add_doctor_feedback(doctor_id: str, feedback: DoctorFeedback, user: dict = Depends(get_current_user)):
     doctor = await db.doctors.find_one({"id": doctor_id})
@@ -1056,78 +3257,408 @@ async def add_doctor_feedback(doctor_id: str, feedback: DoctorFeedback, user: di
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.doctor_feedback.insert_one(feedback_doc)
-    
-    # Update doctor rating
-    all_feedback = await db.doctor_feedback.find({"doctor_id": doctor_id}).to_list(1000)
-    if all_feedback:
-        avg_rating = sum(f["stars"] for f in all_feedback) / len(all_feedback)
-        avg_accuracy = sum(f["accuracy"] for f in all_feedback) / len(all_feedback)
-        await db.doctors.update_one(
-            {"id": doctor_id},
-            {"$set": {"avg_rating": round(avg_rating, 1), "avg_accuracy": round(avg_accuracy, 1), "review_count": len(all_feedback)}}
-        )
+    forget_count(db.doctor_feedback, {"doctor_id": doctor_id})
+    await record_doctor_rating(doctor_id, feedback.stars, feedback.accuracy)
     
     return {"message": "Feedback submitted", "data": {k: v for k, v in feedback_doc.items() if k != "_id"}}
 
 @api_router.get("/doctors/{doctor_id}/feedback")
-async def get_doctor_feedback(doctor_id: str, page: int = 1, page_size: int = 10):
-    skip = (page - 1) * page_size
-    feedback = await db.doctor_feedback.find({"doctor_id": doctor_id}, {"_id": 0}).sort("created_at", -1).skip(skip).limit(page_size).to_list(page_size)
-    total = await db.doctor_feedback.count_documents({"doctor_id": doctor_id})
-    return {"items": feedback, "total": total, "page": page, "page_size": page_size}
+async def get_doctor_feedback(doctor_id: str, page: int = 1, page_size: int = 10, cursor: Optional[str] = None):
+    query = {"doctor_id": doctor_id}
+    page, page_size = max(page, 1), min(max(page_size, 1), 100)
+    feedback, next_cursor = await keyset_page(db.doctor_feedback, query, {"_id": 0}, RECENT_FIRST, page, page_size, cursor)
+    total = await cached_count(db.doctor_feedback, query)
+    return {"items": feedback, "total": total, "page": page, "page_size": page_size, "next_cursor": next_cursor}
+
+# ============== TYPEAHEAD ==============
+
+class TypeaheadIndex:
+    """Prefix index over doctor names, specialties, conditions and the curated hospital
+    names: one sorted list of keys, searched with bisect.
+
+    Every word position of a label is a key ('rajesh kumar', 'kumar'; a leading 'Dr'
+    is dropped), so typing any word of it finds it. Suggestions matching from the
+    label's start come first, then by popularity (reviews of the doctors behind the
+    suggestion), then rating. A max segment tree over the keys' scores yields the
+    best of a prefix range in O(k log n) instead of scanning it, so one-letter
+    prefixes cost about what full words do.
+
+    Doctors are added, updated and removed in place; a specialty or condition
+    disappears with its last doctor. Adding or removing keys marks the tree for a
+    rebuild on the next lookup; a new review only re-scores the affected leaves.
+    """
+
+    HONORIFICS = {"dr"}
+    TYPES = ("doctor", "specialty", "condition", "hospital")
+    LABEL_START_BONUS = 1e15
+
+    def __init__(self):
+        self._keys: List[str] = []  # sorted 'key\x00item id', so every entry is unique and found by one bisect
+        self._ids: List[str] = []   # item id for each key
+        self._scores: List[float] = []  # score of each key, see _score
+        self._tree = None
+        self._size = 0
+        self.items: Dict[str, dict] = {}
+        self._doctors: Dict[str, dict] = {}  # doctor id -> linked items and review count
+        self.loaded_at = 0.0
+        self._reload_task = None  # held so it isn't garbage-collected mid-reload
+        self.lookups = 0
+        self.lookup_seconds = 0.0
+        self.tree_builds = 0
+
+    def _index_keys(self, label: str) -> List[str]:
+        words = search_tokens(label)
+        if len(words) > 1 and words[0] in self.HONORIFICS:
+            words = words[1:]
+        return [" ".join(words[i:]) for i in range(len(words))]
+
+    def _score(self, item: dict, key: str) -> float:
+        return (self.LABEL_START_BONUS if key == item["key"] else 0) + item["popularity"] * 10 + (item["rating"] or 0)
+
+    def _positions(self, item_id: str):
+        for key in self._index_keys(self.items[item_id]["label"]):
+            yield bisect.bisect_left(self._keys, f"{key}\x00{item_id}")
+
+    def _add_item(self, item_id: str, item_type: str, label: str, ref_id: Optional[str] = None, pending=None) -> dict:
+        item = self.items.get(item_id)
+        if item is not None:
+            return item
+        keys = self._index_keys(label)
+        item = {"type": item_type, "label": label, "id": ref_id, "key": keys[0] if keys else "",
+                "popularity": 0, "rating": None, "refs": 0}
+        self.items[item_id] = item
+        for key in keys:
+            if pending is not None:
+                pending.append((key, item_id))
+            else:
+                entry = f"{key}\x00{item_id}"
+                i = bisect.bisect_left(self._keys, entry)
+                self._keys.insert(i, entry)
+                self._ids.insert(i, item_id)
+                self._scores.insert(i, self._score(item, key))
+                self._tree = None
+        return item
+
+    def _remove_item(self, item_id: str):
+        for i in sorted(self._positions(item_id), reverse=True):
+            del self._keys[i]
+            del self._ids[i]
+            del self._scores[i]
+        del self.items[item_id]
+        self._tree = None
+
+    def _rescore(self, item_id: str):
+        item = self.items[item_id]
+        for i in self._positions(item_id):
+            self._scores[i] = self._score(item, self._keys[i].partition("\x00")[0])
+            if self._tree is not None:
+                node = self._size + i
+                self._tree[node] = self._scores[i]
+                while node > 1:
+                    node //= 2
+                    self._tree[node] = max(self._tree[2 * node], self._tree[2 * node + 1])
+
+    def upsert_doctor(self, doc: dict, pending=None):
+        self.remove_doctor(doc["id"])
+        if not search_tokens(doc.get("name")):
+            return
+        reviews = doc.get("review_count") or 0
+        item_id = f"doctor:{doc['id']}"
+        self._add_item(item_id, "doctor", doc["name"], doc["id"], pending)
+        self.items[item_id].update(popularity=reviews, rating=doc.get("avg_rating"))
+        linked = []
+        for item_type, labels in (("specialty", [doc.get("specialty")]), ("condition", doc.get("conditions") or [])):
+            for label in labels:
+                norm = " ".join(search_tokens(label))
+                shared_id = f"{item_type}:{norm}"
+                if not norm or shared_id in linked:
+                    continue
+                self._add_item(shared_id, item_type, label, pending=pending)
+                self.items[shared_id]["refs"] += 1
+                self.items[shared_id]["popularity"] += reviews
+                linked.append(shared_id)
+        self._doctors[doc["id"]] = {"linked": linked, "reviews": reviews}
+        if pending is None:
+            for changed in [item_id, *linked]:
+                self._rescore(changed)
+
+    def remove_doctor(self, doctor_id: str):
+        entry = self._doctors.pop(doctor_id, None)
+        if entry is None:
+            return
+        self._remove_item(f"doctor:{doctor_id}")
+        for item_id in entry["linked"]:
+            shared = self.items[item_id]
+            shared["refs"] -= 1
+            shared["popularity"] -= entry["reviews"]
+            if shared["refs"]:
+                self._rescore(item_id)
+            else:
+                self._remove_item(item_id)
+
+    def update_doctor_stats(self, doctor_id: str, avg_rating: float, review_count: int):
+        """A new review: re-score the doctor and its specialty/conditions, keys untouched."""
+        entry = self._doctors.get(doctor_id)
+        if entry is None:
+            return
+        delta = review_count - entry["reviews"]
+        entry["reviews"] = review_count
+        self.items[f"doctor:{doctor_id}"].update(popularity=review_count, rating=avg_rating)
+        self._rescore(f"doctor:{doctor_id}")
+        for item_id in entry["linked"]:
+            self.items[item_id]["popularity"] += delta
+            self._rescore(item_id)
+
+    def load(self, doctors, hospital_data: dict):
+        """Rebuild from scratch: collect every key, then sort once (not one insert each)."""
+        self.items, self._doctors = {}, {}
+        pending = []
+        for doc in doctors:
+            self.upsert_doctor(doc, pending)
+        for info in hospital_data.values():
+            for hospital in info.get("hospitals", []):
+                norm = " ".join(search_tokens(hospital.get("name")))
+                if norm:
+                    self._add_item(f"hospital:{norm}", "hospital", hospital["name"], pending=pending)
+        pending.sort()
+        self._keys = [f"{key}\x00{item_id}" for key, item_id in pending]
+        self._ids = [item_id for _, item_id in pending]
+        self._scores = [self._score(self.items[item_id], key) for key, item_id in pending]
+        self._build_tree()
+        self.loaded_at = time.monotonic()
+
+    def _build_tree(self):
+        # Leaves at [size, size + n), each parent the max of its two children
+        size = 1 << max(len(self._scores) - 1, 0).bit_length()
+        tree = np.full(2 * size, -np.inf)
+        tree[size:size + len(self._scores)] = self._scores
+        level = size
+        while level > 1:
+            tree[level // 2:level] = np.maximum(tree[level:2 * level:2], tree[level + 1:2 * level:2])
+            level //= 2
+        self._tree, self._size = tree, size
+        self.tree_builds += 1
+
+    async def reload(self):
+        doctors = await db.doctors.find(
+            {}, {"_id": 0, "id": 1, "name": 1, "specialty": 1, "conditions": 1, "avg_rating": 1, "review_count": 1}
+        ).to_list(None)
+        self.load(doctors, HOSPITAL_DATA)
+
+    def reload_if_due(self):
+        """Start a background reload once the index is older than TYPEAHEAD_RELOAD_SECONDS,
+        unless one is already running."""
+        if self._reload_task is not None and not self._reload_task.done():
+            return
+        if time.monotonic() - self.loaded_at > TYPEAHEAD_RELOAD_SECONDS:
+            self._reload_task = asyncio.create_task(self._background_reload())
+
+    async def _background_reload(self):
+        try:
+            await self.reload()
+        except Exception as e:
+            logger.warning(f"Typeahead reload failed: {e}")
+
+    async def stop(self):
+        if self._reload_task is not None:
+            self._reload_task.cancel()
+            try:
+                await self._reload_task
+            except asyncio.CancelledError:
+                pass
+            self._reload_task = None
+
+    def search(self, query: str, limit: int = 8, types: Optional[tuple] = None) -> List[dict]:
+        t0 = time.perf_counter()
+        words = search_tokens(query)
+        if len(words) > 1 and words[0] in self.HONORIFICS:
+            words = words[1:]  # 'Dr R' looks for doctors starting with R
+        q = " ".join(words)
+        found = []
+        if q and self._keys:
+            if self._tree is None:
+                self._build_tree()
+            tree, size = self._tree, self._size
+            lo = bisect.bisect_left(self._keys, q) + size
+            hi = bisect.bisect_left(self._keys, q + "\uffff") + size
+            # The nodes exactly covering [lo, hi), best first; expand until `limit` items
+            heap = []
+            while lo < hi:
+                if lo & 1:
+                    heap.append((-tree[lo], lo))
+                    lo += 1
+                if hi & 1:
+                    hi -= 1
+                    heap.append((-tree[hi], hi))
+                lo //= 2
+                hi //= 2
+            heapq.heapify(heap)
+            seen = set()
+            while heap and len(found) < limit:
+                _, node = heapq.heappop(heap)
+                if node < size:
+                    heapq.heappush(heap, (-tree[2 * node], 2 * node))
+                    heapq.heappush(heap, (-tree[2 * node + 1], 2 * node + 1))
+                    continue
+                item_id = self._ids[node - size]
+                item = self.items[item_id]
+                if item_id in seen or (types and item["type"] not in types):
+                    continue
+                seen.add(item_id)
+                found.append({k: item[k] for k in ("type", "label", "id", "rating")})
+        self.lookups += 1
+        self.lookup_seconds += time.perf_counter() - t0
+        return found
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._keys),
+            "items": len(self.items),
+            "doctors": len(self._doctors),
+            "lookups": self.lookups,
+            "avg_lookup_us": round(1e6 * self.lookup_seconds / self.lookups, 1) if self.lookups else None,
+            "tree_builds": self.tree_builds,
+        }
+
+TYPEAHEAD = TypeaheadIndex()
+
+@api_router.get("/typeahead")
+async def typeahead(q: str, limit: int = 8, types: Optional[str] = None):
+    TYPEAHEAD.reload_if_due()
+    wanted = tuple(t for t in (types or "").split(",") if t in TypeaheadIndex.TYPES) or None
+    return {"items": TYPEAHEAD.search(q, min(max(limit, 1), 20), wanted)}
 
 # ============== UPLOADS ==============
 
+class DocumentScanner:
+    """One compiled regex that walks OCR text once and collects doc-type evidence,
+    medicine mentions and lab analytes together.
+
+    Alternatives are tried in order at each word start: lab analytes first (so
+    'Glucose 110 mg/dL' is a lab value, not a 110 mg medicine), then medicines, then
+    the bare evidence terms. Evidence words swallowed by a lab/medicine match
+    ('Syrup ...', 'Hemoglobin 13.5') are picked up by re-scanning that short span.
+    """
+
+    # Checked in this order, mirroring the old cascade of any(...) passes
+    DOC_TYPE_TERMS = {
+        "prescription": ['rx', 'prescription', 'tablet', 'capsule', 'syrup', 'dosage', 'take', 'times a day', 'after food'],
+        "lab_report": ['hemoglobin', 'glucose', 'cholesterol', 'creatinine', 'urea', 'wbc', 'rbc', 'platelet', 'test result', 'lab report'],
+        "xray": ['x-ray', 'xray', 'radiograph', 'chest pa', 'bone scan'],
+        "wound": ['wound', 'injury', 'burn', 'laceration', 'abrasion'],
+        "discharge": ['discharge', 'summary', 'admitted', 'diagnosis', 'treatment given'],
+    }
+    FILENAME_XRAY_TERMS = ['xray', 'x-ray', 'scan']
+
+    # (name alternatives, unit alternatives), one entry per analyte
+    LAB_ANALYTES = [
+        (r'Hemoglobin|Hb|HGB', r'g/dL|gm%'),
+        (r'Glucose|Blood Sugar|FBS|RBS', r'mg/dL'),
+        (r'Total Cholesterol|Cholesterol', r'mg/dL'),
+        (r'Creatinine', r'mg/dL'),
+        (r'WBC|White Blood Cell', r'/cumm|cells'),
+        (r'RBC|Red Blood Cell', r'million'),
+        (r'Platelet|PLT', r'/cumm|lakh'),
+    ]
+    MEDICINE_STOPWORDS = frozenset(['the', 'and', 'for', 'with'])
+    MAX_MEDICINES = 10
+
+    def __init__(self):
+        self.term_doc_type = {}
+        for doc_type, terms in self.DOC_TYPE_TERMS.items():
+            for term in terms:
+                self.term_doc_type.setdefault(term, doc_type)
+        # Longest first so 'x-ray' wins over a shorter prefix at the same position
+        terms = sorted(self.term_doc_type, key=len, reverse=True)
+        evidence = '|'.join(re.escape(t) for t in terms)
+        labs = '|'.join(
+            rf'(?P<lab{i}>{names})\s*[:\-]?\s*(?P<lab{i}_value>[\d.]+)\s*(?P<lab{i}_unit>{units})?'
+            for i, (names, units) in enumerate(self.LAB_ANALYTES)
+        )
+        source = (
+            r'\b(?:'
+            + labs
+            + r'|(?:Tab|Cap|Syrup|Inj)\.?\s+(?P<rx_name>[A-Za-z0-9\-]+(?:\s+\d+\s*mg)?)'
+            + r'|(?P<dose_name>\w+)\s+(?P<dose>\d+\s*mg)'
+            + rf'|(?P<term>{evidence})'
+            + r')'
+        )
+        # re.IGNORECASE roughly doubles the per-position cost, so scan() runs the
+        # lowercase pattern over text.lower() and slices values out of the original text.
+        # The case-insensitive one is kept for the rare text whose length changes when
+        # lowercased (e.g. 'İ').
+        self.evidence = re.compile(rf'\b(?:{evidence})')
+        self.pattern = re.compile(source.lower().replace('(?p<', '(?P<'))
+        self.pattern_ignorecase = re.compile(source, re.IGNORECASE)
+        self._span_doc_types: Dict[str, frozenset] = {}
+
+    def _doc_types_in(self, span: str) -> frozenset:
+        """Evidence terms inside a lab/medicine match, memoized on the lowercased span."""
+        found = self._span_doc_types.get(span)
+        if found is None:
+            found = frozenset(self.term_doc_type[t] for t in self.evidence.findall(span))
+            if len(self._span_doc_types) < 4096:
+                self._span_doc_types[span] = found
+        return found
+
+    def scan(self, text: str, filename: str = "") -> Dict[str, Any]:
+        found, medicines, lab_values, seen = set(), [], [], set()
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            matches = self.pattern.finditer(lowered)
+        else:
+            lowered, matches = None, self.pattern_ignorecase.finditer(text)
+
+        for m in matches:
+            kind = m.lastgroup
+            if kind == "term":
+                found.add(self.term_doc_type[m.group("term").lower()])
+                continue
+            if "prescription" not in found:
+                found.update(self._doc_types_in(m.group().lower() if lowered is None else m.group()))
+            if kind.startswith("lab"):
+                lab = kind.split("_")[0]
+                lab_values.append({"name": text[m.start(lab):m.end(lab)],
+                                   "value": m.group(f"{lab}_value"),
+                                   "unit": text[m.start(f"{lab}_unit"):m.end(f"{lab}_unit")]})
+                continue
+            if len(medicines) >= self.MAX_MEDICINES:
+                continue
+            if m.group("rx_name"):
+                name = text[m.start("rx_name"):m.end("rx_name")]
+            else:
+                name = f'{text[m.start("dose_name"):m.end("dose_name")]} {text[m.start("dose"):m.end("dose")]}'
+            name = name.strip()
+            key = name.lower()
+            if len(name) > 3 and key not in self.MEDICINE_STOPWORDS and key not in seen:
+                seen.add(key)
+                medicines.append({"name": name, "dosage": ""})
+
+        filename_lower = filename.lower()
+        if any(w in filename_lower for w in self.FILENAME_XRAY_TERMS):
+            found.add("filename_xray")
+        for candidate in ("prescription", "lab_report", "xray", "filename_xray", "wound", "discharge"):
+            if candidate in found:
+                return {"doc_type": "xray" if candidate == "filename_xray" else candidate,
+                        "medicines": medicines, "lab_values": lab_values}
+        return {"doc_type": "unknown", "medicines": medicines, "lab_values": lab_values}
+
+DOCUMENT_SCANNER = DocumentScanner()
+
+def analyze_document(text: str, filename: str = "") -> Dict[str, Any]:
+    """Doc type, medicines and lab values from a single pass over the text."""
+    return DOCUMENT_SCANNER.scan(text, filename)
+
 def classify_document(text: str, filename: str = "") -> str:
-    text_lower = text.lower()
-    filename_lower = filename.lower()
-    
-    if any(w in text_lower for w in ['rx', 'prescription', 'tablet', 'capsule', 'syrup', 'dosage', 'take', 'times a day', 'after food']):
-        return "prescription"
-    if any(w in text_lower for w in ['hemoglobin', 'glucose', 'cholesterol', 'creatinine', 'urea', 'wbc', 'rbc', 'platelet', 'test result', 'lab report']):
-        return "lab_report"
-    if any(w in text_lower for w in ['x-ray', 'xray', 'radiograph', 'chest pa', 'bone scan']):
-        return "xray"
-    if any(w in filename_lower for w in ['xray', 'x-ray', 'scan']):
-        return "xray"
-    if any(w in text_lower for w in ['wound', 'injury', 'burn', 'laceration', 'abrasion']):
-        return "wound"
-    if any(w in text_lower for w in ['discharge', 'summary', 'admitted', 'diagnosis', 'treatment given']):
-        return "discharge"
-    return "unknown"
+    return analyze_document(text, filename)["doc_type"]
 
 def extract_medicines(text: str) -> List[Dict]:
-    medicines = []
-    patterns = [
-        r'(?:Tab|Cap|Syrup|Inj)\.?\s+([A-Za-z0-9\-]+(?:\s+\d+\s*mg)?)',
-        r'(\w+)\s+(\d+\s*mg)',
-    ]
-    for pattern in patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        for match in matches:
-            name = match if isinstance(match, str) else ' '.join(match)
-            if len(name) > 3 and name.lower() not in ['the', 'and', 'for', 'with']:
-                medicines.append({"name": name.strip(), "dosage": ""})
-    return medicines[:10]
+    return analyze_document(text)["medicines"]
 
 def extract_lab_values(text: str) -> List[Dict]:
-    values = []
-    patterns = [
-        r'(Hemoglobin|Hb|HGB)\s*[:\-]?\s*([\d.]+)\s*(g/dL|gm%)?',
-        r'(Glucose|Blood Sugar|FBS|RBS)\s*[:\-]?\s*([\d.]+)\s*(mg/dL)?',
-        r'(Cholesterol|Total Cholesterol)\s*[:\-]?\s*([\d.]+)\s*(mg/dL)?',
-        r'(Creatinine)\s*[:\-]?\s*([\d.]+)\s*(mg/dL)?',
-        r'(WBC|White Blood Cell)\s*[:\-]?\s*([\d.]+)\s*(/cumm|cells)?',
-        r'(RBC|Red Blood Cell)\s*[:\-]?\s*([\d.]+)\s*(million)?',
-        r'(Platelet|PLT)\s*[:\-]?\s*([\d.]+)\s*(/cumm|lakh)?',
-    ]
-    for pattern in patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        for match in matches:
-            values.append({"name": match[0], "value": match[1], "unit": match[2] if len(match) > 2 else ""})
-    return values
+    return analyze_document(text)["lab_values"]
 
-@api_router.post("/uploads/file")
+@api_router.post("/uploads/file", dependencies=[rate_limit("upload_file", 10, 60, key="user")])
 async def upload_file(
     file: UploadFile = File(...),
     user: dict = Depends(get_current_user)
@@ -1171,7 +3702,8 @@ async def upload_file(
     import base64
     
     # Classify document (Keep existing for fallback, but trust AI more)
-    doc_type = classify_document(extracted_text, file.filename)
+    analysis = analyze_document(extracted_text, file.filename)
+    doc_type = analysis["doc_type"]
     
     # Prepare image for AI if applicable
     image_url = None
@@ -1245,9 +3777,9 @@ async def upload_file(
         logger.error(f"AI Analysis failed: {e}")
         # Fallback to regex
         if not medicines:
-            medicines = extract_medicines(extracted_text)
+            medicines = analysis["medicines"]
         if not lab_values:
-            lab_values = extract_lab_values(extracted_text)
+            lab_values = analysis["lab_values"]
 
 
     
@@ -1268,18 +3800,21 @@ async def upload_file(
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.uploads.insert_one(upload_doc)
+    forget_count(db.uploads, {"user_id": user["id"]})
     
     # Mark user as having uploads
     await db.users.update_one({"id": user["id"]}, {"$set": {"has_uploads": True}})
+    invalidate_user_cache(user["id"])
     
     return {"data": {k: v for k, v in upload_doc.items() if k not in ["_id", "file_path"]}}
 
 @api_router.post("/uploads/text")
 async def upload_text(data: TextUpload, user: dict = Depends(get_current_user)):
     file_id = str(uuid.uuid4())
-    doc_type = classify_document(data.text)
-    medicines = extract_medicines(data.text) if doc_type == "prescription" else []
-    lab_values = extract_lab_values(data.text) if doc_type == "lab_report" else []
+    analysis = analyze_document(data.text)
+    doc_type = analysis["doc_type"]
+    medicines = analysis["medicines"] if doc_type == "prescription" else []
+    lab_values = analysis["lab_values"] if doc_type == "lab_report" else []
     
     # Generate AI summary
     summary_short = ["Text content uploaded"]
@@ -1316,7 +3851,9 @@ async def upload_text(data: TextUpload, user: dict = Depends(get_current_user)):
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.uploads.insert_one(upload_doc)
+    forget_count(db.uploads, {"user_id": user["id"]})
     await db.users.update_one({"id": user["id"]}, {"$set": {"has_uploads": True}})
+    invalidate_user_cache(user["id"])
     
     return {"data": {k: v for k, v in upload_doc.items() if k != "_id"}}
 
@@ -1338,16 +3875,20 @@ async def upload_link(data: LinkUpload, user: dict = Depends(get_current_user)):
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.uploads.insert_one(upload_doc)
+    forget_count(db.uploads, {"user_id": user["id"]})
     await db.users.update_one({"id": user["id"]}, {"$set": {"has_uploads": True}})
+    invalidate_user_cache(user["id"])
     
     return {"data": {k: v for k, v in upload_doc.items() if k != "_id"}}
 
 @api_router.get("/uploads")
-async def get_uploads(user: dict = Depends(get_current_user), page: int = 1, page_size: int = 20):
-    skip = (page - 1) * page_size
-    uploads = await db.uploads.find({"user_id": user["id"]}, {"_id": 0, "file_path": 0}).sort("created_at", -1).skip(skip).limit(page_size).to_list(page_size)
-    total = await db.uploads.count_documents({"user_id": user["id"]})
-    return {"items": uploads, "total": total, "page": page, "page_size": page_size}
+async def get_uploads(user: dict = Depends(get_current_user), page: int = 1, page_size: int = 20,
+                      cursor: Optional[str] = None):
+    query = {"user_id": user["id"]}
+    page, page_size = max(page, 1), min(max(page_size, 1), 100)
+    uploads, next_cursor = await keyset_page(db.uploads, query, {"_id": 0, "file_path": 0}, RECENT_FIRST, page, page_size, cursor)
+    total = await cached_count(db.uploads, query)
+    return {"items": uploads, "total": total, "page": page, "page_size": page_size, "next_cursor": next_cursor}
 
 @api_router.get("/uploads/{upload_id}")
 async def get_upload(upload_id: str, user: dict = Depends(get_current_user)):
@@ -1361,11 +3902,13 @@ async def delete_upload(upload_id: str, user: dict = Depends(get_current_user)):
     result = await db.uploads.delete_one({"id": upload_id, "user_id": user["id"]})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Upload not found")
+    forget_count(db.uploads, {"user_id": user["id"]})
     
     # Check if user has any remaining uploads
     count = await db.uploads.count_documents({"user_id": user["id"]})
     if count == 0:
         await db.users.update_one({"id": user["id"]}, {"$set": {"has_uploads": False}})
+        invalidate_user_cache(user["id"])
     
     return {"message": "Upload deleted"}
 
@@ -1485,7 +4028,7 @@ MEDICAL_REFUSAL_RESPONSES = {
     "te": "నేను వైద్య, ఆరోగ్య మరియు ఆహార సంబంధిత ప్రశ్నలకు మాత్రమే సహాయం చేయడానికి ఇక్కడ ఉన్నాను 💊. ఆసుపత్రులు, మందులు, వ్యాధులు, లక్షణాలు, ల్యాబ్ నివేదికలు, ఆరోగ్యం, ఆహారం మరియు వ్యాయామం గురించి సమాచారంలో నేను సహాయం చేయగలను. మీరు ఏ ఆరోగ్య అంశం గురించి తెలుసుకోవాలనుకుంటున్నారు? 🏥"
 }
 
-@api_router.post("/chat")
+@api_router.post("/chat", dependencies=[rate_limit("chat", 20, 60, key="user")])
 async def chat(message: ChatMessage, user: dict = Depends(get_current_user)):
     lang = user.get("preferred_language", "en")
     
@@ -1503,6 +4046,7 @@ async def chat(message: ChatMessage, user: dict = Depends(get_current_user)):
             "created_at": datetime.now(timezone.utc).isoformat()
         }
         await db.chat_history.insert_one(chat_doc)
+        forget_count(db.chat_history, {"user_id": user["id"]})
         
         return {"data": {"response": refusal, "is_medical": False}}
     
@@ -1563,6 +4107,7 @@ async def chat(message: ChatMessage, user: dict = Depends(get_current_user)):
             "created_at": datetime.now(timezone.utc).isoformat()
         }
         await db.chat_history.insert_one(chat_doc)
+        forget_count(db.chat_history, {"user_id": user["id"]})
         
         return {"data": {"response": response, "is_medical": True}}
     
@@ -1571,22 +4116,27 @@ async def chat(message: ChatMessage, user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=500, detail="AI service temporarily unavailable")
 
 @api_router.get("/chat/history")
-async def get_chat_history(user: dict = Depends(get_current_user), page: int = 1, page_size: int = 50):
-    skip = (page - 1) * page_size
-    history = await db.chat_history.find({"user_id": user["id"]}, {"_id": 0}).sort("created_at", -1).skip(skip).limit(page_size).to_list(page_size)
-    total = await db.chat_history.count_documents({"user_id": user["id"]})
-    return {"items": list(reversed(history)), "total": total, "page": page, "page_size": page_size}
+async def get_chat_history(user: dict = Depends(get_current_user), page: int = 1, page_size: int = 50,
+                           cursor: Optional[str] = None):
+    query = {"user_id": user["id"]}
+    page, page_size = max(page, 1), min(max(page_size, 1), 200)
+    # Newest first from the index; next_cursor walks further back in time
+    history, next_cursor = await keyset_page(db.chat_history, query, {"_id": 0}, RECENT_FIRST, page, page_size, cursor)
+    total = await cached_count(db.chat_history, query)
+    return {"items": list(reversed(history)), "total": total, "page": page, "page_size": page_size, "next_cursor": next_cursor}
 
 @api_router.delete("/chat/history/{chat_id}")
 async def delete_chat_item(chat_id: str, user: dict = Depends(get_current_user)):
     result = await db.chat_history.delete_one({"id": chat_id, "user_id": user["id"]})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Chat item not found")
+    forget_count(db.chat_history, {"user_id": user["id"]})
     return {"message": "Chat item deleted"}
 
 @api_router.delete("/chat/history")
 async def clear_chat_history(user: dict = Depends(get_current_user)):
     await db.chat_history.delete_many({"user_id": user["id"]})
+    forget_count(db.chat_history, {"user_id": user["id"]})
     return {"message": "Chat history cleared"}
 
 # ============== VOICE ==============
@@ -1643,6 +4193,29 @@ async def text_to_speech(request: TTSRequest):
         logger.error(f"TTS error: {e}")
         raise HTTPException(status_code=500, detail="Text-to-speech failed")
 
+# ============== METRICS ==============
+
+@api_router.get("/metrics")
+async def get_metrics():
+    return {"data": {
+        "user_cache": USER_CACHE.stats(),
+        "password_hasher": PASSWORD_HASHER.stats(),
+        "notification_outbox": NOTIFICATION_OUTBOX.stats(),
+        "google_verifier": GOOGLE_VERIFIER.stats(),
+        "rate_limiter": RATE_LIMITER.stats(),
+        "login_round_trips": LOGIN_ROUND_TRIPS.stats(),
+        "http_clients": HTTP_CLIENTS.stats(),
+        "poi_store": POI_STORE.stats(),
+        "phone_directory": PHONE_DIRECTORY.stats(),
+        "geocode_cache": GEOCODE_CACHE.stats(),
+        "nominatim_scheduler": NOMINATIM_SCHEDULER.stats(),
+        "route_matrix_cache": ROUTE_MATRIX_CACHE.stats(),
+        "route_cache": ROUTE_CACHE.stats(),
+        "count_cache": COUNT_CACHE.stats(),
+        "typeahead": TYPEAHEAD.stats(),
+        "single_flight": {name: flight.stats() for name, flight in SINGLE_FLIGHT.items()},
+    }}
+
 # ============== SEED DATA ==============
 
 @api_router.post("/seed")
@@ -1675,7 +4248,12 @@ async def seed_data():
         {"id": str(uuid.uuid4()), "name": "Dr. Ashok Pillai", "specialty": "General Surgery", "phone": "+91-9876543229", "conditions": ["appendicitis", "hernia", "gallstones"], "avg_rating": 4.8, "review_count": 156, "experience_years": 23, "hospital": "Surgical Care Hospital", "image": "https://images.unsplash.com/photo-1612349317150-e413f6a5b16d?w=200", "lat": 14.459, "lng": 79.997},
     ]
     
+    for doc in doctors:
+        doc.update(doctor_search_fields(doc))
     await db.doctors.insert_many(doctors)
+    DOCTOR_TOKENS.invalidate()
+    for doc in doctors:
+        TYPEAHEAD.upsert_doctor(doc)
     return {"message": "Data seeded successfully", "doctors": len(doctors)}
 
 # Include router and middleware
@@ -1706,6 +4284,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup_indexes():
+    try:
+        await ensure_indexes()
+        # Entries written before expires_at was a datetime are invisible to the TTL index
+        await db.cache.delete_many({"expires_at": {"$not": {"$type": "date"}}})
+    except Exception as e:
+        logger.error(f"Index bootstrap failed: {e}")
+
+@app.on_event("startup")
+async def startup_doctor_backfill():
+    try:
+        updated = await backfill_doctor_search_fields()
+        if updated:
+            logger.info(f"Backfilled search tokens for {updated} doctors")
+        seeded = await backfill_doctor_ratings()
+        if seeded:
+            logger.info(f"Backfilled rating sums for {seeded} doctors")
+    except Exception as e:
+        logger.error(f"Doctor backfill failed: {e}")
+
+@app.on_event("startup")
+async def startup_typeahead():
+    try:
+        await TYPEAHEAD.reload()
+    except Exception as e:
+        logger.error(f"Typeahead index load failed: {e}")
+
+@app.on_event("startup")
+async def startup_notification_worker():
+    NOTIFICATION_OUTBOX.start()
+
+@app.on_event("startup")
+async def startup_http_clients():
+    HTTP_CLIENTS.start()
+
+@app.on_event("startup")
+async def startup_google_keys():
+    # Warm the key cache so the first Google login doesn't pay for the fetch
+    if GOOGLE_CLIENT_ID:
+        GOOGLE_VERIFIER.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await NOTIFICATION_OUTBOX.stop()
+    await GOOGLE_VERIFIER.stop()
+    await TYPEAHEAD.stop()
+    await HTTP_CLIENTS.aclose()
     client.close()
@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Keep the import side-effect free: no query audit logging, no real credentials
+os.environ.setdefault("INDEX_AUDIT", "0")
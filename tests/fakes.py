@@ -0,0 +1,206 @@
+"""Stand-ins for the server's backing services: an in-memory Motor collection (the
+query and update operators the background workers use) and a local HTTP server for
+the outbound integrations."""
+import copy
+import json
+import operator
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import bson
+
+
+OPERATORS = {
+    "$lt": operator.lt,
+    "$lte": operator.le,
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$ne": operator.ne,
+    "$in": lambda value, options: value in options,
+}
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(matches(doc, q) for q in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, q) for q in condition):
+                return False
+        elif isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            for op, operand in condition.items():
+                if op == "$exists":
+                    if (key in doc) != bool(operand):
+                        return False
+                elif op == "$ne":
+                    if doc.get(key) == operand:
+                        return False
+                elif doc.get(key) is None or operand is None:
+                    # Range operators only compare values of the same type
+                    return False
+                elif key not in doc or not OPERATORS[op](doc[key], operand):
+                    return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+
+def apply_update(doc: dict, update: dict):
+    for key, value in update.get("$set", {}).items():
+        doc[key] = value
+    for key in update.get("$unset", {}):
+        doc.pop(key, None)
+    for key, value in update.get("$inc", {}).items():
+        doc[key] = doc.get(key, 0) + value
+
+
+class FakeCursor:
+    def __init__(self, docs, projection=None):
+        self.docs = docs
+        self.projection = projection or {}
+
+    def sort(self, key, direction=1):
+        # Like Mongo: null and missing order below every other value
+        for field, dir_ in reversed(key if isinstance(key, list) else [(key, direction)]):
+            self.docs = sorted(self.docs, key=lambda d: (d.get(field) is not None, d.get(field) if d.get(field) is not None else 0),
+                               reverse=dir_ < 0)
+        return self
+
+    def skip(self, n):
+        self.docs = self.docs[n:]
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    def _project(self, doc):
+        doc = copy.deepcopy(doc)
+        included = [k for k, v in self.projection.items() if v and k != "_id"]
+        if included:
+            doc = {k: doc[k] for k in included + ["_id"] if k in doc}
+        if self.projection.get("_id") == 0:
+            doc.pop("_id", None)
+        return doc
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self.docs:
+            yield self._project(doc)
+
+    async def to_list(self, length):
+        return [self._project(doc) for doc in self.docs[:length]]
+
+
+class FakeCollection:
+    def __init__(self, name="fake"):
+        self.name = name
+        self.docs = []
+
+    async def count_documents(self, query):
+        return len([d for d in self.docs if matches(d, query)])
+
+    async def estimated_document_count(self):
+        return len(self.docs)
+
+    async def insert_one(self, doc):
+        doc.setdefault("_id", bson.ObjectId())
+        self.docs.append(copy.deepcopy(doc))
+
+    def find(self, query=None, projection=None):
+        return FakeCursor([d for d in self.docs if matches(d, query or {})], projection)
+
+    async def find_one(self, query=None, projection=None):
+        found = await self.find(query, projection).to_list(1)
+        return found[0] if found else None
+
+    async def distinct(self, field):
+        values = []
+        for doc in self.docs:
+            value = doc.get(field)
+            for v in value if isinstance(value, list) else [value]:
+                if v is not None and v not in values:
+                    values.append(v)
+        return values
+
+    async def update_one(self, query, update, upsert=False):
+        for doc in self.docs:
+            if matches(doc, query):
+                apply_update(doc, update)
+                return
+        if upsert:
+            doc = {k: v for k, v in query.items() if not k.startswith("$")}
+            apply_update(doc, update)
+            await self.insert_one(doc)
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=False):
+        for doc in self.docs:
+            if matches(doc, query):
+                before = FakeCursor([doc], projection)._project(doc)
+                apply_update(doc, update)
+                return FakeCursor([doc], projection)._project(doc) if return_document else before
+        return None
+
+    async def update_many(self, query, update):
+        for doc in [d for d in self.docs if matches(d, query)]:
+            apply_update(doc, update)
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Local HTTP/1.1 server standing in for an upstream API. `routes` maps a path
+    prefix to a function of the request path returning (status, json body); `delay`
+    holds every response back that many seconds."""
+
+    daemon_threads = True
+
+    def __init__(self, routes):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.routes = routes
+        self.delay = 0.0
+        self.paths = []
+        self.connections = 0
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is observable
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        for prefix, respond in self.server.routes.items():
+            if self.path.startswith(prefix):
+                status, body = respond(self.path)
+                break
+        else:
+            status, body = 404, {"error": "no route"}
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,71 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import server
+from server import DoctorTokens
+
+from tests.fakes import FakeCollection
+
+
+@pytest.fixture
+def doctors(monkeypatch):
+    collection = FakeCollection()
+    for conditions, specialty in [
+        (["chest pain", "heart disease"], "Cardiology"),
+        (["heart failure"], "Cardiothoracic Surgery"),
+        (["tooth pain", "painful gums"], "Dentistry"),
+    ]:
+        collection.docs.append(server.doctor_search_fields({"conditions": conditions, "specialty": specialty}))
+    monkeypatch.setattr(server, "db", SimpleNamespace(doctors=collection))
+    monkeypatch.setattr(server, "DOCTOR_TOKENS", DoctorTokens(reload_seconds=300))
+    return collection
+
+
+def query(condition=None, specialty=None):
+    return asyncio.run(server.doctor_query(condition, specialty))
+
+
+def test_words_become_equality_on_the_whole_tokens_they_start(doctors):
+    assert query(specialty="cardio") == {"specialty_tokens": {"$in": ["cardiology", "cardiothoracic"]}}
+    assert query(condition="Chest PAIN") == {"$and": [
+        {"condition_tokens": {"$in": ["chest"]}},
+        {"condition_tokens": {"$in": ["pain", "painful"]}},
+    ]}
+
+
+def test_condition_and_specialty_combine(doctors):
+    assert query("heart", "cardiology") == {"$and": [
+        {"condition_tokens": {"$in": ["heart"]}},
+        {"specialty_tokens": {"$in": ["cardiology"]}},
+    ]}
+    assert query() == {}
+
+
+def test_unknown_word_matches_nothing(doctors):
+    assert query(condition="migraine") == {"condition_tokens": {"$in": []}}
+
+
+def test_too_many_terms_fall_back_to_a_prefix_regex(doctors, monkeypatch):
+    monkeypatch.setattr(DoctorTokens, "MAX_TERMS", 1)
+    assert query(condition="p") == {"condition_tokens": {"$regex": "^p"}}
+
+
+def test_vocabulary_is_cached_until_invalidated(doctors):
+    assert query(condition="migraine") == {"condition_tokens": {"$in": []}}
+    doctors.docs.append(server.doctor_search_fields({"conditions": ["migraine"], "specialty": "Neurology"}))
+    assert query(condition="migraine") == {"condition_tokens": {"$in": []}}
+    server.DOCTOR_TOKENS.invalidate()
+    assert query(condition="migraine") == {"condition_tokens": {"$in": ["migraine"]}}
+
+
+def test_distance_sort_rejects_bad_radius_and_cursors():
+    from fastapi.testclient import TestClient
+
+    client = TestClient(server.app)
+    near = {"sort": "distance", "lat": 14.44, "lng": 79.98}
+    for radius_km in (0, -5):
+        assert client.get("/api/doctors", params={**near, "radius_km": radius_km}).status_code == 422
+    resp = client.get("/api/doctors", params={**near, "cursor": "abc"})
+    assert resp.status_code == 400 and "sort=distance" in resp.json()["detail"]
@@ -0,0 +1,59 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import server
+
+from tests.fakes import FakeCollection
+
+
+@pytest.fixture
+def doctors(monkeypatch):
+    collection = FakeCollection()
+    collection.docs = [
+        # Reviewed before running sums existed
+        {"id": "reviewed", "avg_rating": 4.0, "review_count": 2},
+        # Never reviewed, seeded rating only
+        {"id": "seeded", "avg_rating": 4.5, "review_count": 120},
+        # Already on running sums
+        {"id": "current", "rating_star_sum": 9, "rating_accuracy_sum": 16, "rating_count": 2,
+         "avg_rating": 4.5, "avg_accuracy": 8.0, "review_count": 2},
+    ]
+    feedback = [{"doctor_id": "reviewed", "stars": 5, "accuracy": 9},
+                {"doctor_id": "reviewed", "stars": 3, "accuracy": 7}]
+
+    async def rebuild(doctor_ids=None):
+        # What the $group/$merge pipeline leaves behind
+        for doc in collection.docs:
+            rows = [f for f in feedback if f["doctor_id"] == doc["id"] and (doctor_ids is None or doc["id"] in doctor_ids)]
+            if rows:
+                sums = sum(f["stars"] for f in rows), sum(f["accuracy"] for f in rows), len(rows)
+                doc.update(rating_star_sum=sums[0], rating_accuracy_sum=sums[1], rating_count=sums[2],
+                           **server.rating_averages(*sums))
+
+    monkeypatch.setattr(server, "db", SimpleNamespace(doctors=collection))
+    monkeypatch.setattr(server, "rebuild_doctor_ratings", rebuild)
+    return {doc["id"]: doc for doc in collection.docs}
+
+
+def test_backfill_seeds_sums_once_from_existing_feedback(doctors):
+    assert asyncio.run(server.backfill_doctor_ratings(batch_size=1)) == 2
+    assert asyncio.run(server.backfill_doctor_ratings()) == 0
+
+    assert (doctors["reviewed"]["rating_star_sum"], doctors["reviewed"]["rating_count"]) == (8, 2)
+    assert (doctors["seeded"]["rating_star_sum"], doctors["seeded"]["rating_count"]) == (0, 0)
+    assert doctors["seeded"]["avg_rating"] == 4.5
+    assert doctors["current"]["rating_star_sum"] == 9
+
+
+def test_first_review_after_backfill_keeps_the_earlier_ones(doctors):
+    async def main():
+        await server.backfill_doctor_ratings()
+        await server.record_doctor_rating("reviewed", 1, 5)
+
+    asyncio.run(main())
+    # (5 + 3 + 1) / 3, not just the new review
+    assert doctors["reviewed"]["avg_rating"] == 3.0
+    assert doctors["reviewed"]["review_count"] == 3
+    assert doctors["reviewed"]["avg_accuracy"] == 7.0
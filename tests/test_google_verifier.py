@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+from server import GoogleTokenVerifier
+
+CLIENT_ID = "client-123.apps.googleusercontent.com"
+CERTS_URL = "https://certs.test/oauth2/v3/certs"
+
+
+def make_key(kid):
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = {**RSAAlgorithm.to_jwk(private.public_key(), as_dict=True), "kid": kid, "alg": "RS256", "use": "sig"}
+    return private, jwk
+
+
+class JwksEndpoint:
+    """Stub of Google's certs endpoint that serves whichever keys are currently published."""
+
+    def __init__(self, *jwks, max_age=3600):
+        self.jwks = list(jwks)
+        self.max_age = max_age
+        self.requests = 0
+
+    def __call__(self, request):
+        assert str(request.url) == CERTS_URL
+        self.requests += 1
+        return httpx.Response(200, json={"keys": self.jwks},
+                              headers={"Cache-Control": f"public, max-age={self.max_age}"})
+
+
+def sign(private, kid, **claims):
+    now = int(time.time())
+    payload = {"iss": "https://accounts.google.com", "aud": CLIENT_ID, "sub": "42",
+               "email": "a@example.com", "iat": now, "exp": now + 600, **claims}
+    return jwt.encode(payload, private, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture(scope="module")
+def keys():
+    return make_key("k1"), make_key("k2")
+
+
+def verifier_for(endpoint):
+    http = httpx.AsyncClient(transport=httpx.MockTransport(endpoint))
+    return GoogleTokenVerifier(CERTS_URL, CLIENT_ID, http_client=http)
+
+
+def test_cached_keys_serve_repeat_logins_without_refetching(keys):
+    (private, jwk), _ = keys
+    endpoint = JwksEndpoint(jwk)
+    verifier = verifier_for(endpoint)
+
+    async def main():
+        for _ in range(3):
+            claims = await verifier.verify(sign(private, "k1"))
+            assert claims["email"] == "a@example.com"
+
+    asyncio.run(main())
+    assert endpoint.requests == 1
+    assert verifier.stats()["verified"] == 3
+
+
+def test_unknown_key_id_triggers_a_refetch(keys, monkeypatch):
+    (private1, jwk1), (private2, jwk2) = keys
+    endpoint = JwksEndpoint(jwk1)
+    verifier = verifier_for(endpoint)
+    monkeypatch.setattr(GoogleTokenVerifier, "MIN_REFETCH_SECONDS", 0)
+
+    async def main():
+        await verifier.verify(sign(private1, "k1"))
+        # Google rotates in a new key before our copy's max-age runs out
+        endpoint.jwks.append(jwk2)
+        claims = await verifier.verify(sign(private2, "k2"))
+        assert claims["sub"] == "42"
+        with pytest.raises(jwt.InvalidTokenError):
+            await verifier.verify(sign(private2, "k3"))
+
+    asyncio.run(main())
+    assert endpoint.requests == 3
+
+
+def test_unknown_key_ids_cannot_force_refetches_faster_than_the_floor(keys):
+    (private, jwk), _ = keys
+    endpoint = JwksEndpoint(jwk)
+    verifier = verifier_for(endpoint)
+
+    async def main():
+        await verifier.verify(sign(private, "k1"))
+        for _ in range(5):
+            with pytest.raises(jwt.InvalidTokenError):
+                await verifier.verify(sign(private, "nope"))
+
+    asyncio.run(main())
+    assert endpoint.requests == 1
+
+
+@pytest.mark.parametrize("claims, error", [
+    ({"aud": "someone-else.apps.googleusercontent.com"}, jwt.InvalidAudienceError),
+    ({"iss": "https://evil.example.com"}, jwt.InvalidIssuerError),
+])
+def test_rejects_wrong_audience_and_issuer(keys, claims, error):
+    (private, jwk), _ = keys
+    verifier = verifier_for(JwksEndpoint(jwk))
+    with pytest.raises(error):
+        asyncio.run(verifier.verify(sign(private, "k1", **claims)))
+
+
+def test_background_refresh_task_is_held_and_stoppable(keys):
+    (_, jwk), _ = keys
+    endpoint = JwksEndpoint(jwk)
+    verifier = verifier_for(endpoint)
+
+    async def main():
+        verifier.start()
+        task = verifier._background
+        verifier.start()  # already running: no second task
+        assert verifier._background is task
+        await task
+        assert endpoint.requests == 1
+        verifier.start()
+        await verifier.stop()
+        assert verifier._background is None
+
+    asyncio.run(main())
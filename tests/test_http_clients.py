@@ -0,0 +1,79 @@
+import asyncio
+
+import httpx
+import pytest
+
+from server import HttpClients
+
+from tests.fakes import StandInServer
+
+
+def clients_for(stand_in, timeout=2.0):
+    return HttpClients({"osrm": {"base_url": stand_in.base_url, "timeout": timeout, "max_connections": 4}})
+
+
+def test_sequential_requests_reuse_one_pooled_connection():
+    with StandInServer({"/ping": lambda path: (200, {"ok": True})}) as stand_in:
+        clients = clients_for(stand_in)
+
+        async def main():
+            for _ in range(5):
+                resp = await clients.get("osrm").get("/ping")
+                assert resp.json() == {"ok": True}
+            # The same client object is handed out every time
+            assert clients.get("osrm") is clients.get("osrm")
+            await clients.aclose()
+
+        asyncio.run(main())
+
+    stats = clients.stats()["osrm"]
+    assert stats["requests"] == 5
+    assert stats["new_connections"] == 1
+    assert stats["reused_connections"] == 4
+    assert stand_in.connections == 1
+
+
+def test_slow_upstream_hits_the_integration_timeout():
+    with StandInServer({"/slow": lambda path: (200, {})}) as stand_in:
+        stand_in.delay = 1.0
+        clients = clients_for(stand_in, timeout=0.2)
+
+        async def main():
+            try:
+                with pytest.raises(httpx.ReadTimeout):
+                    await clients.get("osrm").get("/slow")
+            finally:
+                await clients.aclose()
+
+        asyncio.run(main())
+
+
+def test_timeout_can_be_overridden_per_integration(monkeypatch):
+    monkeypatch.setenv("OSRM_TIMEOUT_SECONDS", "0.2")
+    with StandInServer({"/slow": lambda path: (200, {})}) as stand_in:
+        stand_in.delay = 1.0
+        clients = clients_for(stand_in, timeout=30)
+
+        async def main():
+            try:
+                with pytest.raises(httpx.ReadTimeout):
+                    await clients.get("osrm").get("/slow")
+            finally:
+                await clients.aclose()
+
+        asyncio.run(main())
+
+
+def test_registered_clients_are_left_open_on_aclose():
+    clients = HttpClients({"osrm": {"base_url": "http://unused", "timeout": 1, "max_connections": 1}})
+
+    async def main():
+        injected = httpx.AsyncClient()
+        clients.register("osrm", injected)
+        assert clients.get("osrm") is injected
+        await clients.aclose()
+        assert not injected.is_closed
+        await injected.aclose()
+
+    asyncio.run(main())
+
@@ -0,0 +1,66 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import server
+from import_pois import import_file
+
+from tests.fakes import FakeCollection
+
+
+class RecordingStore:
+    precision = 5
+
+    def __init__(self):
+        self.saved = []
+        self.marked = {}
+
+    async def save_places(self, places, fetched_at, source):
+        self.saved.extend(places)
+
+    async def mark_regions(self, place_type, counts, refreshed_at):
+        self.marked.setdefault(place_type, {}).update(counts)
+
+
+def feature(osm_id, amenity, lat, lng):
+    return {"type": "Feature", "id": f"node/{osm_id}",
+            "properties": {"amenity": amenity, "name": f"Place {osm_id}"},
+            "geometry": {"type": "Point", "coordinates": [lng, lat]}}
+
+
+def run_import(tmp_path, monkeypatch, features):
+    monkeypatch.setattr(server, "db", SimpleNamespace(poi_imports=FakeCollection()))
+    path = tmp_path / "extract.geojsonl"
+    path.write_text("\n".join(json.dumps(f) for f in features))
+    store = RecordingStore()
+    summary = asyncio.run(import_file(path, store))
+    return store, summary
+
+
+def test_only_types_present_in_the_file_are_marked(tmp_path, monkeypatch):
+    store, summary = run_import(tmp_path, monkeypatch, [
+        feature(1, "pharmacy", 14.44, 79.98),
+        feature(2, "pharmacy", 14.50, 80.05),
+    ])
+
+    assert summary["rows"] == 2 and len(store.saved) == 2
+    assert set(store.marked) == {"pharmacy"}
+    # Tiles in the file's extent without a pharmacy are known-empty; the others hold theirs
+    counts = store.marked["pharmacy"]
+    assert sum(counts.values()) == 2 and 0 in counts.values()
+
+
+def test_each_present_type_is_marked_over_the_same_extent(tmp_path, monkeypatch):
+    store, _ = run_import(tmp_path, monkeypatch, [
+        feature(1, "hospital", 14.44, 79.98),
+        feature(2, "clinic", 14.50, 80.05),
+    ])
+
+    assert set(store.marked) == {"hospital", "clinic"}
+    assert store.marked["hospital"].keys() == store.marked["clinic"].keys()
+
+
+def test_file_without_facilities_marks_nothing(tmp_path, monkeypatch):
+    store, summary = run_import(tmp_path, monkeypatch, [feature(1, "school", 14.44, 79.98)])
+    assert summary["rows"] == 0
+    assert store.marked == {}
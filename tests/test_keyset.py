@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING
+
+import server
+from server import decode_cursor, encode_cursor, keyset_page
+
+from tests.fakes import FakeCollection
+
+MISSING = object()
+
+
+def mongo_sorted(docs, sort):
+    docs = list(docs)
+    for field, direction in reversed(sort):
+        docs.sort(key=lambda d: (d.get(field) is not None, d.get(field) if d.get(field) is not None else 0),
+                  reverse=direction == DESCENDING)
+    return [d["id"] for d in docs]
+
+
+@pytest.fixture
+def collection():
+    collection = FakeCollection("doctors")
+    ratings = [4.5, None, 3.0, 4.5, MISSING, 3.0, None, 4.5, MISSING, 3.0, 4.5, None]
+    names = ["B", "A", None, "B", "A", MISSING, "C", None, "A", "B", MISSING, "C"]
+    for i, (rating, name) in enumerate(zip(ratings, names)):
+        doc = {"id": f"d{i:02d}"}
+        if rating is not MISSING:
+            doc["avg_rating"] = rating
+        if name is not MISSING:
+            doc["name"] = name
+        collection.docs.append(doc)
+    return collection
+
+
+@pytest.mark.parametrize("sort", [
+    [("avg_rating", DESCENDING), ("id", ASCENDING)],
+    [("name", ASCENDING), ("id", ASCENDING)],
+    [("avg_rating", ASCENDING), ("name", DESCENDING), ("id", DESCENDING)],
+])
+@pytest.mark.parametrize("page_size", [1, 2, 5])
+def test_walking_every_cursor_matches_one_full_sort(collection, sort, page_size):
+    async def walk():
+        seen, cursor = [], None
+        while True:
+            items, cursor = await keyset_page(collection, {}, {"_id": 0}, sort, 1, page_size, cursor)
+            seen += [item["id"] for item in items]
+            if cursor is None:
+                return seen
+
+    assert asyncio.run(walk()) == mongo_sorted(collection.docs, sort)
+
+
+@pytest.mark.parametrize("values", [
+    [{"$ne": None}, "d01"],
+    [4.5, ["d01"]],
+    {"avg_rating": 4.5},
+])
+def test_cursors_carrying_anything_but_plain_values_are_rejected(values):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(encode_cursor(values))
+    assert exc.value.status_code == 400
+
+
+def test_cached_counts_hold_until_forgotten(collection, monkeypatch):
+    monkeypatch.setattr(server, "COUNT_CACHE", server.TTLCache(max_size=10, ttl=60))
+    rated = {"avg_rating": 4.5}
+
+    async def main():
+        before = await server.cached_count(collection, rated), await server.cached_count(collection, {})
+        collection.docs.append({"id": "d99", "avg_rating": 4.5})
+        cached = await server.cached_count(collection, rated)
+        server.forget_count(collection, rated)
+        return before, cached, await server.cached_count(collection, rated), await server.cached_count(collection, {})
+
+    before, cached, after, unfiltered = asyncio.run(main())
+    assert before == (4, 12)
+    assert cached == 4 and after == 5
+    # Only the forgotten query is recounted
+    assert unfiltered == 12
@@ -0,0 +1,64 @@
+import asyncio
+import contextvars
+from types import SimpleNamespace
+
+from starlette.requests import Request
+
+import server
+from server import LoginRoundTrips
+
+
+def send(listener, name):
+    """What Motor does: run the pymongo call on a thread with a copy of the caller's context."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    event = SimpleNamespace(command_name=name)
+    return loop.run_in_executor(None, context.run, listener.started, event)
+
+
+def test_counts_commands_sent_inside_the_flow_only():
+    listener = LoginRoundTrips()
+
+    @listener.tracked("password")
+    async def login():
+        await send(listener, "find")
+        await asyncio.gather(send(listener, "update"), send(listener, "update"))
+        return "ok"
+
+    async def main():
+        await send(listener, "find")  # outside any flow
+        assert await login() == "ok"
+        assert await login() == "ok"
+
+    asyncio.run(main())
+    assert listener.stats() == {"password": {"logins": 2, "round_trips": 6, "avg_round_trips": 3.0}}
+
+
+def test_failed_flows_are_not_recorded():
+    listener = LoginRoundTrips()
+
+    @listener.tracked("otp")
+    async def verify():
+        await send(listener, "findAndModify")
+        raise ValueError("bad code")
+
+    async def main():
+        try:
+            await verify()
+        except ValueError:
+            pass
+
+    asyncio.run(main())
+    assert listener.stats() == {}
+
+
+def request_with(headers):
+    raw = [(k.lower().encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "headers": raw})
+
+
+def test_device_id_accepts_short_opaque_ids_only():
+    assert server.device_id_from(request_with({"X-Device-Id": "ios-3F2A.9c:1"})) == "ios-3F2A.9c:1"
+    for bad in ["", "x" * 65, "has space", "{\"$gt\": \"\"}"]:
+        assert server.device_id_from(request_with({"X-Device-Id": bad})) == server.DEFAULT_DEVICE_ID
+    assert server.device_id_from(request_with({})) == server.DEFAULT_DEVICE_ID
@@ -0,0 +1,19 @@
+import pytest
+
+from server import is_medical_query
+
+
+@pytest.mark.parametrize("text", [
+    "painful knee", "stomachache", "toothache", "backache", "I feel feverish",
+    "vaccinated?", "allergic reaction", "vomited", "I have a fever", "side effects of this",
+    "need an x-ray", "headaches every morning", "नमस्ते, मुझे बुखार है", "నాకు జ్వరంతో బాధగా ఉంది",
+])
+def test_accepts_health_questions(text):
+    assert is_medical_query(text)
+
+
+@pytest.mark.parametrize("text", [
+    "what a great act", "the weather was nice", "clear the browser cache", "tell me a joke",
+])
+def test_rejects_words_that_only_contain_a_keyword(text):
+    assert not is_medical_query(text)
@@ -0,0 +1,76 @@
+import asyncio
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+import server
+from server import HttpClients, RequestScheduler, SingleFlight
+
+from tests.fakes import StandInServer
+
+
+class DictCache:
+    """In-process stand-in for GEOCODE_CACHE."""
+
+    def __init__(self):
+        self.entries = {}
+
+    async def get(self, key):
+        return self.entries.get(key)
+
+    async def set(self, key, value, ttl=None):
+        self.entries[key] = value
+
+
+def search(path):
+    q = parse_qs(urlsplit(path).query)["q"][0]
+    return 200, [{"lat": "14.44", "lon": "79.98", "display_name": q}]
+
+
+@pytest.fixture
+def nominatim(monkeypatch):
+    with StandInServer({"/search": search}) as stand_in:
+        clients = HttpClients({"nominatim": {"base_url": stand_in.base_url, "timeout": 2, "max_connections": 2}})
+        monkeypatch.setattr(server, "HTTP_CLIENTS", clients)
+        monkeypatch.setattr(server, "GEOCODE_CACHE", DictCache())
+        monkeypatch.setattr(server, "NOMINATIM_SCHEDULER", RequestScheduler(min_interval=0, max_wait=1))
+        yield stand_in
+
+
+def test_search_sends_the_users_text_and_caches_under_the_normalized_key(nominatim):
+    async def main():
+        first = await server.nominatim_search("  St. Joseph's,   12-3-45 ")
+        second = await server.nominatim_search("st joseph's 12 3 45")
+        await server.HTTP_CLIENTS.aclose()
+        return first, second
+
+    first, second = asyncio.run(main())
+    # Separators reach Nominatim; only runs of whitespace are collapsed
+    assert first[0]["display_name"] == "St. Joseph's, 12-3-45"
+    assert second == first
+    assert len(nominatim.paths) == 1
+
+
+def test_nominatim_followers_outwait_the_queue_and_the_request():
+    flight = server.SINGLE_FLIGHT["nominatim"]
+    assert flight.follower_timeout >= server.NOMINATIM_MAX_WAIT_SECONDS + server.HTTP_INTEGRATIONS["nominatim"]["timeout"]
+
+    # A leader that queues behind the rate limit and then waits on the upstream still
+    # serves followers whose timeout covers both
+    scheduler = RequestScheduler(min_interval=0.2, max_wait=0.5)
+    flight = SingleFlight(follower_timeout=0.5 + 0.2)
+    calls = []
+
+    async def call():
+        await scheduler.turn()
+        calls.append(1)
+        await asyncio.sleep(0.15)  # the request itself
+        return "Nellore"
+
+    async def main():
+        await scheduler.turn()  # someone else holds the current slot
+        return await asyncio.gather(*(flight.do("search", call) for _ in range(4)))
+
+    assert asyncio.run(main()) == ["Nellore"] * 4
+    assert calls == [1]
+    assert flight.stats()["follower_timeouts"] == 0
@@ -0,0 +1,161 @@
+import asyncio
+import socketserver
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from server import NotificationOutbox, NotificationService
+
+from tests.fakes import FakeCollection
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    """Minimal SMTP server that records delivered messages, or refuses every recipient."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SmtpSinkHandler)
+        self.messages = []
+        self.refuse = False
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class SmtpSinkHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 sink ready")
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            verb = line.split(" ", 1)[0].upper()
+            if not line or verb == "QUIT":
+                self.reply("221 bye")
+                return
+            if verb == "RCPT":
+                if self.server.refuse:
+                    self.reply("550 mailbox unavailable")
+                    continue
+                recipients.append(line)
+                self.reply("250 ok")
+            elif verb == "DATA":
+                self.reply("354 end with .")
+                data = []
+                while (chunk := self.rfile.readline()) not in (b".\r\n", b""):
+                    data.append(chunk.decode())
+                self.server.messages.append({"rcpt": recipients, "data": "".join(data)})
+                recipients = []
+                self.reply("250 queued")
+            else:
+                self.reply("250 ok")
+
+
+@pytest.fixture
+def smtp_sink(monkeypatch):
+    sink = SmtpSink()
+    thread = threading.Thread(target=sink.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("SMTP_HOST", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", str(sink.port))
+    monkeypatch.setenv("SMTP_STARTTLS", "false")
+    monkeypatch.delenv("SMTP_USER", raising=False)
+    yield sink
+    NotificationService.smtp.close()
+    sink.shutdown()
+    sink.server_close()
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def enqueue_email(outbox, body="Your password reset code is: 123456"):
+    return await outbox.enqueue("email", "user@example.com", body, subject="Reset")
+
+
+def test_enqueue_stores_a_pending_message_due_now():
+    outbox = NotificationOutbox(FakeCollection())
+    message_id = run(enqueue_email(outbox))
+
+    [doc] = outbox.collection.docs
+    assert doc["id"] == message_id
+    assert doc["status"] == "pending" and doc["attempts"] == 0
+    assert doc["next_attempt_at"] <= datetime.now(timezone.utc)
+    assert outbox.stats()["enqueued"] == 1
+
+
+def test_claimed_batch_is_leased_and_reclaimed_once_the_lease_runs_out():
+    outbox = NotificationOutbox(FakeCollection())
+    run(enqueue_email(outbox))
+
+    [first] = run(outbox._claim_batch())
+    assert first["status"] == "sending"
+    # Leased to the first worker: nobody else can claim it
+    assert run(outbox._claim_batch()) == []
+
+    # That worker died; once the lease expires another one takes over
+    outbox.collection.docs[0]["lease_until"] = datetime.now(timezone.utc) - timedelta(seconds=1)
+    [second] = run(outbox._claim_batch())
+    assert second["id"] == first["id"]
+    assert second["claim_token"] != first["claim_token"]
+
+
+def test_delivers_through_smtp_and_drops_the_body(smtp_sink):
+    outbox = NotificationOutbox(FakeCollection())
+    run(enqueue_email(outbox))
+
+    assert run(outbox.run_once()) == 1
+
+    [delivered] = smtp_sink.messages
+    assert "123456" in delivered["data"]
+    [doc] = outbox.collection.docs
+    assert doc["status"] == "sent" and doc["attempts"] == 1
+    assert "body" not in doc and "claim_token" not in doc
+    assert doc["purge_at"] > datetime.now(timezone.utc)
+
+
+def test_failed_delivery_backs_off_exponentially(smtp_sink, monkeypatch):
+    monkeypatch.setattr(server, "OUTBOX_RETRY_BASE_SECONDS", 10)
+    smtp_sink.refuse = True
+    outbox = NotificationOutbox(FakeCollection())
+    run(enqueue_email(outbox))
+    doc = outbox.collection.docs[0]
+
+    for attempt, base_delay in [(1, 10), (2, 20), (3, 40)]:
+        before = datetime.now(timezone.utc)
+        doc["next_attempt_at"] = before  # due again
+        assert run(outbox.run_once()) == 1
+        assert doc["status"] == "pending" and doc["attempts"] == attempt
+        assert "mailbox unavailable" in doc["last_error"]
+        delay = (doc["next_attempt_at"] - before).total_seconds()
+        assert 0.8 * base_delay - 1 <= delay <= 1.2 * base_delay + 1
+
+    # Not due yet: the worker leaves it alone
+    assert run(outbox.run_once()) == 0
+    assert outbox.stats()["retried"] == 3
+
+
+def test_gives_up_after_max_attempts_into_the_dead_letter_state(smtp_sink, monkeypatch):
+    monkeypatch.setattr(server, "OUTBOX_MAX_ATTEMPTS", 2)
+    smtp_sink.refuse = True
+    outbox = NotificationOutbox(FakeCollection())
+    run(enqueue_email(outbox))
+    doc = outbox.collection.docs[0]
+
+    run(outbox.run_once())
+    doc["next_attempt_at"] = datetime.now(timezone.utc)
+    run(outbox.run_once())
+
+    assert doc["status"] == "failed" and doc["attempts"] == 2
+    assert "body" not in doc
+    assert outbox.stats()["failed"] == 1
+    assert run(outbox.run_once()) == 0
+    assert smtp_sink.messages == []
@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import server
+from server import PoiStore
+
+from tests.fakes import matches
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self.docs:
+            yield dict(doc)
+
+    async def to_list(self, length):
+        return [dict(doc) for doc in self.docs[:length]]
+
+
+class Regions:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        keys = set(query["key"]["$in"])
+        return Cursor([d for d in self.docs if d["key"] in keys])
+
+
+class Pois:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def aggregate(self, pipeline):
+        query = pipeline[0]["$geoNear"]["query"]
+        return Cursor([d for d in self.docs if matches(d, query)])
+
+    async def count_documents(self, query):
+        query = {k: v for k, v in query.items() if k != "location"}
+        return len([d for d in self.docs if matches(d, query)])
+
+
+def wide_store(regions, pois):
+    store = PoiStore(Pois(pois), Regions(regions), precision=5, refresh_seconds=3600, max_tiles=100)
+    store.scheduled = []
+    store.schedule_refresh = lambda place_type, tiles: store.scheduled.append(tiles)
+    return store
+
+
+LAT, LNG, RADIUS = 14.44, 79.98, 50000
+
+
+def test_wide_search_in_unseeded_area_is_incomplete_and_queues_a_refresh():
+    store = wide_store([], [])
+    tiles = server.geohash_cover(LAT, LNG, RADIUS, 5)
+    assert len(tiles) > server.NEARBY_MAX_TILES
+
+    items, total, complete, as_of = asyncio.run(store.nearby("hospital", LAT, LNG, RADIUS, 20))
+
+    assert (items, total, complete, as_of) == ([], 0, False, None)
+    assert len(store.scheduled) == 1
+    queued = store.scheduled[0]
+    assert sorted(queued) == sorted(tiles)
+    # Nearest tiles are fetched first
+    assert queued[0] == server.geohash_encode(LAT, LNG, 5)
+
+
+def test_wide_search_over_known_tiles_is_complete_and_refreshes_only_stale_ones():
+    now = datetime.now(timezone.utc)
+    tiles = server.geohash_cover(LAT, LNG, RADIUS, 5)
+    regions = [{"key": PoiStore.region_key("hospital", t), "tile": t, "refreshed_at": now} for t in tiles]
+    regions[0]["refreshed_at"] = now - timedelta(hours=2)
+    place = {"id": "1", "name": "A", "type": "hospital", "lat": LAT, "lng": LNG,
+             "address": "", "phone": "", "distance": 0.0, "fetched_at": now}
+    store = wide_store(regions, [place])
+
+    items, total, complete, as_of = asyncio.run(store.nearby("hospital", LAT, LNG, RADIUS, 20))
+
+    assert complete and total == 1 and items[0]["id"] == "1"
+    assert store.scheduled == [[tiles[0]]]
+
+
+def test_nearest_cover_matches_the_full_cover_and_is_capped():
+    full = server.geohash_cover(LAT, LNG, RADIUS, 5)
+    assert server.geohash_cover_size(LAT, LNG, RADIUS, 5) == len(full)
+    assert sorted(server.geohash_cover_nearest(LAT, LNG, RADIUS, 5, len(full))) == sorted(full)
+
+    nearest = server.geohash_cover_nearest(LAT, LNG, RADIUS, 5, 9)
+    assert nearest[0] == server.geohash_encode(LAT, LNG, 5)
+    # The first ring is the centre cell's eight neighbours
+    s, w, n, e = server.geohash_bbox(nearest[0])
+    neighbours = {server.geohash_encode((s + n) / 2 + di * (n - s), (w + e) / 2 + dj * (e - w), 5)
+                  for di in (-1, 0, 1) for dj in (-1, 0, 1)}
+    assert set(nearest) == neighbours
+
+
+def test_very_wide_search_checks_only_a_capped_ring_of_tiles(monkeypatch):
+    monkeypatch.setattr(server, "NEARBY_MAX_REFRESH_TILES", 50)
+    store = wide_store([], [])
+    radius = 1_000_000
+    assert server.geohash_cover_size(LAT, LNG, radius, 5) > 100_000
+
+    items, total, complete, as_of = asyncio.run(store.nearby("hospital", LAT, LNG, radius, 20))
+
+    assert not complete
+    [queued] = store.scheduled
+    assert len(queued) == 50 and queued[0] == server.geohash_encode(LAT, LNG, 5)
+
+
+def test_wide_search_never_answers_from_places_past_the_staleness_bound():
+    now = datetime.now(timezone.utc)
+    tiles = server.geohash_cover(LAT, LNG, RADIUS, 5)
+    regions = [{"key": PoiStore.region_key("hospital", t), "tile": t, "refreshed_at": now} for t in tiles]
+    place = {"name": "A", "type": "hospital", "lat": LAT, "lng": LNG, "address": "", "phone": "", "distance": 0.0}
+    too_old = now - timedelta(seconds=server.POI_MAX_STALE_SECONDS + 60)
+    store = wide_store(regions, [{**place, "id": "old", "fetched_at": too_old},
+                                 {**place, "id": "new", "fetched_at": now}])
+
+    items, total, complete, as_of = asyncio.run(store.nearby("hospital", LAT, LNG, RADIUS, 20))
+
+    assert [item["id"] for item in items] == ["new"] and total == 1
@@ -0,0 +1,52 @@
+import asyncio
+
+import server
+from server import MemoryRateLimitBackend
+
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def hit(backend, clock, monkeypatch, at, limit, window, key="k"):
+    clock.now = at
+    monkeypatch.setattr(server.time, "time", clock)
+    return asyncio.run(backend.hit(key, limit, window))
+
+
+def test_one_per_minute_refuses_second_hit_across_window_boundary(monkeypatch):
+    backend, clock = MemoryRateLimitBackend(100), FakeClock(0)
+    base = 600 * 60  # an exact multiple of the window
+    assert hit(backend, clock, monkeypatch, base + 59, 1, 60) == 0
+    retry_after = hit(backend, clock, monkeypatch, base + 61, 1, 60)
+    assert retry_after == 58
+
+
+def test_allows_again_once_the_oldest_hit_leaves_the_window(monkeypatch):
+    backend, clock = MemoryRateLimitBackend(100), FakeClock(0)
+    assert hit(backend, clock, monkeypatch, 1000, 1, 60) == 0
+    assert hit(backend, clock, monkeypatch, 1059, 1, 60) == 1
+    assert hit(backend, clock, monkeypatch, 1060.5, 1, 60) == 0
+
+
+def test_limit_counts_every_hit_inside_the_window(monkeypatch):
+    backend, clock = MemoryRateLimitBackend(100), FakeClock(0)
+    for t in (0, 10, 20):
+        assert hit(backend, clock, monkeypatch, 5000 + t, 3, 300) == 0
+    assert hit(backend, clock, monkeypatch, 5299, 3, 300) == 1
+    assert hit(backend, clock, monkeypatch, 5300.5, 3, 300) == 0
+    # The hit at +10 is still inside the window
+    assert hit(backend, clock, monkeypatch, 5301, 3, 300) == 9
+
+
+def test_keys_are_independent_and_evicted_beyond_max_keys(monkeypatch):
+    backend, clock = MemoryRateLimitBackend(2), FakeClock(0)
+    for key in ("a", "b", "c"):
+        assert hit(backend, clock, monkeypatch, 100, 1, 60, key=key) == 0
+    assert backend.stats()["keys"] == 2
+    assert backend.stats()["evictions"] == 1
+    assert hit(backend, clock, monkeypatch, 101, 1, 60, key="c") == 59
@@ -0,0 +1,114 @@
+import asyncio
+import math
+from urllib.parse import urlsplit
+
+import pytest
+
+import server
+from server import HttpClients
+
+from tests.fakes import StandInServer
+
+ORIGIN = (14.4426, 79.9865)
+
+
+class DictCache:
+    """In-process stand-in for ROUTE_MATRIX_CACHE."""
+
+    def __init__(self):
+        self.entries = {}
+
+    async def get_many(self, keys):
+        return {k: self.entries[k] for k in keys if k in self.entries}
+
+    async def set_many(self, entries):
+        self.entries.update(entries)
+
+
+def osrm_table(path):
+    """OSRM /table stand-in: 60 s per 0.01 degree east, 200 s per 0.01 degree north;
+    destinations at latitude 90 are unroutable (null)."""
+    coords = [tuple(map(float, c.split(","))) for c in urlsplit(path).path.rsplit("/", 1)[1].split(";")]
+    (lng0, lat0), dests = coords[0], coords[1:]
+    durations, distances = [0.0], [0.0]
+    for lng, lat in dests:
+        if math.isclose(lat, 90.0):
+            durations.append(None)
+            distances.append(None)
+            continue
+        durations.append(round(6000 * abs(lng - lng0) + 20000 * abs(lat - lat0), 1))
+        distances.append(round(111000 * (abs(lng - lng0) + abs(lat - lat0)), 1))
+    return 200, {"code": "Ok", "durations": [durations], "distances": [distances]}
+
+
+@pytest.fixture
+def osrm(monkeypatch):
+    with StandInServer({"/table/v1/driving/": osrm_table}) as stand_in:
+        clients = HttpClients({"osrm": {"base_url": stand_in.base_url, "timeout": 2, "max_connections": 2}})
+        monkeypatch.setattr(server, "HTTP_CLIENTS", clients)
+        monkeypatch.setattr(server, "ROUTE_MATRIX_CACHE", DictCache())
+        yield stand_in
+
+
+def test_one_table_call_then_served_from_cache(osrm):
+    points = [(ORIGIN[0], ORIGIN[1] + 0.02), (ORIGIN[0] + 0.01, ORIGIN[1]), (90.0, ORIGIN[1])]
+
+    async def main():
+        first = await server.travel_matrix(*ORIGIN, points)
+        second = await server.travel_matrix(*ORIGIN, points)
+        await server.HTTP_CLIENTS.aclose()
+        return first, second
+
+    first, second = asyncio.run(main())
+    # The origin is snapped to its ~150 m geohash cell, hence the tolerance
+    assert [leg and leg["duration"] for leg in first] == pytest.approx([120, 200, None], abs=15)
+    assert second == first
+    assert len(osrm.paths) == 1
+
+
+def test_large_requests_are_split_into_table_chunks(osrm, monkeypatch):
+    monkeypatch.setattr(server, "OSRM_TABLE_MAX_DESTINATIONS", 3)
+    points = [(ORIGIN[0], ORIGIN[1] + 0.001 * i) for i in range(1, 8)]
+
+    async def main():
+        legs = await server.travel_matrix(*ORIGIN, points)
+        await server.HTTP_CLIENTS.aclose()
+        return legs
+
+    legs = asyncio.run(main())
+    assert all(leg is not None for leg in legs)
+    assert len(osrm.paths) == 3
+
+
+def test_nearby_falls_back_to_straight_line_order_when_osrm_fails(monkeypatch):
+    # East is fast and north is slow, so road order would differ from distance order
+    places = [
+        {"id": "1", "name": "North", "lat": ORIGIN[0] + 0.01, "lng": ORIGIN[1], "distance": 1100.0},
+        {"id": "2", "name": "East", "lat": ORIGIN[0], "lng": ORIGIN[1] + 0.02, "distance": 2100.0},
+    ]
+
+    async def nearby(place_type, lat, lng, radius, limit):
+        return places, len(places), True, None
+
+    monkeypatch.setattr(server.POI_STORE, "nearby", nearby)
+    monkeypatch.setattr(server, "ROUTE_MATRIX_CACHE", DictCache())
+    user = {"id": "u1", "lat": ORIGIN[0], "lng": ORIGIN[1]}
+
+    with StandInServer({"/table/v1/driving/": lambda path: (503, {"code": "Busy"})}) as stand_in:
+        monkeypatch.setattr(server, "HTTP_CLIENTS", HttpClients(
+            {"osrm": {"base_url": stand_in.base_url, "timeout": 2, "max_connections": 2}}))
+
+        async def main():
+            down = await server.get_nearby(type="hospital", radius=5000, limit=5, sort="travel_time", user=user)
+            stand_in.routes["/table/v1/driving/"] = osrm_table
+            up = await server.get_nearby(type="hospital", radius=5000, limit=5, sort="travel_time", user=user)
+            await server.HTTP_CLIENTS.aclose()
+            return down, up
+
+        down, up = asyncio.run(main())
+
+    assert down["warning"] == "TRAVEL_TIME_UNAVAILABLE"
+    assert [p["name"] for p in down["items"]] == ["North", "East"]
+    assert "duration" not in down["items"][0]
+    assert up["warning"] is None
+    assert [p["name"] for p in up["items"]] == ["East", "North"]
@@ -0,0 +1,55 @@
+import asyncio
+
+import server
+from server import TypeaheadIndex
+
+DOCTORS = [
+    {"id": "d1", "name": "Dr. Rajesh Kumar", "specialty": "Cardiology", "conditions": ["chest pain"],
+     "avg_rating": 4.8, "review_count": 120},
+    {"id": "d2", "name": "Dr. Priya Sharma", "specialty": "Dermatology", "conditions": ["acne"],
+     "avg_rating": 4.5, "review_count": 40},
+]
+
+
+def test_any_word_of_a_label_finds_it():
+    index = TypeaheadIndex()
+    index.load(DOCTORS, {})
+    labels = [item["label"] for item in index.search("kum")]
+    assert labels == ["Dr. Rajesh Kumar"]
+    assert [item["type"] for item in index.search("cardio")] == ["specialty"]
+
+
+def test_due_reload_runs_once_in_the_background(monkeypatch):
+    monkeypatch.setattr(server, "TYPEAHEAD_RELOAD_SECONDS", 0)
+    index = TypeaheadIndex()
+    calls = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def reload():
+            calls.append(1)
+            await release.wait()
+            index.load(DOCTORS, {})
+
+        index.reload = reload
+        index.reload_if_due()
+        task = index._reload_task
+        await asyncio.sleep(0)
+        # Still running: further requests don't pile up more reloads
+        index.reload_if_due()
+        index.reload_if_due()
+        assert index._reload_task is task
+        release.set()
+        await task
+        assert index.search("priya")
+
+        # Once finished, the next due request starts a fresh one, which stop() cancels
+        index.reload_if_due()
+        assert index._reload_task is not task
+        await asyncio.sleep(0)
+        await index.stop()
+        assert index._reload_task is None
+
+    asyncio.run(main())
+    assert len(calls) == 2
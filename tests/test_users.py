@@ -0,0 +1,27 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+import server
+
+from tests.fakes import FakeCollection
+
+
+class RacedUsers(FakeCollection):
+    """users where another request claims the username between the check and the write."""
+
+    async def update_one(self, query, update, upsert=False):
+        raise DuplicateKeyError("E11000 duplicate key error index: username_unique")
+
+
+def test_username_lost_to_a_concurrent_claim_is_reported_as_taken(monkeypatch):
+    monkeypatch.setattr(server, "db", SimpleNamespace(users=RacedUsers()))
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(server.update_username(server.UsernameUpdate(username="nellore_doc"), user={"id": "u1"}))
+
+    assert exc.value.status_code == 400
+    assert exc.value.detail == "Username already taken"